@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+
+def union_index(indexes):
+    """Sorted union of several indexes computed once
+
+    Args:
+        indexes (list[pandas.Index]): indexes to join
+
+    Returns:
+        numpy.ndarray: sorted unique values
+    """
+    if len(indexes) == 0:
+        return np.array([], dtype='datetime64[ns]')
+    return np.unique(np.concatenate([np.asarray(ix.values) for ix in indexes]))
+
+
+def _fill(out, rows, values, duplicated):
+    """Writes values into out[rows], averaging rows repeated in the same frame"""
+    if not duplicated:
+        out[rows] = values
+        return
+    uniq, inverse = np.unique(rows, return_inverse=True)
+    sums = np.zeros((len(uniq),) + values.shape[1:])
+    counts = np.zeros((len(uniq),) + values.shape[1:])
+    valid = ~np.isnan(values)
+    np.add.at(sums, inverse, np.where(valid, values, 0))
+    np.add.at(counts, inverse, valid)
+    with np.errstate(invalid='ignore'):
+        out[uniq] = sums / counts
+
+
+def align_panel(data_list, field_level=0, ticker_level=1, dtype=np.float64):
+    """Aligns frames with (field, ticker) columns, as returned by pandas_datareader, into one array.
+    The union of dates is built once and every frame is written in place, repeated dates are averaged.
+
+    Args:
+        data_list (List[DataFrame]): frames with MultiIndex columns
+        field_level (int, optional): level of the columns with the field name. Defaults to 0.
+        ticker_level (int, optional): level of the columns with the ticker. Defaults to 1.
+        dtype (numpy.dtype, optional): dtype of the array. Defaults to np.float64.
+
+    Returns:
+        tuple(pandas.DatetimeIndex, list, list, numpy.ndarray): dates, tickers, fields and the
+            dates x tickers x fields array (nan where a ticker has no data)
+    """
+    tickers, fields = {}, {}
+    for df in data_list:
+        for t in df.columns.get_level_values(ticker_level):
+            tickers.setdefault(t, len(tickers))
+        for f in df.columns.get_level_values(field_level):
+            fields.setdefault(f, len(fields))
+
+    dates = union_index([df.index for df in data_list])
+    values = np.full((len(dates), len(tickers), len(fields)), np.nan, dtype=dtype)
+    for df in data_list:
+        if df.empty:
+            continue
+        rows = np.searchsorted(dates, df.index.values)
+        t_idx = np.array([tickers[t] for t in df.columns.get_level_values(ticker_level)])
+        f_idx = np.array([fields[f] for f in df.columns.get_level_values(field_level)])
+        duplicated = not df.index.is_unique
+        for t in np.unique(t_idx):
+            cols = np.flatnonzero(t_idx == t)
+            block = np.full((len(rows), len(fields)), np.nan)
+            block[:, f_idx[cols]] = df.iloc[:, cols].to_numpy(dtype=np.float64)
+            _fill(values[:, t, :], rows, block, duplicated)
+
+    names = data_list[0].index.names if len(data_list) else ['Date']
+    return pd.DatetimeIndex(dates, name=names[0]), list(tickers), list(fields), values
+
+
+def panel_to_frame(dates, tickers, fields, values):
+    """Wide DataFrame with (field, ticker) columns, a view of the panel array without copies"""
+    columns = pd.MultiIndex.from_tuples([(f, t) for t in tickers for f in fields], names=['Attributes', 'Symbols'])
+    return pd.DataFrame(values.reshape(len(dates), len(columns)), index=dates, columns=columns, copy=False)
+
+
+def align_frames(data_list):
+    """Outer join by index of several frames in a single pass, repeated dates are averaged.
+    Same result as folding pd.merge(how='outer') over the list without copying the growing frame.
+
+    Args:
+        data_list (List[DataFrame]): list of numeric data frames
+
+    Returns:
+        pandas.DataFrame: aligned DataFrame
+    """
+    index = union_index([df.index for df in data_list])
+    n_cols = sum(df.shape[1] for df in data_list)
+    values = np.full((len(index), n_cols), np.nan)
+    start = 0
+    for df in data_list:
+        stop = start + df.shape[1]
+        if not df.empty:
+            rows = np.searchsorted(index, df.index.values)
+            _fill(values[:, start:stop], rows, df.to_numpy(dtype=np.float64), not df.index.is_unique)
+        start = stop
+
+    columns = [c for df in data_list for c in df.columns]
+    if all(isinstance(df.columns, pd.MultiIndex) for df in data_list):
+        columns = pd.MultiIndex.from_tuples(columns, names=data_list[0].columns.names)
+    index = pd.Index(index, name=data_list[0].index.name)
+    return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def asof_align(dates, index, values):
+    """Rows of values (indexed by the sorted index) as of each date: the last row on or before the date,
+    nan before the first one. Same as DataFrame.reindex(dates, method='ffill') for a numpy array.
+
+    Args:
+        dates (pandas.DatetimeIndex): dates wanted
+        index (pandas.DatetimeIndex): sorted dates of values
+        values (numpy.ndarray): rows by index (forward filled if they have gaps)
+
+    Returns:
+        numpy.ndarray: rows by dates
+    """
+    pos = np.searchsorted(np.asarray(index.values), np.asarray(dates.values), side='right') - 1
+    out = np.asarray(values, dtype=np.float64)[np.clip(pos, 0, None)]
+    out[pos < 0] = np.nan
+    return out
+
+
+def convert_currency(prices, rates, currency_map):
+    """Converts every column of prices with its own exchange rate in a single multiply.
+    The rates are forward filled and aligned as of the price dates, so a missing FX quote uses the last one.
+
+    Args:
+        prices (pandas.DataFrame): prices (dates x tickers)
+        rates (pandas.DataFrame): exchange rates (dates x FX tickers)
+        currency_map (dict): ticker -> FX ticker, the tickers not in it are left as they are
+
+    Returns:
+        pandas.DataFrame: converted prices, nan before the first rate of a converted ticker
+    """
+    pairs = list(dict.fromkeys(currency_map[c] for c in prices.columns if c in currency_map))
+    if not pairs:
+        return prices
+    rates = rates[pairs].sort_index().ffill()
+    factors = np.ones((len(prices), len(pairs) + 1))
+    factors[:, :-1] = asof_align(prices.index, rates.index, rates.values)
+    position = {p: i for i, p in enumerate(pairs)}
+    columns = [position.get(currency_map.get(c), len(pairs)) for c in prices.columns]
+    values = prices.values * factors[:, columns]
+    return pd.DataFrame(values.astype(prices.values.dtype, copy=False), index=prices.index, columns=prices.columns, copy=False)
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from portfolio_funcs import returns_stats, get_weights, score_portfolios, allocate_lots
+from optimizer import max_ratio, min_volatility
+from risk import BATCH_METRICS
+
+PICKS = {'sharpe': ('sharpe', True), 'sortino': ('sortino', True), 'min_vol': ('volatility', False)}
+
+
+def _pick_weights(stats, pick, method, n_portfolios, risk_free, seed):
+    if method == 'optimize':
+        if pick == 'min_vol':
+            return min_volatility(stats['cov'])
+        cov = stats['cov'] if pick == 'sharpe' else stats['cov down']
+        return max_ratio(stats['means'], cov, risk_free)
+    rng = np.random.default_rng(seed)
+    weights = get_weights(len(stats['means']), n_portfolios, rng=rng)
+    simulation = score_portfolios(weights, stats, risk_free=risk_free)
+    key, maximize = PICKS[pick]
+    index = np.nanargmax(simulation[key]) if maximize else np.nanargmin(simulation[key])
+    return weights[index]
+
+
+def _block_weights(returns, lookback, ends, returns_periods, pick, method, n_portfolios, risk_free, seeds):
+    """target weights of consecutive rebalances, every returns window is computed from its own rows with returns_stats
+    so the weights are the same however the rebalances are split between processes"""
+    return [_pick_weights(returns_stats(returns[end - lookback:end], returns_periods), pick, method, n_portfolios,
+                          risk_free, seed)
+            for end, seed in zip(ends, seeds)]
+
+
+def rebalance_positions(index, rebalance, start):
+    """positions of index where the portfolio is rebalanced
+
+    Args:
+        index (pandas.DatetimeIndex): dates of the prices
+        rebalance (int or str): every n bars, or a pandas frequency ('W', 'M', ...) to rebalance on the last date of each period
+        start (int): first position allowed
+    """
+    if isinstance(rebalance, str):
+        periods = index.to_period(rebalance)
+        last = np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+        return last[last >= start]
+    return np.arange(start, len(index), rebalance)
+
+
+def walk_forward(prices, budget, lookback=180, rebalance=5, pick='sharpe', method='optimize', n_portfolios=10000,
+                 risk_free=0, returns_periods=None, n_jobs=1, seed=None):
+    """Walk-forward backtest: at each rebalance date the portfolio is optimized over the trailing window of returns,
+    bought in whole shares with the current equity and held until the next rebalance.
+
+    Args:
+        prices (pandas.DataFrame): prices (dates x tickers), e.g. Portfolio.adj_close
+        budget (float): initial cash
+        lookback (int, optional): returns in the trailing window. Defaults to 180.
+        rebalance (int or str, optional): rebalance every n bars or on the last date of each period ('W', 'M'). Defaults to 5.
+        pick (str, optional): 'sharpe', 'sortino' or 'min_vol'. Defaults to 'sharpe'.
+        method (str, optional): 'optimize' (optimizer.py) or 'montecarlo' (n_portfolios random weights). Defaults to 'optimize'.
+        n_portfolios (int, optional): portfolios simulated per rebalance with 'montecarlo'. Defaults to 10000.
+        risk_free (float, optional): risk free profit. Defaults to 0.
+        returns_periods (int, optional): scale of the mean returns as in get_best_portfolio. Defaults to lookback.
+        n_jobs (int, optional): processes, the rebalance dates are split in consecutive blocks, the result does not
+            depend on n_jobs. Defaults to 1.
+        seed (int, optional): seed of the montecarlo weights, each rebalance gets its own spawned stream so
+            the result does not depend on n_jobs. Defaults to None.
+
+    Returns:
+        dict: 'equity' (Series), 'weights' and 'shares' (DataFrames by rebalance date), 'cash' and 'turnover'
+            (Series by rebalance date) and 'metrics' (dict of the batched risk metrics of the equity curve)
+    """
+    returns_periods = lookback if returns_periods is None else returns_periods
+    values = prices.values.astype(np.float64)
+    returns = np.vstack([np.full((1, values.shape[1]), np.nan), values[1:] / values[:-1] - 1])
+    positions = rebalance_positions(prices.index, rebalance, lookback)
+    if len(positions) == 0:
+        raise ValueError("not enough prices for the lookback")
+    ends = positions + 1
+    seeds = np.random.SeedSequence(seed).spawn(len(ends))
+
+    blocks = [b for b in np.array_split(np.arange(len(ends)), max(1, n_jobs)) if len(b)]
+    args = []
+    for b in blocks:
+        lo = ends[b[0]] - lookback
+        args.append((returns[lo:ends[b[-1]]], lookback, ends[b] - lo, returns_periods, pick, method,
+                     n_portfolios, risk_free, [seeds[i] for i in b]))
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            targets = [w for result in ex.map(_block_weights, *zip(*args)) for w in result]
+    else:
+        targets = [w for a in args for w in _block_weights(*a)]
+
+    equity = np.full(len(values), np.nan)
+    shares = np.zeros(values.shape[1], dtype=np.int64)
+    cash = budget
+    all_shares, all_cash, turnover = [], [], []
+    bounds = list(positions) + [len(values)]
+    for k, pos in enumerate(positions):
+        value = shares @ values[pos] + cash
+        new_shares, _, left = allocate_lots(value, targets[k][None], values[pos:pos + 1], unique=False)
+        new_shares, left = new_shares[0], left[0]
+        turnover.append(np.abs(new_shares - shares) @ values[pos] / value)
+        shares, cash = new_shares, left
+        equity[pos:bounds[k + 1]] = values[pos:bounds[k + 1]] @ shares + cash
+        all_shares.append(shares)
+        all_cash.append(cash)
+
+    dates = prices.index[positions]
+    equity = pd.Series(equity, index=prices.index, name='equity').dropna()
+    curve = equity.values.reshape(-1, 1)
+    curve_returns = curve[1:] / curve[:-1] - 1
+    metrics = {name: float(np.asarray(func(curve if name in ('mdd', 'romad') else curve_returns))[0])
+               for name, func in BATCH_METRICS.items()}
+    return {
+        'equity': equity,
+        'weights': pd.DataFrame(np.stack(targets), index=dates, columns=prices.columns),
+        'shares': pd.DataFrame(np.stack(all_shares), index=dates, columns=prices.columns),
+        'cash': pd.Series(all_cash, index=dates),
+        'turnover': pd.Series(turnover, index=dates),
+        'metrics': metrics,
+    }
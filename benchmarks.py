@@ -0,0 +1,270 @@
+"""Benchmarks of the hot paths with synthetic data (no network), run with ``python benchmarks.py``
+
+    python benchmarks.py --tier small medium --save baseline.json     # record a baseline
+    python benchmarks.py --tier small medium --baseline baseline.json # compare against it
+
+The cases ending in _legacy time the per-window momentum.py indicators that weighted_average and oscillators
+replace, their speedups are printed after the results.
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from functools import reduce
+import numpy as np
+import pandas as pd
+from alignment import align_panel, panel_to_frame
+from encoder import FeatEncoder
+from investment import Portfolio
+import momentum
+from momentum import OSCILLATORS, oscillators, weighted_average
+from panel import PricePanel
+from portfolio_funcs import get_weights, simulate_portfolios, factible_weights
+from synthetic import gbm_frames, mixed_frame
+from trade_utils import create_rollings
+
+# legacy: also time the per-window indicators of momentum.py as the baseline of the batch ones (slow, python calls per window)
+TIERS = {
+    'small': {'tickers': 10, 'dates': 500, 'portfolios': 5000, 'rows': 20000, 'legacy': True},
+    'medium': {'tickers': 50, 'dates': 1500, 'portfolios': 50000, 'rows': 200000, 'legacy': True},
+    'large': {'tickers': 200, 'dates': 2500, 'portfolios': 200000, 'rows': 1000000, 'legacy': False},
+}
+
+
+def make_frames(n_tickers, n_dates=2500, fields=('High', 'Low', 'Open', 'Close', 'Volume', 'Adj Close'), seed=0):
+    """One frame per ticker with (field, ticker) columns and some missing dates"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2010-01-01', periods=n_dates, name='Date')
+    frames = []
+    for i in range(n_tickers):
+        index = dates[rng.random(n_dates) > 0.02]
+        columns = pd.MultiIndex.from_tuples([(f, f"T{i}") for f in fields])
+        frames.append(pd.DataFrame(rng.random((len(index), len(fields))), index=index, columns=columns))
+    return frames
+
+
+def timeit(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def merge_reduce(frames):
+    data = reduce(lambda left, right: pd.merge(left, right, left_index=True, right_index=True, how='outer'), frames)
+    return data.groupby(by='Date').mean()
+
+
+def bench_alignment(sizes=(10, 100, 500, 1000), n_dates=2500, reduce_max=500):
+    """Seconds to align n tickers with reduce(pd.merge)+groupby and with align_panel
+
+    Args:
+        sizes (tuple, optional): numbers of tickers. Defaults to (10, 100, 500, 1000).
+        n_dates (int, optional): dates per ticker. Defaults to 2500.
+        reduce_max (int, optional): largest size timed with reduce(pd.merge), it is quadratic. Defaults to 500.
+
+    Returns:
+        pandas.DataFrame: seconds of each method by number of tickers
+    """
+    rows = []
+    for n in sizes:
+        frames = make_frames(n, n_dates)
+        rows.append({
+            "tickers": n,
+            "reduce_merge": timeit(merge_reduce, frames) if n <= reduce_max else np.nan,
+            "align_panel": timeit(lambda f: panel_to_frame(*align_panel(f)), frames),
+        })
+    return pd.DataFrame(rows).set_index("tickers")
+
+
+def legacy_exp_e_avg(x):
+    "exp_e_avg before the cached kernels, the weights are built in python on every window"
+    x = x[::-1]
+    weights = np.array([np.e**(len(x) - 1 - y) / (np.e**(len(x)) - 1) for y in range(len(x))])
+    return np.dot(np.array(x), weights)
+
+
+def legacy_weighted_average(prices, window):
+    """rolling(window).apply of legacy_exp_e_avg, the baseline of weighted_average"""
+    return prices.rolling(window).apply(legacy_exp_e_avg, raw=True)
+
+
+def legacy_oscillators(prices, indicators=OSCILLATORS, windows=(14,), short_period=12):
+    """rolling(window).apply of the per-window indicators of momentum.py for every column and window,
+    the baseline of oscillators (same names and values)"""
+    funcs = {name: getattr(momentum, name) for name in indicators}
+    funcs.update({name: func for name, func in {
+        'RSI': lambda x: momentum.RSI(x, agg=legacy_exp_e_avg),
+        'RS': lambda x: momentum.RS(x, agg=legacy_exp_e_avg),
+        'MACD': lambda x: legacy_exp_e_avg(x[-short_period:]) - legacy_exp_e_avg(x),
+    }.items() if name in funcs})
+    frames = []
+    for w in windows:
+        for name, func in funcs.items():
+            frame = prices.rolling(w).apply(func, raw=True)
+            frame.columns = [f"{name}_{col}_{w}" for col in prices.columns]
+            frames.append(frame)
+    return pd.concat(frames, axis=1)
+
+
+def measure(func, repeat=3):
+    """Best seconds of repeat calls and peak memory (MiB allocated during one call, traced with tracemalloc,
+    numpy arrays included). The memory is measured in a separate call so tracing does not slow the timings."""
+    seconds = min(timeit(func) for _ in range(repeat))
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def cases(tier, seed=0):
+    """Functions to benchmark for a tier, the data is generated (seeded) before timing
+
+    Args:
+        tier (dict): sizes, 'tickers', 'dates', 'portfolios' and 'rows' (see TIERS)
+        seed (int, optional): seed of the synthetic data and the weights. Defaults to 0.
+
+    Returns:
+        dict: name -> function without arguments
+    """
+    n_tickers, n_portfolios = tier['tickers'], tier['portfolios']
+    port = Portfolio(10000, [f"T{i}" for i in range(n_tickers)])
+    port.set_panel(PricePanel.from_frames(gbm_frames(n_tickers, tier['dates'], seed=seed)))
+    prices = port.adj_close
+    returns = prices.pct_change().dropna().tail(180)
+    weights = get_weights(n_tickers, n_portfolios, rng=np.random.default_rng(seed))
+    assets = prices.tail(1).values
+    budget = 100 * assets.sum()
+    columns = list(prices.columns[:min(n_tickers, 20)])
+    mixed = mixed_frame(tier['rows'], seed=seed)
+    encoder = FeatEncoder().fit(mixed)
+    funcs = {
+        'get_best_portfolio': lambda: port.get_best_portfolio(n_portfolios, budget=budget, seed=seed),
+        'simulate_portfolios': lambda: simulate_portfolios(weights, returns),
+        'simulate_portfolios_cov': lambda: simulate_portfolios(weights, returns, risk_mode='cov'),
+        'factible_weights': lambda: factible_weights(budget, weights, assets),
+        'bollinger_est': port.bollinger_est,
+        'weighted_average': lambda: weighted_average(prices, 20),
+        'oscillators': lambda: oscillators(prices, windows=(14, 28)),
+        'create_rollings': lambda: create_rollings(prices, columns, ['mean', 'std'], [5, 20, 60]),
+        'FeatEncoder.fit': lambda: FeatEncoder().fit(mixed),
+        'FeatEncoder.transform': lambda: encoder.transform(mixed),
+    }
+    if tier.get('legacy', False):
+        funcs['weighted_average_legacy'] = lambda: legacy_weighted_average(prices, 20)
+        funcs['oscillators_legacy'] = lambda: legacy_oscillators(prices, windows=(14, 28))
+    return funcs
+
+
+def speedups(results):
+    """Seconds of every case_legacy over its case, by tier
+
+    Args:
+        results (pandas.DataFrame): output of run
+
+    Returns:
+        pandas.Series: speedup of each case that has a legacy baseline
+    """
+    seconds = results['seconds']
+    ratios = {}
+    for tier, case in seconds.index:
+        if case.endswith('_legacy') and (tier, case[:-len('_legacy')]) in seconds.index:
+            ratios[(tier, case[:-len('_legacy')])] = seconds[(tier, case)] / seconds[(tier, case[:-len('_legacy')])]
+    return pd.Series(ratios, name='speedup', dtype=np.float64)
+
+
+def run(tiers=('small',), repeat=3, seed=0, only=None):
+    """Times and peak memory of every case in every tier
+
+    Args:
+        tiers (tuple, optional): names of TIERS. Defaults to ('small',).
+        repeat (int, optional): calls timed per case, the best is kept. Defaults to 3.
+        seed (int, optional): seed of the synthetic data. Defaults to 0.
+        only (list, optional): names of the cases to run, None for all. Defaults to None.
+
+    Returns:
+        pandas.DataFrame: seconds and peak_mib indexed by (tier, case)
+    """
+    rows = []
+    for name in tiers:
+        for case, func in cases(TIERS[name], seed=seed).items():
+            if only is not None and case not in only:
+                continue
+            seconds, peak = measure(func, repeat=repeat)
+            rows.append({'tier': name, 'case': case, 'seconds': seconds, 'peak_mib': peak})
+    return pd.DataFrame(rows).set_index(['tier', 'case'])
+
+
+def save_baseline(results, path):
+    """Writes the results of run to a json file with the versions of the machine that produced them"""
+    baseline = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.platform(),
+        'results': [{'tier': t, 'case': c, **row} for (t, c), row in results.to_dict('index').items()],
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    return pd.DataFrame(baseline['results']).set_index(['tier', 'case'])
+
+
+def compare(results, baseline, tolerance=1.25):
+    """Ratios of the results against a baseline, a case regresses when its time or peak memory grows more than tolerance
+
+    Args:
+        results (pandas.DataFrame): output of run
+        baseline (pandas.DataFrame): output of run or load_baseline
+        tolerance (float, optional): allowed ratio new/baseline. Defaults to 1.25.
+
+    Returns:
+        pandas.DataFrame: seconds, peak_mib, their baseline values and ratios and a 'regression' flag
+    """
+    table = results.join(baseline, rsuffix='_baseline', how='inner')
+    table['time_ratio'] = table['seconds'] / table['seconds_baseline']
+    table['memory_ratio'] = table['peak_mib'] / table['peak_mib_baseline'].where(table['peak_mib_baseline'] > 0)
+    table['regression'] = (table['time_ratio'] > tolerance) | (table['memory_ratio'] > tolerance)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tier', nargs='+', default=['small'], choices=list(TIERS))
+    parser.add_argument('--case', nargs='+', default=None, help='cases to run, all by default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='write the results as a baseline json')
+    parser.add_argument('--baseline', help='baseline json to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--alignment', action='store_true', help='also run bench_alignment')
+    args = parser.parse_args(argv)
+
+    results = run(args.tier, repeat=args.repeat, seed=args.seed, only=args.case)
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+        if args.baseline:
+            table = compare(results, load_baseline(args.baseline), tolerance=args.tolerance)
+            print(table)
+            if table['regression'].any():
+                print("regressions:", list(table.index[table['regression']]))
+        else:
+            print(results)
+        ratios = speedups(results)
+        if len(ratios):
+            print(ratios)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.alignment:
+        print(bench_alignment())
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import pandas as pd
+import numpy as np
+
+
+class DataSource:
+    """Interface of a price source. ``get`` returns a DataFrame indexed by ``Date``
+    with one column per field (Open, High, Low, Close, Adj Close, Volume) for a single ticker.
+    """
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        raise NotImplementedError
+
+
+class YahooSource(DataSource):
+    """Prices from Yahoo Finance through pandas_datareader
+
+    Args:
+        timeout (float, optional): seconds to wait for each http request. Defaults to 30.
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        from pandas_datareader import data as pdr
+        df = pdr.get_data_yahoo([ticker], start=start, end=end, interval=interval, timeout=self.timeout)
+        if isinstance(df.columns, pd.MultiIndex):
+            df = df.xs(ticker, axis=1, level=1)
+        df.index.name = 'Date'
+        return df
+
+
+class LocalFileSource(DataSource):
+    """Prices from local csv files, one file per ticker named ``{ticker}.csv`` with a ``Date`` column.
+    Useful to run the whole pipeline offline and in tests.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        path = os.path.join(self.directory, f"{ticker}.csv")
+        df = pd.read_csv(path, index_col='Date', parse_dates=True).sort_index()
+        return slice_dates(df, start, end)
+
+
+class StubSource(DataSource):
+    """Source for tests that adds latency and failures on top of another source
+
+    Args:
+        source (DataSource, optional): source of the prices, if None returns empty frames. Defaults to None.
+        latency (float, optional): seconds every request takes. Defaults to 0.
+        jitter (float, optional): random seconds added to the latency. Defaults to 0.
+        fail_rate (float, optional): probability of a request raising ConnectionError. Defaults to 0.
+        fail_tickers (list, optional): tickers whose requests always fail. Defaults to [].
+        fail_first (int, optional): number of requests of every ticker that fail before succeeding. Defaults to 0.
+        seed (int, optional): seed of the random latency and failures. Defaults to None.
+    """
+
+    def __init__(self, source=None, latency=0, jitter=0, fail_rate=0, fail_tickers=[], fail_first=0, seed=None):
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fail_tickers = set(fail_tickers)
+        self.fail_first = fail_first
+        self.calls = {}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        with self._lock:
+            self.calls[ticker] = self.calls.get(ticker, 0) + 1
+            n_call = self.calls[ticker]
+            delay = self.latency + self.jitter * self._rng.random()
+            fail = self._rng.random() < self.fail_rate
+        time.sleep(delay)
+        if fail or ticker in self.fail_tickers or n_call <= self.fail_first:
+            raise ConnectionError(f"stub failure for {ticker}")
+        if self.source is None:
+            return pd.DataFrame(columns=['High', 'Low', 'Open', 'Close', 'Volume', 'Adj Close'],
+                                index=pd.DatetimeIndex([], name='Date'), dtype=float)
+        return self.source.get(ticker, start=start, end=end, interval=interval)
+
+
+class PriceStore:
+    """On-disk columnar store, one ``.npz`` file per ticker and interval. Next to the bars every file keeps the
+    range of dates that has been requested, so dates without bars (holidays, before the listing) are not requested again.
+
+    Args:
+        directory (str): folder where the files are kept, it is created if missing.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, ticker, interval):
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
+        return os.path.join(self.directory, f"{name}_{interval}.npz")
+
+    def load(self, ticker, interval="d"):
+        """Returns the stored frame or None if the ticker has not been saved"""
+        stored = self.load_covered(ticker, interval)
+        return None if stored is None else stored[0]
+
+    def load_covered(self, ticker, interval="d"):
+        """Returns the stored frame and the (start, end) dates covered, NaT for an open start,
+        or None if the ticker has not been saved. Files without the range cover their first and last bar"""
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as f:
+            index = pd.DatetimeIndex(f['dates'].astype('datetime64[ns]'), name='Date')
+            df = pd.DataFrame(f['values'], index=index, columns=list(f['fields']))
+            if 'covered' in f.files:
+                start, end = pd.to_datetime(f['covered'].astype('datetime64[ns]'))
+            else:
+                start, end = (index[0], index[-1]) if len(index) else (pd.NaT, pd.NaT)
+        return df, start, end
+
+    def save(self, ticker, interval, df, start=None, end=None):
+        """Saves the bars of df as covering the dates from start (None: since the first bar ever) to end
+        (None: the last bar of df)"""
+        path = self.path(ticker, interval)
+        tmp = path + ".tmp.npz"
+        end = df.index[-1] if end is None and len(df) else end
+        covered = np.array([pd.Timestamp(start) if start is not None else pd.NaT,
+                            pd.Timestamp(end) if end is not None else pd.NaT], dtype='datetime64[ns]')
+        np.savez(tmp,
+                 dates=df.index.values.astype('datetime64[ns]').astype(np.int64),
+                 values=df.values.astype(np.float64),
+                 fields=np.array(df.columns, dtype=str),
+                 covered=covered.astype(np.int64))
+        os.replace(tmp, path)
+
+
+class CachedSource(DataSource):
+    """Wraps a source with a PriceStore, serves the cached range and only requests
+    the dates before and after the range already requested. Without end the last stored bar
+    is always requested again because it may have been incomplete.
+
+    Args:
+        source (DataSource): source used for the missing dates
+        store (PriceStore): local store
+    """
+
+    def __init__(self, source, store):
+        self.source = source
+        self.store = store
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        stored = self.store.load_covered(ticker, interval)
+        if stored is None:
+            df = self.source.get(ticker, start=start, end=end, interval=interval)
+            self.store.save(ticker, interval, df, start=start, end=end)
+            return slice_dates(df, start, end)
+
+        cached, covered_start, covered_end = stored
+        parts = []
+        if start is not None and not pd.isna(covered_start) and pd.Timestamp(start) < covered_start:
+            parts.append(self.source.get(ticker, start=start, end=covered_start, interval=interval))
+            covered_start = pd.Timestamp(start)
+        elif start is None and not pd.isna(covered_start):
+            parts.append(self.source.get(ticker, start=None, end=covered_start, interval=interval))
+            covered_start = pd.NaT
+        parts.append(cached)
+        if end is None or pd.isna(covered_end) or pd.Timestamp(end) > covered_end:
+            # the last stored bar is requested again because it may have been incomplete
+            last = cached.index[-1] if len(cached) else covered_end
+            parts.append(self.source.get(ticker, start=None if pd.isna(last) else last, end=end, interval=interval))
+            covered_end = None if end is None else pd.Timestamp(end)
+
+        if len(parts) > 1:
+            df = pd.concat(parts)
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+            self.store.save(ticker, interval, df, start=None if pd.isna(covered_start) else covered_start,
+                            end=covered_end)
+        else:
+            df = cached
+        return slice_dates(df, start, end)
+
+
+def slice_dates(df, start=None, end=None):
+    """Rows of df between start and end (both inclusive, None means open)"""
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    return df.loc[start:end]
+
+
+def to_multiindex(df, ticker):
+    """Columns as (field, ticker) like pandas_datareader returns them for a list of tickers"""
+    df = df.copy(deep=False)
+    df.columns = pd.MultiIndex.from_tuples([(c, ticker) for c in df.columns], names=['Attributes', 'Symbols'])
+    return df
+
+
+class FetchError(Exception):
+    """Raised when some tickers could not be downloaded, the FetchReport is in ``report``"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f"failed to fetch {len(report.failed)} tickers: {list(report.failed)}")
+
+
+class FetchReport:
+    """Result of fetch_many
+
+    Attributes:
+        ok (list): tickers downloaded
+        failed (dict): ticker -> last exception
+        attempts (dict): ticker -> number of requests made
+        elapsed (float): seconds of the whole fetch
+    """
+
+    def __init__(self):
+        self.ok = []
+        self.failed = {}
+        self.attempts = {}
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f"FetchReport(ok={len(self.ok)}, failed={list(self.failed)}, elapsed={self.elapsed:.2f}s)"
+
+
+def _fetch_one(source, ticker, start, end, interval, retries, backoff):
+    error = None
+    for attempt in range(retries + 1):
+        try:
+            return source.get(ticker, start=start, end=end, interval=interval), attempt + 1, None
+        except Exception as e:
+            error = e
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    return None, retries + 1, error
+
+
+def fetch_many(source, tickers, start=None, end=None, interval="d", max_workers=8, retries=2, backoff=0.5, timeout=None):
+    """Downloads several tickers at the same time with a bounded thread pool
+
+    Args:
+        source (DataSource): source of the prices
+        tickers (list[str]): tickers to download
+        start (str, optional): start date. Defaults to None.
+        end (str, optional): end date. Defaults to None.
+        interval (str, optional): interval of the data. Defaults to "d".
+        max_workers (int, optional): maximum requests running at the same time. Defaults to 8.
+        retries (int, optional): extra attempts for a ticker that fails. Defaults to 2.
+        backoff (float, optional): seconds to wait before the first retry, doubled on each retry. Defaults to 0.5.
+        timeout (float, optional): seconds for the whole download, tickers not done by then fail with TimeoutError.
+            Defaults to None (no limit).
+
+    Returns:
+        tuple(dict, FetchReport): ticker -> DataFrame for the tickers downloaded, and the report
+    """
+    report = FetchReport()
+    frames = {}
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers))))
+    futures = {pool.submit(_fetch_one, source, t, start, end, interval, retries, backoff): t for t in tickers}
+    done, pending = wait(futures, timeout=timeout)
+    for fut in pending:
+        fut.cancel()
+        report.failed[futures[fut]] = TimeoutError(f"not downloaded after {timeout}s")
+    pool.shutdown(wait=False)
+
+    for fut in done:
+        ticker = futures[fut]
+        df, attempts, error = fut.result()
+        report.attempts[ticker] = attempts
+        if error is None:
+            frames[ticker] = df
+        else:
+            report.failed[ticker] = error
+    report.ok = [t for t in tickers if t in frames]
+    report.elapsed = time.perf_counter() - t0
+    return frames, report
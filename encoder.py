@@ -1,7 +1,109 @@
 import pandas as pd
+import numpy as np
 from sklearn.base import TransformerMixin
 from sklearn.utils.validation import check_is_fitted
 import unicodedata
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def _clean_name(s, symbols_nothing, symbols_underscore, method):
+    s =  str(s).strip()
+    s = s.title() if method=='title' else( s.upper() if  method=='upper' else s.lower())
+    for x in symbols_nothing:
+        s = s.replace(x,'')
+    for y in symbols_underscore:   
+        s = s.replace(y,'_')
+    return ''.join((c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn'))
+
+def _bin_converter(categories):
+    """Function col -> codes: bool columns as int, object columns by position in categories (nan if null or missing),
+    categories None to take them from the data like the old transform"""
+    def convert(col):
+        if col.dtype == bool:
+            return col.astype(int)
+        if col.dtype != 'object':
+            return col
+        index = categories
+        if index is None:
+            index = pd.Index([x for x in col.unique() if x==x], dtype=object)
+        codes = index.get_indexer(col.values)
+        codes[col.isna().values] = -1
+        if (codes < 0).any():
+            codes = np.where(codes < 0, np.nan, codes)
+        return pd.Series(codes, index=col.index, name=col.name)
+    return convert
+
+def _str_converter(col):
+    return col.astype(str)
+
+class ColumnSketch:
+    """
+    Cardinality of a column seen in chunks: the distinct values are kept (in order of appearance) while there are
+    at most exact_limit, and a HyperLogLog of 2**p registers estimates the cardinality above it.
+    Also keeps the dtype kind and if the column has unhashable values (checked on a sample).
+    """
+
+    def __init__(self, p=12, exact_limit=64):
+        self.p = p
+        self.exact_limit = exact_limit
+        self.registers = np.zeros(2**p, dtype=np.uint8)
+        self.values = {}
+        self.kind = None
+        self.dtype = None
+        self.unhashable = False
+
+    def update(self, col, sample=None):
+        kind = col.dtype.kind
+        if self.kind is None:
+            self.kind, self.dtype = kind, col.dtype
+        elif kind != self.kind:
+            self.kind = 'f' if {kind, self.kind} <= {'i', 'u', 'f'} else 'O'
+        if self.unhashable:
+            return
+        if FeatEncoder.hashable(col if sample is None else sample) is not None:
+            self.unhashable = True
+            return
+        try:
+            valid = col[col.notna().values]
+            self._add_hashes(pd.util.hash_pandas_object(valid, index=False).values)
+            if self.values is not None and self.hll_estimate() <= 2*self.exact_limit:
+                for x in col.unique():
+                    if x==x:
+                        self.values.setdefault(x)
+                if len(self.values) > self.exact_limit + 1:
+                    self.values = None
+            else:
+                self.values = None
+        except TypeError:
+            self.unhashable = True
+
+    def _add_hashes(self, hashes):
+        bits = 64 - self.p
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # rank = leading zeros of the remaining bits + 1, the bits fit exactly in a float64
+        length = np.zeros(len(rest))
+        nonzero = rest > 0
+        length[nonzero] = np.floor(np.log2(rest[nonzero].astype(np.float64))) + 1
+        np.maximum.at(self.registers, index, (bits - length + 1).astype(np.uint8))
+
+    def hll_estimate(self):
+        m = len(self.registers)
+        estimate = 0.7213/(1 + 1.079/m)*m*m/np.sum(2.0**-self.registers.astype(np.float64))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5*m and zeros:
+            return m*np.log(m/zeros)
+        return estimate
+
+    def cardinality(self):
+        """Number of distinct values without nulls, exact up to exact_limit"""
+        if self.values is not None:
+            return sum(1 for x in self.values if not pd.isna(x))
+        return int(round(self.hll_estimate()))
+
+    def categories(self):
+        """Distinct values in order of appearance (like unique() without nan), None above exact_limit"""
+        return None if self.values is None else list(self.values)
 
 class FeatEncoder(TransformerMixin):
     """
@@ -72,85 +174,144 @@ class FeatEncoder(TransformerMixin):
         self.__symbols_nothing = symbols_nothing
         self.__symbols_underscore = symbols_underscore
         self.__method = method
-        self.__all = self.feats_tgt+self.feats_id+self.feats_bin+self.feats_cont+self.feats_ord+self.feats_str+self.feats_date+self.feats_other+self.feats_cluster
+        self.__all = set(self.feats_tgt+self.feats_id+self.feats_bin+self.feats_cont+self.feats_ord+self.feats_str+self.feats_date+self.feats_other+self.feats_cluster)
+        self.__init_feats = {'tgt': list(feats_tgt), 'id': list(feats_id), 'cont': list(feats_cont), 'str': list(feats_str),
+                             'bin': list(feats_bin), 'ord': list(feats_ord), 'date': list(feats_date),
+                             'other': list(feats_other), 'cluster': list(feats_cluster)}
 
    
     
     def transform(self,df):
+        """
+        df: DataFrame
+            Data to transform, only the binary and string columns are converted, the rest are shared with df (not copied)
         
+        The binary object columns are mapped with the categories of bin_dict (the order seen in fit), values not seen in fit are nan
+        """
         check_is_fitted(self, ['names'])
-        work_df = df.copy()
-        work_df.rename(columns=self.names,inplace=True)
-        
+        work_df = df.rename(columns=self.names, copy=False)
+        for col, convert in self._converters.items():
+            if col in work_df.columns:
+                work_df[col] = convert(work_df[col])
+        return work_df
+
+    def transform_chunks(self, chunks, chunk_size=100000):
+        """
+        chunks: iterable of DataFrame, DataFrame or numpy structured array (e.g. np.load(..., mmap_mode='r'))
+            Data to transform, a DataFrame or array is read in slices of chunk_size rows
+        chunk_size: int
+            Rows per chunk when chunks is a DataFrame or an array, default 100000
         
+        Yields the transformed chunks
+        """
+        if isinstance(chunks, (pd.DataFrame, np.ndarray)):
+            data = chunks
+            chunks = (data[i:i+chunk_size] for i in range(0, len(data), chunk_size))
+        for chunk in chunks:
+            if isinstance(chunk, np.ndarray):
+                chunk = pd.DataFrame(chunk)
+            yield self.transform(chunk)
+
+    def _compile(self):
+        """Precompiles the conversion of every binary and string column (renamed) so transform does not inspect the data"""
+        self._converters = {}
         if self.__bin_transform:
-            for col in self.feats_bin:    
-                if work_df[col].dtype == bool:
-                    work_df[col]=work_df[col].astype(int)
-                    
-                elif (work_df[col].dtype == 'object'):
-                    category = [x for x in work_df[col].unique() if x==x]
-                    dic = {k:category.index(k) for k in category}
-                    work_df[col].replace(dic,inplace=True)
-                
-        work_df[self.feats_str] = work_df[self.feats_str].astype(str)
-   
-        return work_df
+            sketches = getattr(self, '_sketches', {})
+            originals = {new: old for old, new in self.names.items()}
+            for col in self.feats_bin:
+                old = originals.get(col, col)
+                sketch = sketches.get(old)
+                if sketch is None or sketch.dtype == bool:
+                    self._converters[col] = _bin_converter(None)
+                elif sketch.dtype == 'object':
+                    self._converters[col] = _bin_converter(pd.Index(self.bin_dict[old], dtype=object))
+        for col in self.feats_str:
+            self._converters[col] = _str_converter
     
-    def fit(self, df):
+    def fit(self, df, sample_rows=None):
+        """
+        df: DataFrame
+            Data to fit, it is not copied
+        sample_rows: int
+            Number of rows (evenly spaced) used to check which columns can be hashed, None to use all the rows, default None
+
+        The types come from the dtypes and the cardinality from a ColumnSketch of every column over all the rows
+        (exact for low cardinalities, HyperLogLog for the rest)
+        """
+        return self.fit_chunks([df], sample_rows=sample_rows)
+
+    def fit_chunks(self, chunks, sample_rows=None):
+        """
+        chunks: iterable of DataFrame
+            Chunks of the data with the same columns, e.g. pd.read_csv(..., chunksize=n)
+        sample_rows: int
+            Number of rows of each chunk used to check which columns can be hashed, default None
+        """
+        self._sketches = {}
+        for chunk in chunks:
+            self.partial_fit(chunk, sample_rows=sample_rows, finish=False)
+        return self._finish_fit()
+
+    def partial_fit(self, df, sample_rows=None, finish=True):
+        """Updates the sketches of the columns with a new chunk and rebuilds the lists and names with all the chunks seen
+        """
+        if not hasattr(self, '_sketches'):
+            self._sketches = {}
+        sample = df
+        if sample_rows is not None and len(df) > sample_rows:
+            sample = df.iloc[np.linspace(0, len(df) - 1, sample_rows).astype(int)]
+        for col in df.columns:
+            if col in self.__all:
+                continue
+            if col not in self._sketches:
+                self._sketches[col] = ColumnSketch(exact_limit=max(64, 4 * self.__cardinal_threshold))
+            self._sketches[col].update(df[col], sample[col])
+        if finish:
+            return self._finish_fit()
+        return self
+
+    def _finish_fit(self):
         num_types= ['i','u','f']
         date_types = ['m','M']
         str_types = ['O','S','U']
         other_types =[ 'c','V']
-        
-        work_df = df.copy() 
-        feats = [col for col in work_df.columns if col not in self.__all ]
-        self.feats_other = self.feats_other + [self.hashable(work_df[col]) for col in feats if self.hashable(work_df[col])!=None]
-        feats = list(set(feats)-set(self.feats_other))
-        
-        cardinality = work_df[feats].nunique()
-        self.feats_id = self.feats_id + [col for col in feats if col.strip()[:3].replace(' ','_').lower()=='id_' or col.strip()[-3:].replace(' ','_').lower()=='_id'  or col.strip().lower()=='id']
-        self.feats_bin = self.feats_bin + [col for col in feats if cardinality.loc[col]==2]
-        
-        not_bin = [x for x in feats if x not in self.feats_bin+self.feats_id+self.feats_other]
-        
-        self.feats_str = self.feats_str + work_df[not_bin].dtypes[work_df[not_bin].dtypes.map(lambda x:x.kind in str_types)].index.to_list()
-        self.feats_date = self.feats_date + work_df[not_bin].dtypes[work_df[not_bin].dtypes.map(lambda x:x.kind in date_types)].index.to_list() 
-        self.feats_other = work_df[not_bin].dtypes[work_df[not_bin].dtypes.map(lambda x:x.kind in other_types)].index.to_list() + self.feats_other
-        nums = work_df[not_bin].dtypes[work_df[not_bin].dtypes.map(lambda x:x.kind in num_types)].index.to_list()
-        
-        self.feats_cont = self.feats_cont + [col for col in nums if cardinality.loc[col]>self.__cardinal_threshold]
-        self.feats_ord = self.feats_ord + [col for col in nums if col not in self.feats_cont]
-        
+        init = self.__init_feats
+        sketches = self._sketches
+
+        feats = list(sketches)
+        self.feats_other = init['other'] + [col for col in feats if sketches[col].unhashable]
+        excluded = set(self.feats_other)
+        feats = [col for col in feats if col not in excluded]
+
+        cardinality = {col: sketches[col].cardinality() for col in feats}
+        self.feats_id = init['id'] + [col for col in feats if str(col).strip()[:3].replace(' ','_').lower()=='id_' or str(col).strip()[-3:].replace(' ','_').lower()=='_id'  or str(col).strip().lower()=='id']
+        self.feats_bin = init['bin'] + [col for col in feats if cardinality[col]==2]
+
+        excluded.update(self.feats_bin, self.feats_id)
+        not_bin = [x for x in feats if x not in excluded]
+        kinds = {col: sketches[col].kind for col in not_bin}
+
+        self.feats_str = init['str'] + [col for col in not_bin if kinds[col] in str_types]
+        self.feats_date = init['date'] + [col for col in not_bin if kinds[col] in date_types]
+        self.feats_other = [col for col in not_bin if kinds[col] in other_types] + self.feats_other
+        nums = [col for col in not_bin if kinds[col] in num_types]
+
+        self.feats_cont = init['cont'] + [col for col in nums if cardinality[col]>self.__cardinal_threshold]
+        cont = set(self.feats_cont)
+        self.feats_ord = init['ord'] + [col for col in nums if col not in cont]
+        self.feats_tgt = list(init['tgt'])
+        self.feats_cluster = list(init['cluster'])
+
         self.names={}
         
         if self.__bin_transform:
             self.bin_dict = {}
         for col in self.feats_bin:
             
-            if self.__bin_transform:
-                
-                if work_df[col].dtype == bool:
-                    
-                    self.names.update({col:f'bin_{self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)}' if not col.startswith('bin_') else col})
-                    work_df[col]=work_df[col].astype(int)
-                    
-                elif (work_df[col].dtype=='object'):
-                    category = [x for x in work_df[col].unique() if x==x]
-                    dic = {k:category.index(k) for k in category}
-                    self.bin_dict.update({col:category})
-                   
-                    self.names.update({col:f"bin_{self.clean_names(col,symbols_nothing=self.__symbols_nothing,symbols_underscore=self.__symbols_underscore, method=self.__method)}" if not col.startswith('bin_') else col})
-                    work_df[col].replace(dic,inplace=True)
-                
-                else:
-                    self.names.update({col:f'bin_{self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)}' if not col.startswith('bin_') else col})
-                
-            else:
-                self.names.update({col:f'bin_{self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)}' if not col.startswith('bin_') else col})
+            if self.__bin_transform and col in sketches and sketches[col].dtype=='object':
+                self.bin_dict.update({col:sketches[col].categories()})
+            self.names.update({col:f'bin_{self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)}' if not col.startswith('bin_') else col})
         
-       
-               
         self.names.update({col:self.__id_name(self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)) for col  in self.feats_id })
         self.names.update({col:f'cont_{self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)}' if not col.startswith('cont_') else col for col  in self.feats_cont  })
         self.names.update({col:f'ord_{self.clean_names(col,symbols_nothing=self.__symbols_nothing, symbols_underscore=self.__symbols_underscore, method=self.__method)}' if not col.startswith('ord_') else col for col  in self.feats_ord  })
@@ -170,6 +331,7 @@ class FeatEncoder(TransformerMixin):
         self.feats_other = [col for col in self.names.values() if col.startswith('other_')]
         self.feats_cluster = [col for col in self.names.values() if col.startswith('cl_')]
         self.feats_numeric = self.feats_bin+self.feats_cont+self.feats_ord
+        self._compile()
         return self
     
     def update_lists(self, df):
@@ -177,22 +339,20 @@ class FeatEncoder(TransformerMixin):
         """
         
         check_is_fitted(self, ['names'])
-        work_df = df.copy()
-        self.feats_tgt = [col for col in work_df.columns if col.startswith('tgt_')]             
-        self.feats_id = [col for col in work_df.columns if col.startswith('id')]
-        self.feats_bin = [col for col in work_df.columns if col.startswith('bin_')]
-        self.feats_cont = [col for col in work_df.columns if col.startswith('cont_')]
-        self.feats_ord = [col for col in work_df.columns if col.startswith('ord_')]
-        self.feats_str = [col for col in work_df.columns if col.startswith('str_')]
-        self.feats_date = [col for col in work_df.columns if col.startswith('date_')]
-        self.feats_cluster = [col for col in work_df.columns if col.startswith('cl_')]
-        self.feats_other = [col for col in work_df.columns if col.startswith('other_')]
+        columns = df.columns
+        self.feats_tgt = [col for col in columns if col.startswith('tgt_')]             
+        self.feats_id = [col for col in columns if col.startswith('id')]
+        self.feats_bin = [col for col in columns if col.startswith('bin_')]
+        self.feats_cont = [col for col in columns if col.startswith('cont_')]
+        self.feats_ord = [col for col in columns if col.startswith('ord_')]
+        self.feats_str = [col for col in columns if col.startswith('str_')]
+        self.feats_date = [col for col in columns if col.startswith('date_')]
+        self.feats_cluster = [col for col in columns if col.startswith('cl_')]
+        self.feats_other = [col for col in columns if col.startswith('other_')]
         self.feats_numeric = self.feats_bin+self.feats_cont+self.feats_ord
-        self.feats_unkown = [col for col in work_df.columns if col not in self.feats_tgt+self.feats_id
-                                                                               +self.feats_bin+self.feats_cont
-                                                                               +self.feats_ord+self.feats_str
-                                                                               +self.feats_date+self.feats_cluster
-                                                                               +self.feats_other]
+        known = set(self.feats_tgt+self.feats_id+self.feats_bin+self.feats_cont+self.feats_ord+self.feats_str
+                    +self.feats_date+self.feats_cluster+self.feats_other)
+        self.feats_unkown = [col for col in columns if col not in known]
         
     @staticmethod
     def __id_name(s):
@@ -212,13 +372,7 @@ class FeatEncoder(TransformerMixin):
 
     @staticmethod
     def clean_names(s,symbols_nothing=[',','.', ';', "'", '´','*', '~'], symbols_underscore=[' ','|', '/', '\\'], method=None):
-        s =  str(s).strip()
-        s = s.title() if method=='title' else( s.upper() if  method=='upper' else s.lower())
-        for x in symbols_nothing:
-            s = s.replace(x,'')
-        for y in symbols_underscore:   
-            s = s.replace(y,'_')
-        return ''.join((c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn'))
+        return _clean_name(s, tuple(symbols_nothing), tuple(symbols_underscore), method)
     
     @staticmethod
     def hashable(col):
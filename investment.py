@@ -1,15 +1,21 @@
 import pandas as pd
 import numpy as np
-from pandas_datareader import data as pdr
-from functools import reduce
 import time
 from datetime import datetime
-from portfolio_funcs import get_weights, simulate_portfolios, factible_weights
+from portfolio_funcs import get_weights, simulate_portfolios, simulate_parallel, simulate_top, SimulationSelector, lot_blocks, allocate_lots, chunk_rows, score_portfolios, RollingStats, top_portfolios, pareto_front, maximize_metric, metric_key, path_metric_args, FRONTIER_RISKS
 from trade_utils import *
+from data_sources import YahooSource, FetchError, fetch_many, to_multiindex
+from alignment import align_frames, convert_currency
+from panel import PricePanel
+from optimizer import optimize_portfolios
+from backtest import walk_forward
+from profiling import NULL_PROFILER, stage
+from risk import VaREngine
 
 
 class Portfolio:
-    def __init__(self, budget, tickers, start='2018-01-01', end=None, interval="d", tickers_change=[], currency_change=["MXN=X"]):
+    def __init__(self, budget, tickers, start='2018-01-01', end=None, interval="d", tickers_change=[], currency_change=["MXN=X"], source=None, dtype=np.float64,
+                 currency_map=None, profiler=None):
         """Get stock pices, currency, calculate best portfolio for investing depending on your  budget
 
         Args:
@@ -20,6 +26,13 @@ class Portfolio:
             interval (str, optional): interval of requesting data, "d" means every day. Defaults to "d".
             tickers_change (list, optional): List of tickers which want to change to a currency. Defaults to [].
             currency_change (list, optional): Ticker of the currency change. Defaults to ["MXN=X"].
+            source (DataSource, optional): where the prices come from, e.g. CachedSource(YahooSource(), PriceStore(path))
+                to keep a local copy and only request new bars, or LocalFileSource to work offline. Defaults to YahooSource().
+            dtype (numpy.dtype, optional): dtype of the price panel, np.float32 halves the memory. Defaults to np.float64.
+            currency_map (dict, optional): ticker -> FX ticker to convert each ticker with its own rate, e.g.
+                {'VTI': 'MXN=X', 'SAP.DE': 'EURMXN=X'}. Defaults to every ticker of tickers_change to currency_change[0].
+            profiler (profiling.Profiler, optional): records the time (and memory) of the stages of get_data, change_currency,
+                get_best_portfolio and bollinger_est. Defaults to None (disabled).
         """
         self.budget = budget
         self.tickers = tickers
@@ -28,45 +41,117 @@ class Portfolio:
         self.interval = interval
         self.tickers_change = tickers_change
         self.currency_change = currency_change
+        self.source = source if source is not None else YahooSource()
+        self.dtype = dtype
+        if currency_map is None:
+            currency_map = {t: currency_change[0] for t in tickers_change} if currency_change else {}
+        self.currency_map = dict(currency_map)
+        self.fx = None
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
 
-    def get_data(self):
-        """Gets Data from Yahoo Finance
+    @stage('get_data')
+    def get_data(self, max_workers=8, retries=2, timeout=None):
+        """Gets Data from the portfolio source (Yahoo Finance by default)
+
+        Args:
+            max_workers (int, optional): tickers downloaded at the same time. Defaults to 8.
+            retries (int, optional): extra attempts for a ticker that fails. Defaults to 2.
+            timeout (float, optional): seconds for the whole download. Defaults to None.
+
+        Raises:
+            FetchError: if any ticker could not be downloaded, the details are in self.fetch_report
 
         Returns:
             pandas.DataFrame: dataframe with stock data
         """
-        data_list = [
-            pdr.get_data_yahoo([l],
-                               start=self.start,
-                               end=self.end,
-                               interval=self.interval) for l in self.tickers
-        ]
+        with self.profiler.span('fetch'):
+            frames, self.fetch_report = fetch_many(self.source, self.tickers,
+                                                   start=self.start,
+                                                   end=self.end,
+                                                   interval=self.interval,
+                                                   max_workers=max_workers,
+                                                   retries=retries,
+                                                   timeout=timeout)
+        if self.fetch_report.failed:
+            raise FetchError(self.fetch_report)
+        data_list = [to_multiindex(frames[l], l) for l in self.tickers]
 
-        self.data = self.merge_list(data_list)
+        # union of dates built once, repeated dates averaged while filling the array
+        with self.profiler.span('align'):
+            panel = PricePanel.from_frames(data_list, dtype=self.dtype)
+        with self.profiler.span('set_panel'):
+            return self.set_panel(panel)
 
-        self.data = self.data.groupby(by='Date').mean()
-        self.adj_close = self.data['Adj Close'].fillna(method='ffill').dropna()
+    def set_panel(self, panel):
+        """Uses a PricePanel (e.g. PricePanel.open of a shared memory-mapped file) as the portfolio data
+
+        Args:
+            panel (PricePanel): prices of the tickers
+
+        Returns:
+            pandas.DataFrame: dataframe with stock data (a view of the panel)
+        """
+        self.panel = panel
+        self.data = panel.frame()
+        adj_close = panel.field('Adj Close')
+        if list(panel.tickers) != list(self.tickers):
+            adj_close = adj_close[self.tickers]
+        # the forward fill is the only copy, after it only the rows before the last listing have nan
+        adj_close = adj_close.ffill()
+        listed = np.flatnonzero(adj_close.notna().all(axis=1).values)
+        self.adj_close = adj_close.iloc[listed[0] if len(listed) else len(adj_close):]
+        # prices in the currency of the source, kept by change_currency once adj_close is converted
+        self._adj_close_raw = None
+        self._converted = {}
+        self._touch()
         return self.data
 
-    def change_currency(self):
-        """Transform the prices to the selected currency
+    @stage('change_currency')
+    def change_currency(self, refresh=False, max_workers=8, retries=2, timeout=None):
+        """Transform the prices to the selected currency, each ticker with the FX of currency_map.
+        The FX series are requested once from the portfolio source (the same cache as the prices with CachedSource),
+        kept in self.fx and aligned as of the price dates. The conversion always starts from the prices in the currency
+        of the source, so calling it again (or with refresh) never converts a ticker twice.
+
+        Args:
+            refresh (bool, optional): request the FX series again even if they are in self.fx. Defaults to False.
+            max_workers (int, optional): FX series downloaded at the same time. Defaults to 8.
+            retries (int, optional): extra attempts for a series that fails. Defaults to 2.
+            timeout (float, optional): seconds for the whole download. Defaults to None.
+
+        Raises:
+            FetchError: if any FX series could not be downloaded
+
+        Returns:
+            pandas.DataFrame: converted adj_close
         """
-        if len(self.tickers_change) > 0:
-            change = pdr.get_data_yahoo(self.currency_change,
-                                        start=self.start,
-                                        end=self.end,
-                                        interval=self.interval)
-            new = self.change_currency_(
-                self.adj_close[self.tickers_change], change['Adj Close'])
-            self.adj_close.drop(columns=self.tickers_change, inplace=True)
-            self.adj_close = pd.merge(
-                self.adj_close, new, how="left", on="Date")
-            self.adj_close.fillna(method='ffill', inplace=True)
-            self.adj_close.dropna(inplace=True)
-        else:
-            pass
+        currency_map = {t: fx for t, fx in self.currency_map.items() if t in self.adj_close.columns}
+        if len(currency_map) == 0:
+            return self.adj_close
+        pairs = sorted(set(currency_map.values()))
+        missing = [p for p in pairs if refresh or self.fx is None or p not in self.fx.columns]
+        if missing:
+            with self.profiler.span('fetch_fx'):
+                frames, report = fetch_many(self.source, missing, start=self.start, end=self.end, interval=self.interval,
+                                            max_workers=max_workers, retries=retries, timeout=timeout)
+            if report.failed:
+                raise FetchError(report)
+            with self.profiler.span('align_fx'):
+                kept = [] if self.fx is None else [self.fx.drop(columns=missing, errors='ignore')]
+                self.fx = align_frames(kept + [frames[p][['Adj Close']].set_axis([p], axis=1) for p in missing])
+                self.fx.index.name = 'Date'
 
-    def get_best_portfolio(self, n_portfolios=10000, risk_free=0, returns_periods=180, budget=None):
+        with self.profiler.span('convert'):
+            if self._adj_close_raw is None:
+                self._adj_close_raw = self.adj_close
+            self.adj_close = convert_currency(self._adj_close_raw, self.fx, currency_map).dropna()
+            self._converted = currency_map
+        self._touch()
+        return self.adj_close
+
+    @stage('get_best_portfolio')
+    def get_best_portfolio(self, n_portfolios=10000, risk_free=0, returns_periods=180, budget=None, memory_budget=None, risk_mode='path',
+                           n_jobs=1, seed=None, method='montecarlo', frontier_points=0, select=(), top_k=10):
         """simulate n portfolios and evaluate the risk and profit associated on each one to calculate the best option
 
         Args:
@@ -74,6 +159,26 @@ class Portfolio:
             risk_free (int, optional): risk free profit (tipically treassure bonds). Defaults to 0.
             returns_periods (int, optional): number of periods to take on the calculation. Defaults to 180.
             budget (float, optional): Availiable budget. Defaults to None.
+            memory_budget (int, optional): bytes available to evaluate the portfolios, if given the weights are drawn,
+                allocated and evaluated in blocks and only the top_k portfolios of every metric and the return/volatility
+                and return/volatility down pareto frontiers are kept in self.weights and self.simulation (useful for
+                millions of portfolios). With n_jobs > 1 every worker streams its own blocks and sends back only the
+                portfolios it kept. Repeated allocations are only dropped within a block. Defaults to None.
+            risk_mode (str, optional): 'path' to measure the volatility over the returns of each portfolio,
+                'cov' to use the covariance of the returns window (much faster for many portfolios). Defaults to 'path'.
+            n_jobs (int, optional): processes used to simulate, the portfolios are split between them. Defaults to 1.
+            seed (int, optional): seed of the random weights, with the same seed and n_jobs the results are
+                reproducible. Defaults to None (global np.random state when n_jobs is 1).
+            method (str, optional): 'montecarlo' to search random portfolios, 'optimize' to solve the long-only
+                max sharpe, max sortino and min volatility portfolios from the covariance of the returns window,
+                with frontier_points the efficient frontier is kept in self.frontier. Defaults to 'montecarlo'.
+            frontier_points (int, optional): points of the efficient frontier when method='optimize', 0 to skip it. Defaults to 0.
+            select (tuple, optional): more metrics to pick a best portfolio on, 'omega' (over risk_free/returns_periods
+                per period), 'returns down', 'tail', 'var {alpha}' or
+                'cvar {alpha}' (e.g. 'cvar 0.05'), computed from the returns path of every portfolio and added to
+                best_portfolio with their name. Case and the spelling of the alpha are ignored ('CVaR 0.050' is
+                'cvar 0.05'), unknown metrics raise ValueError. Defaults to ().
+            top_k (int, optional): portfolios kept per metric with memory_budget, update() picks among them. Defaults to 10.
 
         Returns:
             dict: dictionary with metrics and number of stocks
@@ -83,104 +188,312 @@ class Portfolio:
 
         n_assets = len(self.tickers)
         assets = self.adj_close.tail(1)
+        if budget < assets.values.min():
+            raise ValueError(f"the budget {budget} can not buy a share of any ticker, the cheapest costs {assets.values.min():.2f}")
+        # shares and leftover cash of the allocations that are scored, None when they are solved as continuous weights
+        self.shares = self.leftovers = None
+        # risks of the pareto frontiers kept when only part of the portfolios is kept, None when every one is
+        self.frontiers = None
+
+        profiler = self.profiler
+        self.select = tuple(dict.fromkeys(metric_key(k) for k in select))
+        path_metrics = path_metric_args(self.select)
+        with profiler.span('returns'):
+            returns = self.adj_close.pct_change().dropna()
+            returns = returns.tail(returns_periods)
+        if method == 'optimize':
+            with profiler.span('optimize'):
+                self.weights, self.simulation, self.frontier = optimize_portfolios(
+                    returns, risk_free=risk_free, returns_periods=returns_periods, frontier_points=frontier_points)
+            if self.select:
+                self.simulation.update(simulate_portfolios(self.weights, returns, risk_free=risk_free, returns_periods=returns_periods,
+                                                           sharpe=False, sortino=False, risk_mode='cov', **path_metrics))
+        elif memory_budget is not None:
+            kwargs = dict(risk_free=risk_free, returns_periods=returns_periods, risk_mode=risk_mode, **path_metrics)
+            selector = SimulationSelector(top_k, self._pick_metrics(), frontiers=FRONTIER_RISKS)
+            if n_jobs > 1:
+                with profiler.span('simulate_parallel'):
+                    selector = simulate_parallel(n_assets, n_portfolios, budget, assets.values, returns, n_jobs=n_jobs,
+                                                 seed=seed, top_k=top_k, metrics=selector.metrics,
+                                                 frontiers=FRONTIER_RISKS, memory_budget=memory_budget, **kwargs)
+            else:
+                rng = None if seed is None else np.random.default_rng(np.random.SeedSequence(seed))
+                chunk_size = chunk_rows(len(returns) + n_assets, memory_budget)
+                with profiler.span('simulate_top'):
+                    simulate_top(lot_blocks(n_assets, n_portfolios, budget, assets.values, chunk_size, rng), returns,
+                                 selector=selector, **kwargs)
+            self._keep_selected(selector)
+        elif n_jobs > 1:
+            with profiler.span('simulate_parallel'):
+                self.weights, self.simulation, self.shares, self.leftovers = simulate_parallel(
+                    n_assets, n_portfolios, budget, assets.values, returns, n_jobs=n_jobs, seed=seed, return_shares=True,
+                    risk_free=risk_free, returns_periods=returns_periods, sharpe=True, sortino=True,
+                    risk_mode=risk_mode, **path_metrics)
+        else:
+            rng = None if seed is None else np.random.default_rng(np.random.SeedSequence(seed))
+            with profiler.span('get_weights'):
+                weights = get_weights(
+                    n_assets=n_assets, n_portfolios=n_portfolios, sell=False, rng=rng)
+            with profiler.span('allocate_lots'):
+                self.shares, self.weights, self.leftovers = allocate_lots(budget, weights, assets.values)
+            with profiler.span('simulate_portfolios'):
+                self.simulation = simulate_portfolios(
+                    self.weights, returns, risk_free=risk_free, returns_periods=returns_periods, sharpe=True, sortino=True,
+                    memory_budget=memory_budget, risk_mode=risk_mode, **path_metrics)
+        self.risk_free = risk_free
+        self.returns_periods = returns_periods
+        with profiler.span('rolling_stats'):
+            self.rolling_stats = RollingStats(returns, returns_periods)
+        with profiler.span('select'):
+            return self._set_best_portfolio(budget, assets, self.shares, self.leftovers)
+
+    def _pick_metrics(self):
+        """name -> (key of the simulation, maximize) of the best portfolios, sharpe, sortino, min_vol and self.select"""
+        metrics = {'sharpe': ('sharpe', True), 'sortino': ('sortino', True), 'min_vol': ('volatility', False)}
+        metrics.update({key: (key, maximize_metric(key)) for key in self.select})
+        return metrics
 
-        weights = get_weights(
-            n_assets=n_assets, n_portfolios=n_portfolios, sell=False)
-        self.weights = factible_weights(budget, weights, assets.values)
-        returns = self.adj_close.pct_change().dropna()
-        returns = returns.tail(returns_periods)
-        self.simulation = simulate_portfolios(
-            self.weights, returns, risk_free=risk_free, returns_periods=returns_periods, sharpe=True, sortino=True)
-        sharpe_index = self.simulation['sharpe'].argmax()
-        sortino_index = self.simulation['sortino'].argmax()
-        min_vol_index = self.simulation['volatility'].argmin()
-        sharpe_weights = self.weights[sharpe_index]
-        sortino_weights = self.weights[sortino_index]
-        min_vol_weights = self.weights[min_vol_index]
-
-        self.best_portfolio = {
-            "sharpe": {
-                "weigths": sharpe_weights,
-                "n_buys": ((sharpe_weights*budget)/assets).round(),
-                "budget": (((sharpe_weights*budget)/assets).round()*assets).values.sum(),
-                "return": self.simulation['returns'][sharpe_index],
-                "volatility": self.simulation['volatility'][sharpe_index],
-                "ratio": self.simulation['sharpe'][sharpe_index],
-            },
-            "sortino": {
-                "weigths": sortino_weights,
-                "n_buys": ((sortino_weights*budget)/assets).round(),
-                "budget": (((sortino_weights*budget)/assets).round()*assets).values.sum(),
-                "return": self.simulation['returns'][sortino_index],
-                "volatility": self.simulation['volatility'][sortino_index],
-                "ratio": self.simulation['sortino'][sortino_index],
-            },
-            "min_vol": {
-                "weigths": min_vol_weights,
-                "n_buys": ((min_vol_weights*budget)/assets).round(),
-                "budget": (((min_vol_weights*budget)/assets).round()*assets).values.sum(),
-                "return": self.simulation['returns'][min_vol_index],
-                "volatility": self.simulation['volatility'][min_vol_index],
-                "ratio": self.simulation['sharpe'][min_vol_index],
+    def _keep_selected(self, selector):
+        """keeps in self.weights, self.simulation, self.shares and self.leftovers only the portfolios of the selector,
+        self.frontiers are the risks whose pareto frontiers it kept"""
+        kept = selector.kept()
+        self.frontiers = tuple(selector.frontier)
+        self.weights, self.shares, self.leftovers = kept.pop('weights'), kept.pop('shares'), kept.pop('leftover')
+        kept.pop('index')
+        self.simulation = kept
+
+    def update(self, new_data, budget=None):
+        """Adds new bars to adj_close and refreshes best_portfolio without downloading or simulating again:
+        the mean and covariance of the returns window are updated with the new returns (dropping the oldest)
+        and the already simulated self.weights are scored again. A bar with the same date as the last one replaces it
+        (intraday updates), the shares of best_portfolio are allocated again at the last prices.
+        Requires get_best_portfolio to have been called.
+
+        Args:
+            new_data (pandas.DataFrame): new prices, as returned by get_new_data or with one column per ticker,
+                in the same currency as adj_close
+            budget (float, optional): Availiable budget. Defaults to None.
+
+        Returns:
+            dict: dictionary with metrics and number of stocks
+        """
+        if budget == None:
+            budget = self.budget
+        if isinstance(new_data.columns, pd.MultiIndex):
+            new_data = new_data['Adj Close']
+        new_data = new_data.reindex(columns=self.adj_close.columns).sort_index()
+        new_data = new_data[new_data.index >= self.adj_close.index[-1]]
+
+        converted = getattr(self, '_converted', {})
+        for date, row in new_data.iterrows():
+            last_date = self.adj_close.index[-1]
+            replace = date == last_date
+            previous = self.adj_close.iloc[-2] if replace else self.adj_close.iloc[-1]
+            row = row.fillna(self.adj_close.iloc[-1])
+            r = (row / previous - 1).values
+            # the prices in the source currency are kept in step so change_currency can convert again
+            raw = row
+            if converted:
+                ones = pd.DataFrame(1.0, index=pd.DatetimeIndex([date]), columns=self.adj_close.columns)
+                raw = row / convert_currency(ones, self.fx, converted).iloc[0]
+            if replace:
+                self.adj_close.iloc[-1] = row.values
+                self.rolling_stats.replace_last(r)
+            else:
+                self.adj_close.loc[date] = row.values
+                self.rolling_stats.add(r)
+            if getattr(self, '_adj_close_raw', None) is not None:
+                if self._adj_close_raw.index[-1] == date:
+                    self._adj_close_raw.iloc[-1] = raw.values
+                else:
+                    self._adj_close_raw.loc[date] = raw.values
+        self._touch()
+
+        self.simulation = score_portfolios(self.weights, self.rolling_stats.stats(), risk_free=self.risk_free)
+        if self.select:
+            returns = np.array(self.rolling_stats.window)
+            self.simulation.update(simulate_portfolios(self.weights, returns, risk_free=self.risk_free,
+                                                       returns_periods=self.returns_periods, sharpe=False, sortino=False,
+                                                       risk_mode='cov', **path_metric_args(self.select)))
+        return self._set_best_portfolio(budget, self.adj_close.tail(1))
+
+    def _set_best_portfolio(self, budget, assets, shares=None, leftovers=None):
+        """picks the best sharpe, sortino, min volatility and self.select portfolios of self.simulation,
+        with the shares and leftover of the allocation that was scored or, without them, allocated at the assets prices"""
+        picks = {'sharpe': ('sharpe', True, 'sharpe'), 'sortino': ('sortino', True, 'sortino'),
+                 'min_vol': ('volatility', False, 'sharpe')}
+        picks.update({key: (key, maximize_metric(key), key) for key in getattr(self, 'select', ())})
+        indexes = {name: top_portfolios(self.simulation, key, 1, maximize)[0] for name, (key, maximize, _) in picks.items()}
+        index = list(indexes.values())
+        weights = self.weights[index]
+        if shares is None:
+            result = self._buys(budget, weights, assets)
+            buys, leftovers = result[:len(picks)], result[len(picks):]
+        else:
+            buys = [pd.DataFrame(shares[i].reshape(1, -1), index=assets.index, columns=assets.columns) for i in index]
+            leftovers = leftovers[index]
+
+        self.best_portfolio = {}
+        for (name, (_, _, ratio)), index, w, n_buys, leftover in zip(picks.items(), indexes.values(), weights, buys, leftovers):
+            self.best_portfolio[name] = {
+                "weigths": w,
+                "n_buys": n_buys,
+                "budget": budget - leftover,
+                "leftover": leftover,
+                "return": self.simulation['returns'][index],
+                "volatility": self.simulation['volatility'][index],
+                "ratio": self.simulation[ratio][index],
             }
-        }
 
         return self.best_portfolio
 
-    def bollinger_est(self):
+    def _simulation_frame(self, index):
+        frame = pd.DataFrame({k: np.asarray(v)[index] for k, v in self.simulation.items()}, index=index)
+        weights = pd.DataFrame(self.weights[index], index=index, columns=self.adj_close.columns)
+        return pd.concat([frame, weights], axis=1)
+
+    def top_portfolios(self, metric='sharpe', k=10, maximize=None):
+        """k best simulated portfolios by a metric of self.simulation, without sorting the whole simulation
+
+        Args:
+            metric (str, optional): key of self.simulation ('sharpe', 'sortino', 'volatility', 'returns', ...). Defaults to 'sharpe'.
+            k (int, optional): number of portfolios. Defaults to 10.
+            maximize (bool, optional): True for the highest values, defaults to False for volatilities, VaR and CVaR and True otherwise.
+
+        Returns:
+            pandas.DataFrame: metrics and weights (one column per ticker) from best to worst, indexed by position in the simulation
+        """
+        metric = metric_key(metric)
+        if maximize is None:
+            maximize = maximize_metric(metric)
+        return self._simulation_frame(top_portfolios(self.simulation, metric, k, maximize))
+
+    def pareto_frontier(self, risk='volatility'):
+        """simulated portfolios that are not dominated (no other has more return with less or equal risk).
+        With memory_budget self.simulation keeps the frontiers of every simulated portfolio for the risks in
+        self.frontiers, so the frontier is the same as without it (until update scores the kept portfolios again)
+
+        Args:
+            risk (str, optional): 'volatility' or 'volatility down', or any key of self.simulation without memory_budget.
+                Defaults to 'volatility'.
+
+        Raises:
+            ValueError: with memory_budget, if the frontier of risk was not kept
+
+        Returns:
+            pandas.DataFrame: metrics and weights of the frontier sorted by risk
+        """
+        if getattr(self, 'frontiers', None) is not None and risk not in self.frontiers:
+            raise ValueError(f"with memory_budget only the frontiers of {list(self.frontiers)} are kept, not {risk}")
+        return self._simulation_frame(pareto_front(self.simulation['returns'], self.simulation[risk]))
+
+    def _touch(self):
+        """Marks adj_close as changed, the caches built from it (value_at_risk) are rebuilt on the next call"""
+        self._data_version = getattr(self, '_data_version', 0) + 1
+
+    def value_at_risk(self, weights=None, method='parametric', alphas=(0.05,), horizons=(1,), window=None, value=None,
+                      n_scenarios=10000, seed=None):
+        """VaR and CVaR of many allocations at once from the returns of adj_close (see risk.VaREngine),
+        the statistics and scenarios of the window are cached between calls
+
+        Args:
+            weights (numpy.ndarray, optional): weights (portfolios x tickers). Defaults to self.weights (every simulated portfolio).
+            method (str, optional): 'parametric' (gaussian) or 'montecarlo' (correlated scenarios). Defaults to 'parametric'.
+            alphas (tuple, optional): probabilities of the tail. Defaults to (0.05,).
+            horizons (tuple, optional): periods ahead. Defaults to (1,).
+            window (int, optional): last returns used, defaults to the returns_periods of get_best_portfolio or all.
+            value (float, optional): value invested, losses are in money. Defaults to the budget.
+            n_scenarios (int, optional): Monte Carlo scenarios. Defaults to 10000.
+            seed (int, optional): seed of the scenarios. Defaults to None.
+
+        Returns:
+            dict: 'var {alpha}' and 'cvar {alpha}' -> array (portfolios x horizons)
+        """
+        weights = self.weights if weights is None else weights
+        value = self.budget if value is None else value
+        window = getattr(self, 'returns_periods', None) if window is None else window
+        key = (getattr(self, '_data_version', 0), window, n_scenarios, seed)
+        if getattr(self, '_var_key', None) != key:
+            self.var_engine = VaREngine(self.adj_close.pct_change().dropna(), window=window, n_scenarios=n_scenarios, seed=seed)
+            self._var_key = key
+        if method == 'montecarlo':
+            return self.var_engine.monte_carlo(weights, alphas=alphas, horizons=horizons, value=value)
+        return self.var_engine.parametric(weights, alphas=alphas, horizons=horizons, value=value)
+
+    def backtest(self, lookback=180, rebalance=5, pick='sharpe', method='optimize', budget=None, **kwargs):
+        """Walk-forward backtest of the best portfolio over adj_close, see backtest.walk_forward
+
+        Args:
+            lookback (int, optional): returns in the trailing window of each rebalance. Defaults to 180.
+            rebalance (int or str, optional): every n bars or a pandas frequency ('W', 'M'). Defaults to 5.
+            pick (str, optional): 'sharpe', 'sortino' or 'min_vol'. Defaults to 'sharpe'.
+            method (str, optional): 'optimize' or 'montecarlo'. Defaults to 'optimize'.
+            budget (float, optional): initial cash. Defaults to None (self.budget).
+            **kwargs: n_portfolios, risk_free, returns_periods, n_jobs, seed
+
+        Returns:
+            dict: equity curve, weights, shares, cash, turnover and metrics
+        """
+        if budget == None:
+            budget = self.budget
+        return walk_forward(self.adj_close, budget, lookback=lookback, rebalance=rebalance, pick=pick,
+                            method=method, **kwargs)
+
+    @stage('bollinger_est')
+    def bollinger_est(self, period=20, width=2):
         """Creates df with Bollinger bands and a counter when the bands touch each other
 
+        Args:
+            period (int, optional): window of the moving average and deviation. Defaults to 20.
+            width (float, optional): number of deviations of the bands. Defaults to 2.
+
         Returns:
             pandas.DataFrame: Data frame with bollinger bands 
         """
-        data = self.adj_close
-        df_list = []
-        for tick in self.tickers:
-            df = bollinger_bands(work_df=data, column=tick, period=20)
-            # print(df)
-            # Contador de bellinger
-            # 1 vender -1 comprar
-            contador = df[[f"close_{tick}", f"upper_{tick}", f"lower_{tick}"]].apply(
-                lambda x: 1 if x[f"close_{tick}"] >= x[f'upper_{tick}'] else (-1 if x[f"close_{tick}"] <= x[f'lower_{tick}'] else 0), axis=1)
-            df[f'cont_{tick}'] = (((contador.pct_change()*contador.shift(1)).fillna(
-                0)).replace(0, np.nan).fillna(method='ffill') == 1).astype(int)
-            df_list.append(df)
-        data = self.merge_list(df_list)
-        return data
+        # Contador de bellinger
+        # 1 vender -1 comprar
+        return bollinger_frame(self.adj_close, self.tickers, period=period, width=width)
 
     @staticmethod
-    def get_new_data(tickers, interval, columns):
+    def get_new_data(tickers, interval, columns, source=None, max_workers=8, retries=2, timeout=None, return_report=False):
         """get new data from the tickers specified
 
         Args:
             tickers (list): list with stocks tickers
             interval (str): interval to request the data (like day,week,etc)
             columns (list): clumns wanted in the request
+            source (DataSource, optional): where the prices come from. Defaults to YahooSource().
+            max_workers (int, optional): tickers downloaded at the same time. Defaults to 8.
+            retries (int, optional): extra attempts for a ticker that fails. Defaults to 2.
+            timeout (float, optional): seconds for the whole download. Defaults to None.
+            return_report (bool, optional): also return the FetchReport instead of raising, the tickers that
+                failed are left empty. Defaults to False.
+
+        Raises:
+            FetchError: if any ticker could not be downloaded and return_report is False
 
         Returns:
-            pandas.DataFrame: [description]
+            pandas.DataFrame: new bars of every ticker (and the FetchReport if return_report)
         """
+        source = source if source is not None else YahooSource()
         today = datetime.fromtimestamp(time.time()).strftime("%Y-%m-%d")
-        new_list = []
-        for l in tickers:
-            try:
-                df = pdr.get_data_yahoo([l],
-                                        start=today,
-                                        end=None,
-                                        interval=interval)
-            except:
-                # c = self.data.columns.get_level_values(0).unique().values
-                df = pd.DataFrame(columns=pd.MultiIndex.from_tuples(
-                    [(x, l) for x in columns]))
-
-            new_list.append(df)
-        new = reduce(lambda left, right: pd.merge(left, right,
-                                                  left_index=True,
-                                                  right_index=True,
-                                                  how='outer'),
-                     new_list)
+        frames, report = fetch_many(source, tickers, start=today, end=None, interval=interval,
+                                    max_workers=max_workers, retries=retries, timeout=timeout)
+        if report.failed and not return_report:
+            raise FetchError(report)
+        empty = pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Date'), dtype=np.float64)
+        new = align_frames([to_multiindex(frames[l] if l in frames else empty, l) for l in tickers])
+        if return_report:
+            return new, report
         return new
 
+    @staticmethod
+    def _buys(budget, weights, assets):
+        """whole shares to buy for each row of weights within the budget, and the cash left"""
+        shares, _, leftover = allocate_lots(budget, weights, assets.values, unique=False)
+        buys = [pd.DataFrame(row.reshape(1, -1), index=assets.index, columns=assets.columns) for row in shares]
+        return (*buys, *leftover)
+
     @staticmethod
     def merge_list(data_list):
         """list of data frames merged into one DataFrame
@@ -191,17 +504,10 @@ class Portfolio:
         Returns:
             pandas.DataFrame: merged DataFrame
         """
-        data = reduce(lambda left, right: pd.merge(left, right,
-                                                   left_index=True,
-                                                   right_index=True,
-                                                   how='outer'),
-                      data_list)
+        data = align_frames(data_list)
         return data
 
     @staticmethod
     def change_currency_(data, change):
-        new = pd.merge(change, data, how="inner", on='Date')
-        new = pd.DataFrame(new[change.columns].values.reshape(-1, 1)*new[data.columns].values,
-                           columns=data.columns,
-                           index=new.index)
-        return new
+        """every column of data times the first column of change as of the dates of data"""
+        return convert_currency(data, change, {c: change.columns[0] for c in data.columns}).dropna()
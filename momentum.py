@@ -1,28 +1,74 @@
 #******************************************Rolling Funcs ******************************************
 import numpy as np
-def exp_2_avg(x): 
-    x = x[::-1]
-    weights = np.array([2**(len(x) - 1 - y) /(2**(len(x))-1) for y in range(len(x))])
-    average = np.dot(np.array(x),weights)
-    return average
-
-def exp_e_avg(x): 
-    x = x[::-1]
-    weights = np.array([np.e**(len(x) - 1 - y) /(np.e**(len(x))-1) for y in range(len(x))])
-    average = np.dot(np.array(x),weights)
-    return average
+import pandas as pd
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+KERNEL_BASES = {'exp_2': 2, 'exp_e': np.e}
+
+def _base(kind, constant):
+    if kind == 'exp_x':
+        return constant
+    return KERNEL_BASES[kind]
+
+@lru_cache(maxsize=None)
+def kernel_weights(kind, window, constant=10):
+    """normalized weights (sum 1) of a window in chronological order, the newest value has the biggest weight.
+    kind: 'exp_2', 'exp_e', 'exp_x' (base constant) or 'pond' (linear).
+    Built in log space so windows of thousands of bars don't overflow, cached per (kind, window, constant)"""
+    j = np.arange(window, dtype=np.float64)
+    if kind == 'pond':
+        w = (j + 1) / (window * (window + 1) / 2)
+    else:
+        lw = j * np.log(_base(kind, constant))
+        lw -= lw.max() + np.log(np.exp(lw - lw.max()).sum())
+        w = np.exp(lw)
+    w.flags.writeable = False
+    return w
+
+def _legacy_scale(kind, constant=10):
+    "sum of the weights of the original exp_*_avg functions, c^k/(c^n-1) adds up to 1/(c-1)"
+    return 1.0 if kind == 'pond' else 1 / (_base(kind, constant) - 1)
+
+def _window_avg(x, kind, constant=10):
+    x = np.asarray(x, dtype=np.float64)
+    return np.dot(x, kernel_weights(kind, len(x), constant)) * _legacy_scale(kind, constant)
+
+def weighted_average(x, window, kind='exp_e', constant=10):
+    """rolling weighted average of the whole series (or of every column) at once, nan until the window is complete.
+    Exponential kinds use the recursion E_t = x_t + E_{t-1}/c, A_t = E_t - c^-window E_{t-window} (O(N));
+    pond, or series with nan, use the cached weights over a sliding window.
+    Returns the normalized average, exp_*_avg(x) equals it times 1/(c-1)."""
+    values = np.asarray(x, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        w = kernel_weights(kind, window, constant)
+        if kind != 'pond' and not np.isnan(values).any():
+            c = _base(kind, constant)
+            ema = lfilter([1.0], [1.0, -1 / c], values, axis=0)
+            windowed = ema[window - 1:].copy()
+            windowed[1:] -= c ** -float(window) * ema[:-window]
+            out[window - 1:] = windowed * w[-1]
+        else:
+            out[window - 1:] = sliding_window_view(values, window, axis=0) @ w
+    if isinstance(x, pd.DataFrame):
+        return pd.DataFrame(out, index=x.index, columns=x.columns)
+    if isinstance(x, pd.Series):
+        return pd.Series(out, index=x.index, name=x.name)
+    return out
+
+def exp_2_avg(x):
+    return _window_avg(x, 'exp_2')
+
+def exp_e_avg(x):
+    return _window_avg(x, 'exp_e')
 
 def exp_x_avg(x,constant=10):
-    x = x[::-1]
-    weights = np.array([constant**(len(x) - 1 - y) /(constant**(len(x))-1) for y in range(len(x))])
-    average = np.dot(np.array(x),weights)
-    return average
+    return _window_avg(x, 'exp_x', constant)
 
-def pond_avg(x): 
-    x = x[::-1]
-    weights = np.array([((len(x)-y))/(int(((len(x))*((len(x)+1))))/2) for y in range(len(x))])
-    average = np.dot(np.array(x),weights)
-    return average
+def pond_avg(x):
+    return _window_avg(x, 'pond')
 
 def relu(x):
     return max(0,x)
@@ -39,7 +85,7 @@ def RSI(x, agg=exp_e_avg):
     down = up*(-1)
     up = up.clip(0,np.inf)
     down = down.clip(0,np.inf)
-    rsi =  ( agg(up)/ (agg(up)+agg(down)) ) * 100 - 100/1+(agg)
+    rsi =  ( agg(up)/ (agg(up)+agg(down)) ) * 100
     return rsi
 
 def RS(x, agg=exp_e_avg):
@@ -135,16 +181,122 @@ def ultimate(close,low,high):
     R = (h_n - closing)/(h_n-l_n)
 
 
+# ----------------------------------------- Batch Oscillators -----------------------------------------
+# every indicator for every column and window in one pass, same values as rolling(window).apply(indicator)
+
+OSCILLATORS = ('RSI', 'RS', 'K_line', 'D_line', 'williams', 'CCI', 'awesome_oscilator', 'momentum', 'MACD')
+
+def _rolling_extreme(a, window, func, fill):
+    "van Herk/Gil-Werman rolling max/min along axis 0, O(N) whatever the window, nan when the window has nan"
+    n = len(a)
+    out = np.full(a.shape, np.nan)
+    if n < window:
+        return out
+    nan = np.isnan(a)
+    b = np.where(nan, fill, a)
+    pad = (-n) % window
+    b = np.concatenate([b, np.full((pad,) + a.shape[1:], fill)])
+    blocks = b.reshape((-1, window) + a.shape[1:])
+    prefix = func.accumulate(blocks, axis=1).reshape(b.shape)
+    suffix = func.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(b.shape)
+    out[window - 1:] = func(suffix[:n - window + 1], prefix[window - 1:n])
+    n_nan = np.cumsum(np.concatenate([np.zeros((1,) + a.shape[1:]), nan]), axis=0)
+    out[window - 1:][(n_nan[window:] - n_nan[:-window]) > 0] = np.nan
+    return out
+
+def rolling_max(a, window):
+    return _rolling_extreme(np.asarray(a, dtype=np.float64), window, np.maximum, -np.inf)
+
+def rolling_min(a, window):
+    return _rolling_extreme(np.asarray(a, dtype=np.float64), window, np.minimum, np.inf)
+
+def _rolling_mean(a, window):
+    return pd.DataFrame(a).rolling(window).mean().values
+
+def _lagged(a, lag):
+    out = np.full(a.shape, np.nan)
+    out[lag:] = a[:-lag] if lag else a
+    return out
+
+def oscillators(prices, indicators=OSCILLATORS, windows=(14,), agg='exp_e', short_period=12, ao_period=5):
+    """Computes the momentum indicators for every column of prices and every window at once.
+    Up/down moves, rolling means and rolling extrema are shared between indicators, rolling max/min are O(N).
+
+    Args:
+        prices (pandas.DataFrame): prices (dates x tickers), typically adj_close
+        indicators (tuple, optional): names of the indicators in this module. Defaults to OSCILLATORS.
+        windows (tuple, optional): windows (bars of the rolling). Defaults to (14,).
+        agg (str, optional): kernel of RSI and RS ('exp_2', 'exp_e', 'exp_x', 'pond'). Defaults to 'exp_e'.
+        short_period (int, optional): short average of MACD. Defaults to 12.
+        ao_period (int, optional): short mean of awesome_oscilator. Defaults to 5.
+
+    Returns:
+        pandas.DataFrame: one column per indicator, ticker and window named {indicator}_{ticker}_{window}
+    """
+    if isinstance(prices, pd.Series):
+        prices = prices.to_frame()
+    x = prices.values.astype(np.float64)
+    columns = list(prices.columns)
+    diff = np.diff(x, axis=0)
+    n_nan = np.cumsum(np.vstack([np.zeros((1, x.shape[1])), np.isnan(x)]), axis=0)
+    up, down = diff.clip(0, np.inf), (-diff).clip(0, np.inf)
+    names, blocks = [], []
+
+    for w in windows:
+        cache = {}
+        def get(key, func):
+            if key not in cache:
+                cache[key] = func()
+            return cache[key]
+        high = lambda: get('max', lambda: rolling_max(x, w))
+        low = lambda: get('min', lambda: rolling_min(x, w))
+        mean = lambda: get('mean', lambda: _rolling_mean(x, w))
+        # the window of w prices has w-1 changes
+        up_avg = lambda: get('up', lambda: np.vstack([np.full((1, x.shape[1]), np.nan), weighted_average(up, w - 1, agg)]))
+        down_avg = lambda: get('down', lambda: np.vstack([np.full((1, x.shape[1]), np.nan), weighted_average(down, w - 1, agg)]))
+
+        # like rolling().apply, windows that are incomplete or have nan are nan
+        invalid = np.ones(x.shape, dtype=bool)
+        invalid[w - 1:] = (n_nan[w:] - n_nan[:len(x) - w + 1]) > 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name in indicators:
+                if name == 'RSI':
+                    value = up_avg() / (up_avg() + down_avg()) * 100
+                elif name == 'RS':
+                    value = up_avg() / down_avg()
+                elif name == 'K_line':
+                    value = (x - low()) / (high() - low())
+                elif name == 'D_line':
+                    value = high() / low()
+                elif name == 'williams':
+                    value = (high() - x) / (high() - low())
+                elif name == 'CCI':
+                    dev = x - mean()
+                    value = dev / (0.015 * np.abs(dev) / w)
+                elif name == 'awesome_oscilator':
+                    value = mean() - _rolling_mean(x, min(ao_period, w))
+                elif name == 'momentum':
+                    value = x - _lagged(x, w - 1)
+                elif name == 'MACD':
+                    scale = _legacy_scale('exp_e')
+                    value = (weighted_average(x, min(short_period, w), 'exp_e') - weighted_average(x, w, 'exp_e')) * scale
+                else:
+                    raise ValueError(f"unknown indicator {name}")
+                value = np.where(invalid, np.nan, value)
+                names += [f"{name}_{col}_{w}" for col in columns]
+                blocks.append(value)
+
+    return pd.DataFrame(np.hstack(blocks), index=prices.index, columns=names)
+
 # ----------------------------------------- Performance Statistics -----------------------------------------
 # also useful to portfolio management
 
 def mdd(x):
     "Maximum drawdown, for absolute price, not the returns. closer to 0 is better"
-    x = np.array(x)
-    high_index = x.argmax()
-    high = x.max()
-    low = x[high_index:].min()
-    result = abs((low-high)/high)
+    x = np.array(x, dtype=np.float64)
+    peak = np.maximum.accumulate(x)
+    result = abs(((x-peak)/peak).min())
     return result
 
 def RoMad(x):
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+from portfolio_funcs import returns_stats, score_portfolios
+
+
+class OptimizationError(Exception):
+    """Raised when the quadratic program of an optimizer can not be solved, the optimum is never replaced by another portfolio"""
+
+
+def _quadratic_program(cov, A, b, x, free, max_iter=None):
+    """min x'Vx subject to A x = b and x >= 0, primal active-set method. It starts from the feasible x, every weight
+    outside free must be 0 and stays at 0 until its multiplier says the objective decreases by releasing it.
+    The supports of the optimal portfolios are small, so the linear systems are of the size of the support.
+
+    Args:
+        cov (numpy.ndarray): covariance (n x n)
+        A (numpy.ndarray): equality constraints (m x n)
+        b (numpy.ndarray): right hand side (m)
+        x (numpy.ndarray): feasible starting point
+        free (numpy.ndarray): positions that start free
+        max_iter (int, optional): iterations before raising OptimizationError. Defaults to 10·n + 100.
+
+    Returns:
+        numpy.ndarray: optimal x
+    """
+    n, m = len(x), len(A)
+    # a tiny ridge keeps the systems solvable when V is singular (more assets than returns)
+    cov = cov + np.eye(n) * (1e-12 * np.trace(cov) / n + 1e-300)
+    x = np.array(x, dtype=np.float64)
+    is_free = np.zeros(n, dtype=bool)
+    is_free[free] = True
+    for _ in range(10 * n + 100 if max_iter is None else max_iter):
+        F = np.flatnonzero(is_free)
+        k = len(F)
+        kkt = np.zeros((k + m, k + m))
+        kkt[:k, :k] = 2 * cov[np.ix_(F, F)]
+        kkt[:k, k:] = -A[:, F].T
+        kkt[k:, :k] = A[:, F]
+        rhs = np.concatenate([-2 * cov[F] @ x, np.zeros(m)])
+        try:
+            sol = np.linalg.solve(kkt, rhs)
+        except np.linalg.LinAlgError:
+            sol = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+        p, lam = sol[:k], sol[k:]
+        if np.abs(p).max(initial=0) <= 1e-12 * max(1.0, np.abs(x).max()):
+            grad = 2 * cov @ x
+            # multipliers of the weights fixed at 0, negative when releasing the weight lowers the objective
+            nu = grad - A.T @ lam
+            nu[F] = np.inf
+            i = nu.argmin()
+            if nu[i] >= -1e-10 * (np.abs(grad).max() + np.abs(A.T @ lam).max()):
+                return np.clip(x, 0, None)
+            is_free[i] = True
+            continue
+        blocking = p < 0
+        steps = np.full(k, np.inf)
+        steps[blocking] = -x[F][blocking] / p[blocking]
+        j = steps.argmin()
+        alpha = min(1.0, steps[j])
+        x[F] += alpha * p
+        if alpha < 1:
+            x[F[j]] = 0
+            is_free[F[j]] = False
+    raise OptimizationError(f"the quadratic program did not converge in {max_iter or 10 * n + 100} iterations")
+
+
+def _pair(values, target):
+    """feasible weights with sum 1 and values @ w == target from the two assets around the target"""
+    below = np.flatnonzero(values <= target)
+    above = np.flatnonzero(values >= target)
+    i = below[values[below].argmax()]
+    j = above[values[above].argmin()]
+    w = np.zeros(len(values))
+    if values[j] == values[i]:
+        w[i] = 1
+    else:
+        w[i] = (values[j] - target) / (values[j] - values[i])
+        w[j] = 1 - w[i]
+    return w, np.unique([i, j])
+
+
+def min_volatility(cov):
+    """Long-only weights with the minimum variance w'Vw
+
+    Args:
+        cov (numpy.ndarray): covariance of the returns (n_assets x n_assets)
+
+    Returns:
+        numpy.ndarray: weights
+    """
+    cov = np.asarray(cov, dtype=np.float64)
+    n = len(cov)
+    start = np.diag(cov).argmin()
+    return _quadratic_program(cov, np.ones((1, n)), np.ones(1), np.eye(n)[start], [start])
+
+
+def max_ratio(means, cov, risk_free=0):
+    """Long-only weights with the maximum (1 + w'mu - risk_free)/sqrt(w'Vw), the ratio used by simulate_portfolios,
+    sharpe with the covariance of the returns and sortino with the downside covariance.
+    As the weights add up to 1 the ratio is w'a/sqrt(w'Vw) with a = 1 + mu - risk_free, solved exactly as the
+    convex program min y'Vy subject to a'y = 1, y >= 0 and w = y/sum(y).
+
+    Args:
+        means (numpy.ndarray): mean returns scaled by the returns periods
+        cov (numpy.ndarray): covariance (or downside covariance) of the returns
+        risk_free (float, optional): risk free profit. Defaults to 0.
+
+    Raises:
+        OptimizationError: if no asset has 1 + mean - risk_free > 0 or the program does not converge
+
+    Returns:
+        numpy.ndarray: weights
+    """
+    means, cov = np.asarray(means, dtype=np.float64), np.asarray(cov, dtype=np.float64)
+    excess = 1 + means - risk_free
+    if excess.max() <= 0:
+        raise OptimizationError("no asset has a positive 1 + mean - risk_free, the ratio can not be maximized")
+    # the best single asset is a feasible start
+    ratios = np.where(excess > 0, excess / np.sqrt(np.maximum(np.diag(cov), 1e-300)), -np.inf)
+    start = ratios.argmax()
+    y = _quadratic_program(cov, excess[None], np.ones(1), np.eye(len(means))[start] / excess[start], [start])
+    return y / y.sum()
+
+
+def efficient_frontier(means, cov, n_points=50, x0=None):
+    """Minimum variance long-only portfolios for target returns between the minimum volatility portfolio
+    and the asset with the highest return. Each point is the convex program min w'Vw subject to sum(w) = 1,
+    w'mu = target and w >= 0, started with the support of the previous point free.
+
+    Args:
+        means (numpy.ndarray): mean returns scaled by the returns periods
+        cov (numpy.ndarray): covariance of the returns
+        n_points (int, optional): number of target returns. Defaults to 50.
+        x0 (numpy.ndarray, optional): minimum volatility weights if already solved. Defaults to None.
+
+    Returns:
+        tuple(numpy.ndarray, numpy.ndarray): weights (n_points x n_assets) and their returns (w'mu + 1)
+    """
+    means, cov = np.asarray(means, dtype=np.float64), np.asarray(cov, dtype=np.float64)
+    w = min_volatility(cov) if x0 is None else x0
+    A = np.vstack([np.ones(len(means)), means])
+    weights = [w]
+    for target in np.linspace(w @ means, means.max(), n_points)[1:]:
+        start, pair = _pair(means, target)
+        free = np.union1d(np.flatnonzero(w > 0), pair)
+        w = _quadratic_program(cov, A, np.array([1, target]), start, free)
+        weights.append(w)
+    weights = np.stack(weights[:n_points])
+    return weights, weights @ means + 1
+
+
+def optimize_portfolios(returns, risk_free=0, returns_periods=180, frontier_points=0):
+    """Max sharpe, max sortino and min volatility portfolios solved from the statistics of the returns window
+
+    Args:
+        returns (pandas.DataFrame): returns of the assets (periods x assets)
+        risk_free (float, optional): risk free profit. Defaults to 0.
+        returns_periods (int, optional): periods used to scale the mean returns. Defaults to 180.
+        frontier_points (int, optional): points of the efficient frontier, 0 to skip it. Defaults to 0.
+
+    Raises:
+        OptimizationError: if a portfolio can not be solved
+
+    Returns:
+        tuple(numpy.ndarray, dict, pandas.DataFrame): weights of the sharpe, sortino and min volatility portfolios (3 x n_assets),
+            their simulation dict (as simulate_portfolios) and the efficient frontier (returns, volatility, sharpe and
+            one column of weights per asset) or None
+    """
+    stats = returns_stats(returns, returns_periods)
+    min_vol = min_volatility(stats['cov'])
+    weights = np.stack([max_ratio(stats['means'], stats['cov'], risk_free),
+                        max_ratio(stats['means'], stats['cov down'], risk_free),
+                        min_vol])
+    simulation = score_portfolios(weights, stats, risk_free=risk_free)
+
+    frontier = None
+    if frontier_points:
+        f_weights, _ = efficient_frontier(stats['means'], stats['cov'], frontier_points, x0=min_vol)
+        f_sim = score_portfolios(f_weights, stats, risk_free=risk_free, sortino=False)
+        columns = list(returns.columns) if isinstance(returns, pd.DataFrame) else list(range(f_weights.shape[1]))
+        frontier = pd.concat([pd.DataFrame(f_sim), pd.DataFrame(f_weights, columns=columns)], axis=1)
+    return weights, simulation, frontier
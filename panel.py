@@ -0,0 +1,92 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from alignment import align_panel, panel_to_frame
+
+
+class PricePanel:
+    """Dense dates x tickers x fields array of prices with zero-copy DataFrame views.
+    It can be saved to a folder and opened as a memory-mapped file, so several processes share
+    one panel without loading it into memory.
+
+    Args:
+        dates (pandas.DatetimeIndex): dates of the panel
+        tickers (list[str]): tickers, second axis
+        fields (list[str]): fields (Open, High, Low, Close, Adj Close, Volume), third axis
+        values (numpy.ndarray): array (dates x tickers x fields), float64, float32 or a memmap
+    """
+
+    def __init__(self, dates, tickers, fields, values):
+        if values.shape != (len(dates), len(tickers), len(fields)):
+            raise ValueError(f"values shape {values.shape} does not match dates x tickers x fields")
+        self.dates = pd.DatetimeIndex(dates, name='Date')
+        self.tickers = list(tickers)
+        self.fields = list(fields)
+        self.values = values
+        self.ticker_index = {t: i for i, t in enumerate(self.tickers)}
+        self.field_index = {f: i for i, f in enumerate(self.fields)}
+
+    @classmethod
+    def from_frames(cls, data_list, dtype=np.float64):
+        """Panel from frames with (field, ticker) columns, aligned with alignment.align_panel"""
+        return cls(*align_panel(data_list, dtype=dtype))
+
+    @classmethod
+    def from_frame(cls, df, dtype=np.float64):
+        """Panel from a wide DataFrame with (field, ticker) columns like Portfolio.data"""
+        return cls.from_frames([df], dtype=dtype)
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def field(self, name, tickers=None):
+        """DataFrame (dates x tickers) of one field, a view of the panel when tickers is None"""
+        values = self.values[:, :, self.field_index[name]]
+        if tickers is None:
+            return pd.DataFrame(values, index=self.dates, columns=pd.Index(self.tickers, name='Symbols'), copy=False)
+        cols = [self.ticker_index[t] for t in tickers]
+        return pd.DataFrame(values[:, cols], index=self.dates, columns=pd.Index(tickers, name='Symbols'))
+
+    def ticker(self, name):
+        """DataFrame (dates x fields) of one ticker, a view of the panel"""
+        return pd.DataFrame(self.values[:, self.ticker_index[name], :], index=self.dates,
+                            columns=pd.Index(self.fields, name='Attributes'), copy=False)
+
+    def frame(self):
+        """Wide DataFrame with (field, ticker) columns as Portfolio.data, a view when the array is contiguous"""
+        return panel_to_frame(self.dates, self.tickers, self.fields, self.values)
+
+    def astype(self, dtype):
+        return PricePanel(self.dates, self.tickers, self.fields, self.values.astype(dtype))
+
+    def save(self, path):
+        """Writes the panel to the folder path (values.npy and meta.json)"""
+        os.makedirs(path, exist_ok=True)
+        out = np.lib.format.open_memmap(os.path.join(path, 'values.npy'), mode='w+',
+                                        dtype=self.values.dtype, shape=self.values.shape)
+        out[:] = self.values
+        out.flush()
+        del out
+        meta = {'dates': self.dates.values.astype('datetime64[ns]').astype(np.int64).tolist(),
+                'tickers': self.tickers, 'fields': self.fields}
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        """Opens a panel saved with save as a memory-mapped array
+
+        Args:
+            path (str): folder of the panel
+            mode (str, optional): 'r' read only, 'r+' to modify the file, 'c' copy on write. Defaults to 'r'.
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mode)
+        dates = pd.DatetimeIndex(np.array(meta['dates'], dtype='datetime64[ns]'))
+        return cls(dates, meta['tickers'], meta['fields'], values)
+
+    def __repr__(self):
+        return f"PricePanel({len(self.dates)} dates x {len(self.tickers)} tickers x {len(self.fields)} fields, {self.dtype})"
@@ -1,15 +1,41 @@
 import numpy as np
-from functools import partial
+import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from risk import omega_batch, tail_ratio_batch, var_cvar_batch
 
-def get_weights(n_assets,n_portfolios, sell=False):
-    weights = np.random.random(size=(n_assets,n_portfolios))
+def get_weights(n_assets,n_portfolios, sell=False, rng=None):
+    "random weights (n_portfolios x n_assets) that add up to 1, drawn from rng (numpy Generator) or the global np.random state"
+    rng = np.random if rng is None else rng
+    weights = rng.random(size=(n_assets,n_portfolios))
     weights /= sum(weights)
     weights = np.stack(weights,axis=1)
     if sell:
-        weights *= np.random.choice([-1, 1], size=weights.shape)
+        weights *= rng.choice([-1, 1], size=weights.shape)
     return weights
 
-def simulate_portfolios(weights, returns, risk_free=0, returns_periods=180, interval='d', sharpe=True, sortino=True, omega=False, tail=False):
+def simulate_portfolios(weights, returns, risk_free=0, returns_periods=180, interval='d', sharpe=True, sortino=True, omega=False, tail=False,
+                        chunk_size=None, memory_budget=None, risk_mode='path', var_alphas=(), tail_q=0.10):
+    """returns, volatility and ratios of every portfolio over the returns window.
+    With chunk_size or memory_budget (bytes) the portfolios are projected over the returns in blocks,
+    so the n_portfolios x returns_periods matrix is never built, the results are numpy arrays.
+    With risk_mode='cov' the volatilities come from the covariance (and downside covariance) of the
+    returns as sqrt(w'Vw), O(n_assets²) per portfolio instead of O(returns_periods·n_assets).
+    omega (over risk_free/returns_periods per period, with its 'returns down'), tail (ratio of the tails of fraction tail_q)
+    and the historical 'var {alpha}' and 'cvar {alpha}' of var_alphas come from the returns path of every portfolio, always in blocks (256 MB by default) and with np.partition.
+    """
+    path_metrics = dict(omega=omega, tail=tail, var_alphas=var_alphas, tail_q=tail_q)
+    with_paths = omega or tail or len(var_alphas) > 0
+    if risk_mode == 'cov':
+        dic = score_portfolios(weights, returns_stats(returns, returns_periods), risk_free=risk_free,
+                               sharpe=sharpe, sortino=sortino)
+        if with_paths:
+            dic.update(_simulate_chunked(weights, returns, risk_free=risk_free, returns_periods=returns_periods, sharpe=False,
+                                         sortino=False, chunk_size=chunk_size, memory_budget=memory_budget, **path_metrics))
+        return dic
+    if chunk_size is not None or memory_budget is not None or with_paths:
+        return _simulate_chunked(weights, returns, risk_free=risk_free, returns_periods=returns_periods, sharpe=sharpe,
+                                 sortino=sortino, chunk_size=chunk_size, memory_budget=memory_budget, **path_metrics)
     dic = dict()
 
     means = returns.mean() * returns_periods
@@ -19,27 +45,11 @@ def simulate_portfolios(weights, returns, risk_free=0, returns_periods=180, inte
         volatility = (weights @ returns.T).std(1)
         dic['volatility'] = volatility
         dic['sharpe'] = (returns_porfolio-risk_free)/volatility
-    if omega:
-        returns_down = np.clip(returns, -np.inf,0)
-        #returns_up = np.clip(returns, 0,np.inf)
-        down_means = returns_down.abs().mean()*returns_periods
-        #up_means = returns_up.abs().mean()*returns_periods
-        rets_down = (weights @ down_means + 1 )
-        # rets_up = (weights @ up_means + 1 )
-        dic['returns down'] = rets_down
-#         dic['omega'] = rets_up/rets_down
-        dic['omega'] = 1 + (returns_porfolio-risk_free)/rets_down
     if sortino:
         returns_down = np.clip(returns, -np.inf,0)
         volatility_down = (weights @ returns_down.T).std(1)
         dic['volatility down'] = volatility_down
         dic['sortino'] = (returns_porfolio-risk_free)/volatility_down
-    # if tail:
-    #     rets = sorted(np.array(returns_porfolio))
-    #     lenght = int(np.ceil((0.10*len(x))))
-    #     right_tail = sum(rets[-lenght:])
-    #     left_tail = sum(rets[:lenght])
-    #     dic['tail'] = right_tail/left_tail
     # mean_returns = monthly_returns.mean()
     # cov_matrix = monthly_returns.cov()
     # precision_matrix = pd.DataFrame(inv(cov_matrix), index=stocks,
@@ -47,22 +57,434 @@ def simulate_portfolios(weights, returns, risk_free=0, returns_periods=180, inte
     # kelly_wt = precision_matrix.dot(mean_returns).values
     return dic
          
+def returns_stats(returns, returns_periods=180):
+    """statistics of the returns window that define the portfolios risk
+
+    Returns:
+        dict: 'means' (mean returns scaled by returns_periods), 'cov' (covariance of the returns)
+            and 'cov down' (covariance of the returns clipped at 0)
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    returns_down = np.clip(returns, -np.inf, 0)
+    return {'means': returns.mean(0) * returns_periods,
+            'cov': np.atleast_2d(np.cov(returns, rowvar=False)),
+            'cov down': np.atleast_2d(np.cov(returns_down, rowvar=False))}
+
+class RollingStats:
+    """mean and covariance (and downside covariance) of a returns window kept as running sums,
+    updated in O(n_assets²) adding the newest returns and dropping the oldest.
+
+    Args:
+        returns (pandas.DataFrame): returns window (periods x assets)
+        returns_periods (int, optional): size of the window and scale of the mean returns. Defaults to 180.
+        window (int, optional): size of the window if different from returns_periods. Defaults to None.
+    """
+    def __init__(self, returns, returns_periods=180, window=None):
+        returns = np.asarray(returns, dtype=np.float64)
+        self.returns_periods = returns_periods
+        self.window_size = returns_periods if window is None else window
+        # sums of the returns minus the initial mean keep the covariance precise
+        self.center = returns.mean(0)
+        # deque drops the oldest returns in O(1), a longer initial window is kept at its length as before
+        self.window = deque(returns, maxlen=max(self.window_size, len(returns)))
+        self.sums, self.cross = self._sums(returns - self.center)
+        self.down_sums, self.down_cross = self._sums(np.clip(returns, -np.inf, 0))
+
+    @staticmethod
+    def _sums(x):
+        return x.sum(0), x.T @ x
+
+    def _apply(self, r, sign):
+        c = r - self.center
+        d = np.clip(r, -np.inf, 0)
+        self.sums = self.sums + sign*c
+        self.cross = self.cross + sign*np.outer(c, c)
+        self.down_sums = self.down_sums + sign*d
+        self.down_cross = self.down_cross + sign*np.outer(d, d)
+
+    def add(self, r):
+        "adds the newest returns, drops the oldest when the window is full"
+        r = np.asarray(r, dtype=np.float64)
+        if len(self.window) == self.window.maxlen:
+            self._apply(self.window[0], -1)
+        self.window.append(r)
+        self._apply(r, 1)
+
+    def replace_last(self, r):
+        "replaces the newest returns (the last bar was updated)"
+        r = np.asarray(r, dtype=np.float64)
+        self._apply(self.window[-1], -1)
+        self.window[-1] = r
+        self._apply(r, 1)
+
+    def stats(self):
+        "same dict as returns_stats of the current window"
+        n = len(self.window)
+        means = self.sums/n + self.center
+        cov = (self.cross - np.outer(self.sums, self.sums)/n)/(n-1)
+        cov_down = (self.down_cross - np.outer(self.down_sums, self.down_sums)/n)/(n-1)
+        return {'means': means * self.returns_periods, 'cov': cov, 'cov down': cov_down}
+
+def portfolio_volatility(weights, cov):
+    "sqrt(w'Vw) for every row of weights"
+    return np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', weights, cov, weights), 0))
+
+def score_portfolios(weights, stats, risk_free=0, sharpe=True, sortino=True):
+    """returns, volatility and ratios of every portfolio from the statistics of returns_stats"""
+    dic = dict()
+    dic['returns'] = weights @ stats['means'] + 1
+    if sharpe:
+        dic['volatility'] = portfolio_volatility(weights, stats['cov'])
+        dic['sharpe'] = (dic['returns']-risk_free)/dic['volatility']
+    if sortino:
+        dic['volatility down'] = portfolio_volatility(weights, stats['cov down'])
+        dic['sortino'] = (dic['returns']-risk_free)/dic['volatility down']
+    return dic
+
+def chunk_rows(n_periods, memory_budget=256*2**20, itemsize=8):
+    "number of portfolios whose projection over n_periods (path, downside path and std temporaries) fits in memory_budget bytes"
+    return max(1, int(memory_budget // (3 * n_periods * itemsize)))
+
+def weight_blocks(weights, chunk_size):
+    "yields consecutive blocks of chunk_size rows of weights"
+    for start in range(0, len(weights), chunk_size):
+        yield weights[start:start + chunk_size]
+
+def _path_stats(path, omega=False, tail=False, var_alphas=(), tail_q=0.10, risk_free=0, returns_periods=180):
+    """omega, tail ratio, VaR and CVaR of the returns paths (portfolios x periods) with the batched functions of risk.py,
+    omega is over risk_free/returns_periods per period and 'returns down' is its mean downside over returns_periods + 1"""
+    dic = dict()
+    if omega:
+        threshold = risk_free / returns_periods
+        dic['returns down'] = np.abs(np.clip(path - threshold, -np.inf, 0)).mean(1) * returns_periods + 1
+        dic['omega'] = omega_batch(path.T, threshold)
+    if tail:
+        dic['tail'] = tail_ratio_batch(path.T, q=tail_q)
+    if len(var_alphas):
+        dic.update(var_cvar_batch(path.T, var_alphas))
+    return dic
+
+def _block_stats(weights, means, returns, returns_down, risk_free, sharpe=True, sortino=True, **path_metrics):
+    dic = dict()
+    dic['returns'] = weights @ means + 1
+    if sharpe or any(path_metrics.get(k) for k in ('omega', 'tail', 'var_alphas')):
+        path = weights @ returns.T
+        dic.update(_path_stats(path, risk_free=risk_free, **path_metrics))
+    if sharpe:
+        dic['volatility'] = path.std(1, ddof=1)
+        dic['sharpe'] = (dic['returns']-risk_free)/dic['volatility']
+    if sortino:
+        dic['volatility down'] = (weights @ returns_down.T).std(1, ddof=1)
+        dic['sortino'] = (dic['returns']-risk_free)/dic['volatility down']
+    return dic
+
+def _simulate_chunked(weights, returns, risk_free=0, returns_periods=180, sharpe=True, sortino=True, omega=False,
+                      tail=False, var_alphas=(), tail_q=0.10, chunk_size=None, memory_budget=None):
+    returns = np.asarray(returns, dtype=np.float64)
+    returns_down = np.clip(returns, -np.inf, 0)
+    means = returns.mean(0) * returns_periods
+    if chunk_size is None:
+        chunk_size = chunk_rows(len(returns)) if memory_budget is None else chunk_rows(len(returns), memory_budget)
+
+    blocks = [_block_stats(w, means, returns, returns_down, risk_free, sharpe=sharpe, sortino=sortino, omega=omega,
+                           tail=tail, var_alphas=var_alphas, tail_q=tail_q, returns_periods=returns_periods)
+              for w in weight_blocks(weights, chunk_size)]
+    return {k: np.concatenate([b[k] for b in blocks]) for k in blocks[0]} if blocks else dict()
+
+TOP_METRICS = {'sharpe': ('sharpe', True), 'sortino': ('sortino', True), 'min_vol': ('volatility', False)}
+FRONTIER_RISKS = ('volatility', 'volatility down')
+
+def maximize_metric(key):
+    "False for the metrics where lower is better (volatilities, downside returns, VaR and CVaR)"
+    return not key.startswith(('volatility', 'returns down', 'var', 'cvar'))
+
+PATH_METRICS = ('omega', 'returns down', 'tail')
+SIMULATION_METRICS = ('returns', 'volatility', 'volatility down', 'sharpe', 'sortino') + PATH_METRICS
+
+def metric_key(key):
+    """canonical name of a metric of the simulation, case and spaces are ignored and the alphas of VaR and CVaR
+    are written as floats: 'CVaR 0.050' -> 'cvar 0.05'. Raises ValueError for unknown metrics"""
+    name = ' '.join(str(key).lower().split())
+    kind, _, alpha = name.partition(' ')
+    if kind in ('var', 'cvar') and alpha:
+        try:
+            return f'{kind} {float(alpha)}'
+        except ValueError:
+            pass
+    elif name in SIMULATION_METRICS:
+        return name
+    raise ValueError(f"unknown metric {key!r}, expected one of {SIMULATION_METRICS} or 'var <alpha>', 'cvar <alpha>'")
+
+def path_metric_args(keys):
+    """arguments of simulate_portfolios (omega, tail, var_alphas) that compute the metrics named in keys,
+    e.g. ('omega', 'cvar 0.05', 'var 0.01') -> {'omega': True, 'tail': False, 'var_alphas': (0.01, 0.05)}"""
+    keys = [metric_key(k) for k in keys]
+    alphas = sorted({float(k.split()[1]) for k in keys if k.startswith(('var ', 'cvar '))})
+    return {'omega': 'omega' in keys or 'returns down' in keys, 'tail': 'tail' in keys, 'var_alphas': tuple(alphas)}
+
+def _merge_top(best, stats, key, maximize, top_k):
+    score = np.where(np.isnan(stats[key]), np.inf, -stats[key] if maximize else stats[key])
+    if len(score) > top_k:
+        keep = np.argpartition(score, top_k)[:top_k]
+        stats = {k: v[keep] for k, v in stats.items()}
+        score = score[keep]
+    if best is not None:
+        stats = {k: np.concatenate([best[k], stats[k]]) for k in stats}
+        score = np.concatenate([best['score'], score])
+    order = np.argsort(score, kind='stable')[:top_k]
+    top = {k: v[order] for k, v in stats.items()}
+    top['score'] = score[order]
+    return top
+
+def top_portfolios(simulation, key, k=10, maximize=True):
+    """positions of the k best portfolios by simulation[key] sorted from best to worst (nan last),
+    argpartition O(n) and a sort of only k values"""
+    values = np.asarray(simulation[key], dtype=np.float64)
+    score = np.where(np.isnan(values), np.inf, -values if maximize else values)
+    k = min(k, len(score))
+    if k < len(score):
+        keep = np.argpartition(score, k)[:k]
+    else:
+        keep = np.arange(len(score))
+    return keep[np.argsort(score[keep], kind='stable')]
+
+def pareto_front(returns, risk):
+    """positions of the non-dominated portfolios (no other has more return with less or equal risk),
+    sorted by risk, in O(n log n): sorted by risk (and return descending) a portfolio is on the front
+    when its return beats every return of less risk"""
+    returns = np.asarray(returns, dtype=np.float64)
+    risk = np.asarray(risk, dtype=np.float64)
+    valid = np.flatnonzero(~(np.isnan(returns) | np.isnan(risk)))
+    order = valid[np.lexsort((-returns[valid], risk[valid]))]
+    r = returns[order]
+    best_before = np.concatenate([[-np.inf], np.maximum.accumulate(r)[:-1]])
+    return order[r > best_before]
+
+class SimulationSelector:
+    """Keeps the top_k portfolios of every metric and the pareto frontiers of a simulation fed in chunks,
+    the memory depends on top_k and the size of the frontiers, not on the number of portfolios.
+
+    Args:
+        top_k (int, optional): portfolios kept per metric. Defaults to 10.
+        metrics (dict, optional): name -> (key of the simulation, maximize). Defaults to TOP_METRICS.
+        frontiers (tuple, optional): risk keys of the return/risk frontiers ('volatility', 'volatility down'). Defaults to ('volatility',).
+
+    Attributes:
+        top (dict): name -> dict of arrays sorted from best to worst with the simulation keys, 'index' and 'weights'
+        frontier (dict): risk key -> dict of arrays of the non-dominated portfolios sorted by risk
+    """
+    def __init__(self, top_k=10, metrics=None, frontiers=('volatility',)):
+        self.top_k = top_k
+        self.metrics = TOP_METRICS if metrics is None else metrics
+        self.top = dict.fromkeys(self.metrics)
+        self.frontier = dict.fromkeys(frontiers)
+        self.count = 0
+
+    def update(self, stats, weights=None):
+        """adds a chunk: stats is a simulation dict of the chunk and weights its weights (portfolios x assets)"""
+        n = len(stats['returns'])
+        stats = dict(stats)
+        stats['index'] = np.arange(self.count, self.count + n)
+        if weights is not None:
+            stats['weights'] = weights
+        self._add(stats)
+        self.count += n
+        return self
+
+    def merge(self, other):
+        """adds the portfolios kept by another selector (e.g. of another process) as if its chunks came after these"""
+        rows = other.kept()
+        if rows is not None:
+            rows['index'] = rows['index'] + self.count
+            self._add(rows)
+        self.count += other.count
+        return self
+
+    def _add(self, stats):
+        for name, (key, maximize) in self.metrics.items():
+            if key in stats:
+                self.top[name] = _merge_top(self.top[name], stats, key, maximize, self.top_k)
+        for risk in self.frontier:
+            if risk in stats:
+                chunk = stats
+                if self.frontier[risk] is not None:
+                    chunk = {k: np.concatenate([self.frontier[risk][k], stats[k]]) for k in self.frontier[risk]}
+                keep = pareto_front(chunk['returns'], chunk[risk])
+                self.frontier[risk] = {k: np.asarray(v)[keep] for k, v in chunk.items()}
+
+    def kept(self):
+        """every portfolio kept in a top or a frontier once, sorted by index, None before the first chunk"""
+        parts = [t for t in self.top.values() if t is not None] + [f for f in self.frontier.values() if f is not None]
+        if not parts:
+            return None
+        rows = {k: np.concatenate([p[k] for p in parts]) for k in parts[0] if k != 'score'}
+        _, first = np.unique(rows['index'], return_index=True)
+        return {k: v[first] for k, v in rows.items()}
+
+    def results(self):
+        """top (without the internal scores) and frontier"""
+        top = {name: {k: v for k, v in t.items() if k != 'score'} for name, t in self.top.items() if t is not None}
+        return top, {risk: f for risk, f in self.frontier.items() if f is not None}
+
+def simulate_top(blocks, returns, risk_free=0, returns_periods=180, top_k=1, risk_mode='path', metrics=None, selector=None,
+                 **path_metrics):
+    """Streams blocks of weights and keeps only the top_k portfolios by sharpe, sortino and min volatility (or metrics),
+    memory depends on the block size and not on the total number of portfolios.
+
+    Args:
+        blocks (iterable): blocks of weights (portfolios x assets), e.g. weight_blocks(weights, chunk_size)
+            or blocks generated on the fly with get_weights, or tuples (weights, dict of arrays with one row per
+            portfolio, e.g. the shares of allocate_lots) that are kept along with the selected portfolios
+        returns (pandas.DataFrame): returns of the assets (periods x assets)
+        risk_free (float, optional): risk free profit. Defaults to 0.
+        returns_periods (int, optional): periods used to scale the mean returns. Defaults to 180.
+        top_k (int, optional): portfolios kept per metric. Defaults to 1.
+        risk_mode (str, optional): 'path' or 'cov', see simulate_portfolios. Defaults to 'path'.
+        metrics (dict, optional): name -> (key of the simulation, maximize). Defaults to TOP_METRICS.
+        selector (SimulationSelector, optional): selector fed with the blocks instead of a new one with top_k and
+            metrics, e.g. to also keep its frontiers. Defaults to None.
+        **path_metrics: omega, tail, var_alphas and tail_q of simulate_portfolios, see path_metric_args
+
+    Returns:
+        dict: for every metric a dict of arrays sorted from best to worst with the keys 'index' (position in the
+            stream), 'weights', the keys of the simulation and the arrays given with the blocks
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    returns_down = np.clip(returns, -np.inf, 0)
+    means = returns.mean(0) * returns_periods
+    if risk_mode == 'cov':
+        window = returns_stats(returns, returns_periods)
+    with_paths = any(path_metrics.get(k) for k in ('omega', 'tail', 'var_alphas'))
+    if selector is None:
+        selector = SimulationSelector(top_k=top_k, metrics=metrics, frontiers=())
+    for block in blocks:
+        w, extra = block if isinstance(block, tuple) else (block, {})
+        if risk_mode == 'cov':
+            stats = score_portfolios(w, window, risk_free)
+            if with_paths:
+                stats.update(_path_stats(w @ returns.T, risk_free=risk_free, returns_periods=returns_periods, **path_metrics))
+        else:
+            stats = _block_stats(w, means, returns, returns_down, risk_free, returns_periods=returns_periods, **path_metrics)
+        selector.update({**stats, **extra}, w)
+    top, _ = selector.results()
+    return top if selector.count else dict.fromkeys(selector.metrics)
+
+def lot_blocks(n_assets, n_portfolios, P, assets, chunk_size, rng=None):
+    """yields blocks of at most chunk_size random weights rounded to whole shares with allocate_lots,
+    as (weights, {'shares': shares, 'leftover': leftover}) blocks of simulate_top"""
+    for start in range(0, n_portfolios, chunk_size):
+        weights = get_weights(n_assets, min(chunk_size, n_portfolios - start), rng=rng)
+        shares, weights, leftover = allocate_lots(P, weights, assets)
+        yield weights, {'shares': shares, 'leftover': leftover}
+
+def _simulate_worker(seed_seq, n_assets, n_portfolios, P, assets, returns, kwargs):
+    rng = np.random.default_rng(seed_seq)
+    shares, weights, leftover = allocate_lots(P, get_weights(n_assets, n_portfolios, rng=rng), assets)
+    simulation = simulate_portfolios(weights, returns, **kwargs)
+    return weights, {k: np.asarray(v) for k, v in simulation.items()}, shares, leftover
+
+def _simulate_top_worker(seed_seq, n_assets, n_portfolios, P, assets, returns, chunk_size, selector, kwargs):
+    rng = np.random.default_rng(seed_seq)
+    simulate_top(lot_blocks(n_assets, n_portfolios, P, assets, chunk_size, rng), returns, selector=selector, **kwargs)
+    return selector
+
+def simulate_parallel(n_assets, n_portfolios, P, assets, returns, n_jobs=2, seed=None, return_shares=False, top_k=None,
+                      metrics=None, frontiers=(), **kwargs):
+    """draws, rounds to factible weights and simulates the portfolios across a process pool.
+    Every worker gets its own stream spawned from SeedSequence(seed), so for a given seed and n_jobs
+    the result is the same on every run.
+    With top_k every worker streams blocks of weights (of memory_budget bytes, 256 MB by default) through simulate_top
+    and sends back only its top_k portfolios of every metric (and its frontiers), the parent merges them with the same
+    rules, so the memory does not depend on n_portfolios.
+
+    Args:
+        n_assets (int): number of assets
+        n_portfolios (int): total number of portfolios, split between the workers
+        P (float): budget
+        assets (numpy.ndarray): last prices of the assets (1 x n_assets)
+        returns (pandas.DataFrame): returns window
+        n_jobs (int, optional): number of processes. Defaults to 2.
+        seed (int, optional): seed of the SeedSequence. Defaults to None.
+        return_shares (bool, optional): also return the shares and leftover cash of allocate_lots. Defaults to False.
+        top_k (int, optional): portfolios kept per metric, None to return every portfolio. Defaults to None.
+        metrics (dict, optional): with top_k, name -> (key of the simulation, maximize). Defaults to TOP_METRICS.
+        frontiers (tuple, optional): with top_k, risk keys of the pareto frontiers kept. Defaults to ().
+        **kwargs: arguments of simulate_portfolios (risk_free, returns_periods, memory_budget, risk_mode, ...)
+
+    Returns:
+        tuple(numpy.ndarray, dict): weights and simulation of every worker concatenated in worker order,
+            followed by the shares and leftover of every portfolio with return_shares.
+            With top_k the SimulationSelector of all the workers, its rows carry 'shares' and 'leftover'
+    """
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+    sizes = [len(x) for x in np.array_split(np.arange(n_portfolios), n_jobs)]
+    if top_k is not None:
+        memory_budget = kwargs.pop('memory_budget', None)
+        chunk_size = chunk_rows(len(returns) + n_assets, 256*2**20 if memory_budget is None else memory_budget)
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            futures = [ex.submit(_simulate_top_worker, seq, n_assets, size, P, assets, returns, chunk_size,
+                                 SimulationSelector(top_k, metrics, frontiers), kwargs)
+                       for seq, size in zip(seeds, sizes) if size > 0]
+            selector = SimulationSelector(top_k, metrics, frontiers)
+            for f in futures:
+                selector.merge(f.result())
+        return selector
+    with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+        futures = [ex.submit(_simulate_worker, seq, n_assets, size, P, assets, returns, kwargs)
+                   for seq, size in zip(seeds, sizes) if size > 0]
+        results = [f.result() for f in futures]
+    weights = np.concatenate([r[0] for r in results])
+    simulation = {k: np.concatenate([r[1][k] for r in results]) for k in results[0][1]}
+    if return_shares:
+        return weights, simulation, np.concatenate([r[2] for r in results]), np.concatenate([r[3] for r in results])
+    return weights, simulation
+
+def allocate_lots(P, weights, assets, unique=True):
+    """converts weights to whole shares that never cost more than the budget.
+    Shares start at floor(w*P/price) and the leftover cash buys, one share at a time, the asset with the
+    largest missing fraction of a share that still fits (the least exceeded target once every target is met),
+    for all the portfolios at once, until the leftover is below the price of every asset.
+
+    Args:
+        P (float): budget
+        weights (numpy.ndarray): weights (n_portfolios x n_assets)
+        assets (numpy.ndarray): prices of the assets (1 x n_assets)
+        unique (bool, optional): drop repeated allocations (by hashing the rows, keeps the first) and the empty ones. Defaults to True.
+
+    Returns:
+        tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray): shares (int64), weights of the invested value and leftover cash of every allocation
+    """
+    prices = np.asarray(assets, dtype=np.float64).reshape(-1)
+    target = np.atleast_2d(weights)*P/prices
+    shares = np.floor(target + 1e-9).astype(np.int64)
+    leftover = P - shares @ prices
+    rows = np.arange(len(shares))
+    while len(rows):
+        missing = np.where(prices <= leftover[rows, None] + 1e-9, target[rows] - shares[rows], -np.inf)
+        best = missing.argmax(1)
+        can = np.isfinite(missing[np.arange(len(rows)), best])
+        rows, best = rows[can], best[can]
+        shares[rows, best] += 1
+        leftover[rows] -= prices[best]
+
+    if unique:
+        keep = ~pd.DataFrame(shares).duplicated().values & (shares.sum(1) > 0)
+        shares, leftover = shares[keep], leftover[keep]
+    value = shares*prices
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = value/value.sum(1, keepdims=True)
+    return shares, w, np.maximum(leftover, 0)
+
 def factible_weights(P,weights,assets):
-    array = np.unique(((weights*P)/assets).round(),axis=0)
-    
-    f = partial(np.dot,assets)
-    p = np.stack(list(map(f,array)))
-    
-    w = (array*assets)/p.reshape(-1,1)
+    "unique weights that can be bought with whole shares within the budget P"
+    _, w, _ = allocate_lots(P, weights, assets)
     return w
 
 def mdd(x):
     "Maximum drawdown, for absolute price, not the returns. closer to 0 is better"
-    x = np.array(x)
-    high_index = x.argmax()
-    high = x.max()
-    low = x[high_index:].min()
-    result = abs((low-high)/high)
+    x = np.array(x, dtype=np.float64)
+    peak = np.maximum.accumulate(x)
+    result = abs(((x-peak)/peak).min())
     return result
 
 def RoMad(x):
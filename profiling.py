@@ -0,0 +1,171 @@
+"""Named timing spans and peak-memory deltas for the stages of the Portfolio pipeline.
+
+    profiler = Profiler(callbacks=[log_span, JsonLinesWriter("runs.jsonl")], memory=True)
+    port = Portfolio(budget, tickers, profiler=profiler)
+    port.get_data()
+    profiler.stats()   # calls, seconds and memory of every stage
+
+The Profiler itself is the in-process collector (spans and stats), the callbacks get every span as it finishes.
+Without a profiler the stages use NULL_PROFILER, whose span is a shared no-op context manager.
+"""
+import functools
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """One finished stage
+
+    Attributes:
+        name (str): stage, nested spans are joined with '.' (get_best_portfolio.simulate_portfolios)
+        start (float): time.time() when the stage started
+        seconds (float): wall time of the stage
+        memory (int): peak bytes allocated during the stage over the memory at its start, None without memory tracing
+        depth (int): nesting level, 0 for the outermost stages
+    """
+    __slots__ = ('name', 'start', 'seconds', 'memory', 'depth')
+
+    def __init__(self, name, start, seconds, memory=None, depth=0):
+        self.name = name
+        self.start = start
+        self.seconds = seconds
+        self.memory = memory
+        self.depth = depth
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+    def __repr__(self):
+        memory = '' if self.memory is None else f", {self.memory / 2**20:.1f} MiB"
+        return f"Span({self.name}, {self.seconds:.4f}s{memory})"
+
+
+class Profiler:
+    """Collects the spans of the stages and passes each finished span to the callbacks
+
+    Args:
+        callbacks (list, optional): functions called with every finished Span, e.g. log_span or a JsonLinesWriter. Defaults to ().
+        memory (bool, optional): measure the peak memory of every span with tracemalloc (numpy arrays included),
+            it slows down the allocations so it is off by default. Defaults to False.
+        keep (bool, optional): keep the spans in self.spans for stats. Defaults to True.
+    """
+    enabled = True
+
+    def __init__(self, callbacks=(), memory=False, keep=True):
+        self.callbacks = list(callbacks)
+        self.memory = memory
+        self.keep = keep
+        self.spans = []
+        self._stack = []
+        self._started_tracing = False
+
+    @contextmanager
+    def span(self, name):
+        """Context manager that times the block as the stage name (inside another span as parent.name)"""
+        if self._stack:
+            name = f"{self._stack[-1]['name']}.{name}"
+        trace = self.memory and self._start_tracing()
+        frame = {'name': name, 'child_peak': 0}
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            frame['current'] = current
+            if self._stack:
+                self._stack[-1]['child_peak'] = max(self._stack[-1]['child_peak'], peak)
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        start, t0 = time.time(), time.perf_counter()
+        try:
+            yield self
+        finally:
+            seconds = time.perf_counter() - t0
+            self._stack.pop()
+            memory = None
+            if trace:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                memory = max(peak - frame['current'], 0)
+                if self._stack:
+                    self._stack[-1]['child_peak'] = max(self._stack[-1]['child_peak'], peak)
+                elif self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            self._record(Span(name, start, seconds, memory, len(self._stack)))
+
+    def _start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return True
+
+    def _record(self, span):
+        if self.keep:
+            self.spans.append(span)
+        for callback in self.callbacks:
+            callback(span)
+
+    def stats(self):
+        """DataFrame by stage with calls, total, mean and max seconds and the max memory (MiB) in the order they started"""
+        if not self.spans:
+            return pd.DataFrame(columns=['calls', 'seconds', 'mean', 'max', 'memory_mib'])
+        df = pd.DataFrame([s.to_dict() for s in self.spans]).sort_values('start', kind='stable')
+        stats = df.groupby('name', sort=False).agg(calls=('seconds', 'size'), seconds=('seconds', 'sum'),
+                                                   mean=('seconds', 'mean'), max=('seconds', 'max'),
+                                                   memory_mib=('memory', 'max'))
+        stats['memory_mib'] = stats['memory_mib'] / 2**20
+        return stats
+
+    def reset(self):
+        self.spans = []
+
+
+class NullProfiler(Profiler):
+    """Disabled profiler, span returns a shared context manager that does nothing"""
+    enabled = False
+    _null = nullcontext()
+
+    def __init__(self):
+        super().__init__(keep=False)
+
+    def span(self, name):
+        return self._null
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def log_span(span, level=logging.INFO):
+    """Callback that logs every span with the logger of this module"""
+    logger.log(level, "%s%s", "  " * span.depth, span)
+
+
+class JsonLinesWriter:
+    """Callback that appends every span as a json line (name, start, seconds, memory, depth) to a file
+
+    Args:
+        path (str): file, it is opened in append mode for every span so several runs share it
+        **extra: fields added to every line, e.g. run='nightly'
+    """
+
+    def __init__(self, path, **extra):
+        self.path = path
+        self.extra = extra
+
+    def __call__(self, span):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({**self.extra, **span.to_dict()}) + "\n")
+
+
+def stage(name):
+    """Decorator of methods that runs them inside the span name of self.profiler (NULL_PROFILER if it has none)"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with getattr(self, 'profiler', NULL_PROFILER).span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
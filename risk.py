@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.stats import norm
+
 def CAPM(ri, rf, rm):
     """E (ri)= rf + β [E (rm) – rf]
 
@@ -37,4 +42,272 @@ def kelly_rule(p,b,a):
         """
         q = 1-p
         f = p/a - q/b
-        return f
\ No newline at end of file
+        return f
+
+# ----------------------------------------- Batched Statistics -----------------------------------------
+# every function takes a dates x series matrix (DataFrame or array), e.g. the equity curves of many simulated
+# portfolios or the prices of a whole universe, and returns one value per series
+
+def _as_2d(x):
+    values = np.asarray(x, dtype=np.float64)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+    return values
+
+def _wrap(result, x):
+    if isinstance(x, pd.DataFrame):
+        return pd.Series(result, index=x.columns)
+    if isinstance(x, pd.Series) or np.ndim(x) == 1:
+        return result[0]
+    return result
+
+def mdd_batch(prices, chunk_size=None):
+    """Maximum drawdown of every series tracking the running peak, for absolute prices. closer to 0 is better
+
+    Args:
+        prices (DataFrame or numpy.ndarray): prices or equity curves (dates x series)
+        chunk_size (int, optional): series processed at a time to bound the memory. Defaults to None (all).
+
+    Returns:
+        pandas.Series or numpy.ndarray: maximum drawdown of each series
+    """
+    values = _as_2d(prices)
+    chunk_size = chunk_size or values.shape[1]
+    result = np.empty(values.shape[1])
+    for start in range(0, values.shape[1], chunk_size):
+        block = values[:, start:start + chunk_size]
+        peak = np.fmax.accumulate(block, axis=0)
+        result[start:start + chunk_size] = np.abs(np.nanmin((block - peak) / peak, axis=0))
+    return _wrap(result, prices)
+
+def romad_batch(prices):
+    "Returns over maximum drawdown (calmar) of every series, for absolute prices. the higher the better"
+    values = _as_2d(prices)
+    ret = np.nanmean(values[1:] / values[:-1] - 1, axis=0)
+    return _wrap(ret / _as_2d(mdd_batch(values)).reshape(-1), prices)
+
+def sharpe_batch(returns):
+    "mean/std of the returns of every series"
+    values = _as_2d(returns)
+    return _wrap(np.nanmean(values, axis=0) / np.nanstd(values, axis=0, ddof=1), returns)
+
+def sortino_batch(returns):
+    "mean/std of the negative returns (clipped at 0) of every series"
+    values = _as_2d(returns)
+    return _wrap(np.nanmean(values, axis=0) / np.nanstd(np.clip(values, -np.inf, 0), axis=0, ddof=1), returns)
+
+def omega_batch(returns, threshold=0):
+    "1 + E[r-t]/E[|min(r-t,0)|] of every series over the per-period threshold t, first order lower partial moment"
+    excess = _as_2d(returns) - threshold
+    return _wrap(1 + np.nanmean(excess, axis=0) / np.nanmean(np.abs(np.clip(excess, -np.inf, 0)), axis=0), returns)
+
+def tail_ratio_batch(returns, q=0.10):
+    """sum of the best q fraction of the returns over the absolute sum of the worst q fraction of every series,
+    the tails are found with np.partition instead of sorting
+
+    Args:
+        returns (DataFrame or numpy.ndarray): returns (dates x series) without nan
+        q (float, optional): fraction of each tail. Defaults to 0.10.
+    """
+    values = _as_2d(returns)
+    n = len(values)
+    k = max(1, int(np.ceil(q * n)))
+    part = np.partition(values, [k - 1, n - k], axis=0)
+    left = part[:k].sum(0)
+    right = part[n - k:].sum(0)
+    return _wrap(right / np.abs(left), returns)
+
+def var_cvar_batch(returns, alphas=(0.05,)):
+    """historical value at risk and conditional value at risk (expected shortfall) of every series, as positive losses:
+    VaR is minus the k-th worst return and CVaR minus the mean of the k worst, k = ceil(alpha·n).
+    All the alphas share one np.partition instead of sorting the returns
+
+    Args:
+        returns (DataFrame or numpy.ndarray): returns (dates x series) without nan
+        alphas (tuple, optional): probabilities of the tail. Defaults to (0.05,).
+
+    Returns:
+        dict: 'var {alpha}' and 'cvar {alpha}' -> value of each series
+    """
+    values = _as_2d(returns)
+    n = len(values)
+    ks = {alpha: min(n, max(1, int(np.ceil(alpha * n)))) for alpha in alphas}
+    part = np.partition(values, sorted({k - 1 for k in ks.values()}), axis=0)
+    dic = {}
+    for alpha, k in ks.items():
+        dic[f'var {alpha}'] = _wrap(-part[k - 1], returns)
+        dic[f'cvar {alpha}'] = _wrap(-part[:k].mean(0), returns)
+    return dic
+
+BATCH_METRICS = {'mdd': mdd_batch, 'romad': romad_batch, 'sharpe': sharpe_batch, 'sortino': sortino_batch,
+                 'omega': omega_batch, 'tail': tail_ratio_batch}
+
+def rolling_metrics(x, window, metrics=('sharpe', 'sortino', 'omega'), chunk_size=256):
+    """Rolling versions of the batched statistics for time-series monitoring. sharpe, sortino and omega come
+    from pandas rolling means and stds (O(N)), mdd, romad and tail evaluate the windows in blocks of chunk_size dates.
+
+    Args:
+        x (DataFrame): returns (prices for mdd and romad), dates x series
+        window (int): dates of each window
+        metrics (tuple, optional): names of BATCH_METRICS. Defaults to ('sharpe', 'sortino', 'omega').
+        chunk_size (int, optional): windows evaluated at a time by the blocked metrics. Defaults to 256.
+
+    Returns:
+        dict: metric -> DataFrame (dates x series), nan until the window is complete
+    """
+    frame = x if isinstance(x, pd.DataFrame) else pd.DataFrame(_as_2d(x))
+    down = frame.clip(upper=0)
+    rolling = frame.rolling(window)
+    result = {}
+    for name in metrics:
+        if name == 'sharpe':
+            result[name] = rolling.mean() / rolling.std()
+        elif name == 'sortino':
+            result[name] = rolling.mean() / down.rolling(window).std()
+        elif name == 'omega':
+            result[name] = 1 + rolling.mean() / down.abs().rolling(window).mean()
+        else:
+            values = frame.values.astype(np.float64)
+            out = np.full(values.shape, np.nan)
+            windows = sliding_window_view(values, window, axis=0)
+            for start in range(0, len(windows), chunk_size):
+                block = windows[start:start + chunk_size]
+                n_win, n_series = block.shape[:2]
+                flat = block.transpose(2, 0, 1).reshape(window, -1)
+                out[window - 1 + start:window - 1 + start + n_win] = np.asarray(
+                    BATCH_METRICS[name](flat)).reshape(n_win, n_series)
+            result[name] = pd.DataFrame(out, index=frame.index, columns=frame.columns)
+    return result
+
+# ----------------------------------------- Value at Risk -----------------------------------------
+# VaR and CVaR of many portfolios (weights, portfolios x assets) and horizons at once, as positive losses over the
+# portfolio value. Parametric: VaR = -value (mu h + sigma sqrt(h) Φ⁻¹(alpha)) with mu = w'mu and sigma = sqrt(w'Vw).
+# Monte Carlo: correlated scenarios r = mu + L z (V = LL', Cholesky cached per window) compounded over each horizon.
+
+def _cholesky(cov):
+    "lower factor L with LL' = cov, from the eigen decomposition when cov is not positive definite"
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh(cov)
+        return vectors * np.sqrt(np.clip(values, 0, None))
+
+def parametric_var(weights, means, cov, alphas=(0.05,), horizons=(1,), value=1.0, chunk_size=100000):
+    """Gaussian VaR and CVaR of every portfolio and horizon
+
+    Args:
+        weights (numpy.ndarray): weights (portfolios x assets) or one portfolio
+        means (numpy.ndarray): mean returns per period of the assets
+        cov (numpy.ndarray): covariance of the returns per period
+        alphas (tuple, optional): probabilities of the tail. Defaults to (0.05,).
+        horizons (tuple, optional): periods of each horizon, the mean grows with h and the deviation with sqrt(h). Defaults to (1,).
+        value (float or numpy.ndarray, optional): value of the portfolios (S_t), 1 for returns. Defaults to 1.0.
+        chunk_size (int, optional): portfolios projected on the covariance at a time. Defaults to 100000.
+
+    Returns:
+        dict: 'var {alpha}' and 'cvar {alpha}' -> array (portfolios x horizons)
+    """
+    w = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    cov = np.asarray(cov, dtype=np.float64)
+    mu = w @ np.asarray(means, dtype=np.float64)
+    sigma = np.concatenate([np.sqrt(np.maximum(((b @ cov) * b).sum(1), 0))
+                            for b in (w[i:i + chunk_size] for i in range(0, len(w), chunk_size))])
+    h = np.asarray(horizons, dtype=np.float64)
+    mu_h = mu[:, None] * h
+    sigma_h = sigma[:, None] * np.sqrt(h)
+    value = np.reshape(np.asarray(value, dtype=np.float64), (-1, 1))
+    dic = {}
+    for alpha in alphas:
+        z = norm.ppf(alpha)
+        dic[f'var {alpha}'] = -value * (mu_h + sigma_h * z)
+        dic[f'cvar {alpha}'] = -value * (mu_h - sigma_h * norm.pdf(z) / alpha)
+    return dic
+
+class VaREngine:
+    """Parametric and Monte Carlo VaR/CVaR of many portfolios over windows of a returns history.
+    The mean, covariance and Cholesky factor of every window are computed once and cached, the Monte Carlo
+    scenarios of a window are drawn in chunks and only their growth at the requested horizons is kept,
+    then the portfolios are evaluated in chunks (portfolios x scenarios) with np.partition.
+
+    Args:
+        returns (DataFrame or numpy.ndarray): returns of the assets (dates x assets), e.g. adj_close.pct_change().dropna()
+        window (int, optional): returns before the end date used for the statistics, None for all. Defaults to None.
+        n_scenarios (int, optional): Monte Carlo scenarios. Defaults to 10000.
+        chunk_size (int, optional): scenarios drawn and portfolios evaluated at a time. Defaults to 2000.
+        seed (int, optional): seed of the scenarios, each window gets the same stream. Defaults to None.
+    """
+
+    def __init__(self, returns, window=None, n_scenarios=10000, chunk_size=2000, seed=None):
+        self.index = returns.index if isinstance(returns, (pd.DataFrame, pd.Series)) else None
+        self.returns = _as_2d(returns)
+        self.window = window
+        self.n_scenarios = n_scenarios
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self._stats = {}
+        self._scenarios = {}
+
+    def _bounds(self, end):
+        if end is None:
+            stop = len(self.returns)
+        elif isinstance(end, (int, np.integer)):
+            stop = int(end)
+        else:
+            stop = int(self.index.searchsorted(pd.Timestamp(end), side='right'))
+        start = 0 if self.window is None else max(0, stop - self.window)
+        return start, stop
+
+    def stats(self, end=None):
+        """means, cov and cholesky factor of the window that ends at end (position or date, included), cached"""
+        key = self._bounds(end)
+        if key not in self._stats:
+            window = self.returns[key[0]:key[1]]
+            cov = np.atleast_2d(np.cov(window, rowvar=False))
+            self._stats[key] = {'means': window.mean(0), 'cov': cov, 'cholesky': _cholesky(cov)}
+        return self._stats[key]
+
+    def parametric(self, weights, alphas=(0.05,), horizons=(1,), value=1.0, end=None):
+        """Gaussian VaR and CVaR with the statistics of the window, see parametric_var"""
+        stats = self.stats(end)
+        return parametric_var(weights, stats['means'], stats['cov'], alphas=alphas, horizons=horizons, value=value)
+
+    def scenarios(self, horizons=(1,), end=None):
+        """growth of every asset (1 + cumulative return) in each scenario at each horizon (scenarios x horizons x assets),
+        the returns per period mu + L z are drawn in chunks of chunk_size scenarios, cached per window and horizons"""
+        key = self._bounds(end) + (tuple(horizons),)
+        if key not in self._scenarios:
+            stats = self.stats(end)
+            steps = np.asarray(horizons, dtype=np.intp) - 1
+            rng = np.random.default_rng(self.seed)
+            n_assets = len(stats['means'])
+            growth = np.empty((self.n_scenarios, len(steps), n_assets))
+            for start in range(0, self.n_scenarios, self.chunk_size):
+                n = min(self.chunk_size, self.n_scenarios - start)
+                z = rng.standard_normal((n, steps.max() + 1, n_assets))
+                paths = np.cumprod(1 + stats['means'] + z @ stats['cholesky'].T, axis=1)
+                growth[start:start + n] = paths[:, steps]
+            self._scenarios[key] = growth
+        return self._scenarios[key]
+
+    def monte_carlo(self, weights, alphas=(0.05,), horizons=(1,), value=1.0, end=None):
+        """VaR and CVaR from the simulated scenarios of the window, the weights are held over the horizon
+        (buy and hold) so the loss of a portfolio is -value·(w'growth - 1)
+
+        Returns:
+            dict: 'var {alpha}' and 'cvar {alpha}' -> array (portfolios x horizons)
+        """
+        w = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        growth = self.scenarios(horizons, end)
+        value = np.reshape(np.asarray(value, dtype=np.float64), (-1, 1))
+        dic = {f'{m} {alpha}': np.empty((len(w), len(horizons))) for alpha in alphas for m in ('var', 'cvar')}
+        for j in range(len(horizons)):
+            for start in range(0, len(w), self.chunk_size):
+                block = w[start:start + self.chunk_size]
+                pnl = block @ growth[:, j, :].T - 1
+                for k, v in var_cvar_batch(pnl.T, alphas).items():
+                    dic[k][start:start + len(block), j] = v
+        return {k: v * value for k, v in dic.items()}
+
+    def clear(self):
+        self._stats = {}
+        self._scenarios = {}
@@ -0,0 +1,260 @@
+"""Incremental indicators: objects that keep running sums, EMA state and rolling extrema and are updated
+one bar at a time (O(1) amortized per bar and column) with the same results as the batch functions
+(trade_utils.bollinger_frame, momentum.weighted_average and momentum.oscillators).
+Every state handles n columns (tickers) at once, missing values (nan) are replaced by the last value
+like the forward filled adj_close, and can be saved with to_dict and restored with load_state.
+"""
+from collections import deque
+import numpy as np
+from momentum import kernel_weights, _base, _legacy_scale
+
+
+def _encode(value):
+    if isinstance(value, State):
+        return value.to_dict()
+    if isinstance(value, np.ndarray):
+        return {'__array__': value.tolist(), 'dtype': str(value.dtype)}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, deque):
+        return {'__deque__': [list(v) for v in value]}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and '__array__' in value:
+        return np.array(value['__array__'], dtype=value['dtype'])
+    if isinstance(value, dict) and '__deque__' in value:
+        return deque(tuple(v) for v in value['__deque__'])
+    if isinstance(value, dict) and 'type' in value:
+        return load_state(value)
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class State:
+    """Base class of the incremental states, _fields are the attributes saved by to_dict"""
+    _fields = ()
+
+    def to_dict(self):
+        """State as a json serializable dict"""
+        return {'type': type(self).__name__, **{f: _encode(getattr(self, f)) for f in self._fields}}
+
+    @classmethod
+    def from_dict(cls, state):
+        obj = cls.__new__(cls)
+        for f in cls._fields:
+            setattr(obj, f, _decode(state[f]))
+        return obj
+
+    def update_many(self, bars):
+        """Feeds several bars (periods x n) and returns the result of each one stacked"""
+        results = [self.update(bar) for bar in np.atleast_2d(np.asarray(bars, dtype=np.float64).T).T]
+        if isinstance(results[0], dict):
+            return {k: np.stack([r[k] for r in results]) for k in results[0]}
+        return np.stack(results)
+
+
+def load_state(state):
+    """Rebuilds a state saved with to_dict"""
+    return STATES[state['type']].from_dict(state)
+
+
+class WindowBuffer(State):
+    """Ring buffer of the last window values of n columns
+
+    Args:
+        window (int): number of values kept
+        n (int, optional): number of columns. Defaults to 1.
+    """
+    _fields = ('window', 'buffer', 'pos', 'count', 'last')
+
+    def __init__(self, window, n=1):
+        self.window = window
+        self.buffer = np.zeros((window, n))
+        self.pos = np.zeros(n, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.last = np.full(n, np.nan)
+
+    def push(self, x):
+        """Adds a bar, returns the bar (forward filled), the value leaving the window (0 while not full)
+        and a mask of the columns that have data"""
+        x = np.where(np.isnan(x), self.last, np.asarray(x, dtype=np.float64))
+        active = ~np.isnan(x)
+        cols = np.arange(len(x))
+        old = np.where(active & (self.count >= self.window), self.buffer[self.pos, cols], 0.0)
+        self.buffer[self.pos[active], cols[active]] = x[active]
+        self.pos = np.where(active, (self.pos + 1) % self.window, self.pos)
+        self.count = self.count + active
+        self.last = x
+        return x, old, active
+
+    @property
+    def full(self):
+        return self.count >= self.window
+
+
+class WeightedAvgState(State):
+    """Rolling weighted average (normalized kernels of momentum.kernel_weights), same as momentum.weighted_average.
+    Exponential kinds keep A_t = x_t + A_{t-1}/c - c^-window x_{t-window}, pond keeps the sum and the linear sum.
+
+    Args:
+        window (int): bars of the average
+        kind (str, optional): 'exp_2', 'exp_e', 'exp_x' or 'pond'. Defaults to 'exp_e'.
+        constant (float, optional): base of 'exp_x'. Defaults to 10.
+        n (int, optional): number of columns. Defaults to 1.
+    """
+    _fields = ('window', 'kind', 'constant', 'buffer', 'acc', 'total')
+
+    def __init__(self, window, kind='exp_e', constant=10, n=1):
+        self.window = window
+        self.kind = kind
+        self.constant = constant
+        self.buffer = WindowBuffer(window, n)
+        self.acc = np.zeros(n)
+        self.total = np.zeros(n)
+
+    def update(self, x):
+        x, old, active = self.buffer.push(np.atleast_1d(x))
+        x0 = np.where(active, x, 0.0)
+        if self.kind == 'pond':
+            self.acc = np.where(active, self.acc - self.total + self.window * x0, self.acc)
+            self.total = np.where(active, self.total + x0 - old, self.total)
+            value = self.acc / (self.window * (self.window + 1) / 2)
+        else:
+            c = _base(self.kind, self.constant)
+            self.acc = np.where(active, x0 + self.acc / c - c ** -float(self.window) * old, self.acc)
+            value = self.acc * kernel_weights(self.kind, self.window, self.constant)[-1]
+        return np.where(self.buffer.full, value, np.nan)
+
+
+class BollingerState(State):
+    """Bollinger bands and counter, same as trade_utils.bollinger_frame
+
+    Args:
+        period (int, optional): window of the mean and deviation. Defaults to 20.
+        width (float, optional): number of deviations of the bands. Defaults to 2.
+        n (int, optional): number of columns. Defaults to 1.
+    """
+    _fields = ('period', 'width', 'buffer', 'center', 'total', 'total_sq', 'prev', 'last_change')
+
+    def __init__(self, period=20, width=2, n=1):
+        self.period = period
+        self.width = width
+        self.buffer = WindowBuffer(period, n)
+        self.center = np.full(n, np.nan)
+        self.total = np.zeros(n)
+        self.total_sq = np.zeros(n)
+        self.prev = np.zeros(n, dtype=np.int64)
+        self.last_change = np.zeros(n, dtype=np.int64)
+
+    def update(self, x):
+        """Returns a dict with close, mean, std, upper, lower and cont of the new bar"""
+        x, old, active = self.buffer.push(np.atleast_1d(x))
+        # sums of the values minus the first one, keeps the variance precise
+        self.center = np.where(np.isnan(self.center) & active, x, self.center)
+        new = np.where(active, x - self.center, 0.0)
+        old = np.where(active & (self.buffer.count > self.period), old - self.center, 0.0)
+        self.total += new - old
+        self.total_sq += new ** 2 - old ** 2
+        full = self.buffer.full
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(full, self.total / self.period + self.center, np.nan)
+            var = np.maximum(self.total_sq - self.total ** 2 / self.period, 0) / (self.period - 1)
+            std = np.where(full, np.sqrt(var), np.nan)
+        upper = mean + std * self.width
+        lower = mean - std * self.width
+
+        with np.errstate(invalid='ignore'):
+            contador = np.where(x >= upper, 1, np.where(x <= lower, -1, 0))
+        change = np.where(self.prev != 0, contador - self.prev, 0)
+        self.last_change = np.where(change != 0, change, self.last_change)
+        self.prev = contador
+        return {'close': x, 'mean': mean, 'std': std, 'upper': upper, 'lower': lower,
+                'cont': (self.last_change == 1).astype(int)}
+
+
+class RSIState(State):
+    """RSI over windows of window prices (window-1 changes), same as momentum.oscillators
+
+    Args:
+        window (int, optional): prices in the window. Defaults to 14.
+        agg (str, optional): kernel of the averages of the up and down moves. Defaults to 'exp_e'.
+        n (int, optional): number of columns. Defaults to 1.
+    """
+    _fields = ('window', 'last', 'up', 'down')
+
+    def __init__(self, window=14, agg='exp_e', n=1):
+        self.window = window
+        self.last = np.full(n, np.nan)
+        self.up = WeightedAvgState(window - 1, agg, n=n)
+        self.down = WeightedAvgState(window - 1, agg, n=n)
+
+    def update(self, x):
+        x = np.where(np.isnan(x), self.last, np.atleast_1d(np.asarray(x, dtype=np.float64)))
+        diff = x - self.last
+        self.last = x
+        up = self.up.update(np.clip(diff, 0, np.inf))
+        down = self.down.update(np.clip(-diff, 0, np.inf))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return up / (up + down) * 100
+
+
+class MACDState(State):
+    """MACD line (short exp_e average minus window exp_e average), same as momentum.oscillators
+
+    Args:
+        window (int, optional): bars of the long average. Defaults to 26.
+        short_period (int, optional): bars of the short average. Defaults to 12.
+        n (int, optional): number of columns. Defaults to 1.
+    """
+    _fields = ('short', 'long')
+
+    def __init__(self, window=26, short_period=12, n=1):
+        self.short = WeightedAvgState(min(short_period, window), 'exp_e', n=n)
+        self.long = WeightedAvgState(window, 'exp_e', n=n)
+
+    def update(self, x):
+        return (self.short.update(x) - self.long.update(x)) * _legacy_scale('exp_e')
+
+
+class StochasticState(State):
+    """K_line, D_line and williams with monotonic deques of the rolling max and min of every column
+
+    Args:
+        window (int, optional): bars of the window. Defaults to 14.
+        n (int, optional): number of columns. Defaults to 1.
+    """
+    _fields = ('window', 'count', 'last', 'highs', 'lows')
+
+    def __init__(self, window=14, n=1):
+        self.window = window
+        self.count = np.zeros(n, dtype=np.int64)
+        self.last = np.full(n, np.nan)
+        self.highs = [deque() for _ in range(n)]
+        self.lows = [deque() for _ in range(n)]
+
+    def update(self, x):
+        """Returns a dict with K_line, D_line and williams of the new bar"""
+        x = np.where(np.isnan(x), self.last, np.atleast_1d(np.asarray(x, dtype=np.float64)))
+        self.last = x
+        high, low = np.full(len(x), np.nan), np.full(len(x), np.nan)
+        for i, value in enumerate(x):
+            if np.isnan(value):
+                continue
+            t = int(self.count[i])
+            for dq, worse in ((self.highs[i], lambda a, b: a <= b), (self.lows[i], lambda a, b: a >= b)):
+                while dq and worse(dq[-1][1], value):
+                    dq.pop()
+                dq.append((t, value))
+                if dq[0][0] <= t - self.window:
+                    dq.popleft()
+            self.count[i] = t + 1
+            if self.count[i] >= self.window:
+                high[i], low[i] = self.highs[i][0][1], self.lows[i][0][1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {'K_line': (x - low) / (high - low), 'D_line': high / low, 'williams': (high - x) / (high - low)}
+
+
+STATES = {cls.__name__: cls for cls in (WindowBuffer, WeightedAvgState, BollingerState, RSIState, MACDState, StochasticState)}
@@ -0,0 +1,144 @@
+"""Seeded synthetic market data for benchmarks and examples without network access"""
+import numpy as np
+import pandas as pd
+from data_sources import DataSource, slice_dates, to_multiindex
+
+FIELDS = ('High', 'Low', 'Open', 'Close', 'Volume', 'Adj Close')
+
+
+def trading_dates(n_dates, start='2010-01-01', holidays=0.015, seed=0):
+    """Business days with a fraction removed as market holidays (the same dates for every ticker)
+
+    Args:
+        n_dates (int): number of dates
+        start (str, optional): first date. Defaults to '2010-01-01'.
+        holidays (float, optional): fraction of business days without trading. Defaults to 0.015.
+        seed (int, optional): seed of the holidays. Defaults to 0.
+
+    Returns:
+        pandas.DatetimeIndex: dates
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, periods=int(n_dates / (1 - holidays) * 1.1) + 20, name='Date')
+    return dates[rng.random(len(dates)) >= holidays][:n_dates]
+
+
+def correlated_gbm(n_dates, n_tickers, corr=0.3, drift=0.07, vol=0.25, periods_per_year=252, seed=0):
+    """Prices of geometric brownian motions with the same correlation between every pair (one factor model)
+
+    Args:
+        n_dates (int): number of prices of each ticker
+        n_tickers (int): number of tickers
+        corr (float, optional): correlation of the returns of every pair of tickers. Defaults to 0.3.
+        drift (float, optional): annual drift. Defaults to 0.07.
+        vol (float, optional): mean annual volatility, each ticker gets between 0.5 and 1.5 times vol. Defaults to 0.25.
+        periods_per_year (int, optional): periods in a year. Defaults to 252.
+        seed (int, optional): seed. Defaults to 0.
+
+    Returns:
+        numpy.ndarray: prices (n_dates x n_tickers)
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1 / periods_per_year
+    vols = vol * rng.uniform(0.5, 1.5, n_tickers)
+    z = np.sqrt(corr) * rng.standard_normal((n_dates, 1)) + np.sqrt(1 - corr) * rng.standard_normal((n_dates, n_tickers))
+    log_returns = (drift - vols ** 2 / 2) * dt + vols * np.sqrt(dt) * z
+    log_returns[0] = 0
+    return rng.uniform(10, 200, n_tickers) * np.exp(np.cumsum(log_returns, axis=0))
+
+
+def ohlcv(close, seed=0):
+    """Open, High, Low, Volume and Adj Close consistent with the close prices (low <= open, close <= high)
+
+    Args:
+        close (numpy.ndarray): close prices (n_dates x n_tickers)
+        seed (int, optional): seed. Defaults to 0.
+
+    Returns:
+        dict: field -> array with the shape of close
+    """
+    rng = np.random.default_rng(seed)
+    open_ = np.vstack([close[:1], close[:-1]]) * np.exp(rng.normal(0, 0.004, close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, close.shape)))
+    volume = np.round(rng.lognormal(13, 1, close.shape))
+    # dividends: the adjusted prices of the past are scaled down by a small yield
+    adj_close = close * np.exp(-0.02 / 252 * np.arange(len(close))[::-1])[:, None]
+    return {'High': high, 'Low': low, 'Open': open_, 'Close': close, 'Volume': volume, 'Adj Close': adj_close}
+
+
+def gbm_frames(n_tickers, n_dates, corr=0.3, gaps=0.01, late_listing=0.1, holidays=0.015, start='2010-01-01', seed=0):
+    """One frame per ticker with (field, ticker) columns, as the data sources return them, from correlated GBM prices.
+    Each ticker misses a fraction gaps of the dates and a fraction late_listing of the tickers start later.
+
+    Args:
+        n_tickers (int): number of tickers (named T0, T1, ...)
+        n_dates (int): trading dates
+        corr (float, optional): correlation of the returns. Defaults to 0.3.
+        gaps (float, optional): fraction of dates missing in each ticker. Defaults to 0.01.
+        late_listing (float, optional): fraction of tickers listed in the second half of the dates. Defaults to 0.1.
+        holidays (float, optional): fraction of business days without trading. Defaults to 0.015.
+        start (str, optional): first date. Defaults to '2010-01-01'.
+        seed (int, optional): seed. Defaults to 0.
+
+    Returns:
+        List[DataFrame]: frames of every ticker
+    """
+    rng = np.random.default_rng(seed)
+    dates = trading_dates(n_dates, start=start, holidays=holidays, seed=seed)
+    fields = ohlcv(correlated_gbm(n_dates, n_tickers, corr=corr, seed=seed), seed=seed)
+    first = np.where(rng.random(n_tickers) < late_listing, rng.integers(n_dates // 2, n_dates, n_tickers), 0)
+    frames = []
+    for i in range(n_tickers):
+        keep = rng.random(n_dates) >= gaps
+        keep[:first[i]] = False
+        df = pd.DataFrame({f: fields[f][keep, i] for f in FIELDS}, index=dates[keep])
+        frames.append(to_multiindex(df, f"T{i}"))
+    return frames
+
+
+class SyntheticSource(DataSource):
+    """Offline source of correlated GBM prices, the whole universe of tickers is generated once with the seed
+
+    Args:
+        tickers (list[str]): tickers that can be requested
+        n_dates (int, optional): trading dates generated. Defaults to 2500.
+        start (str, optional): first date. Defaults to '2010-01-01'.
+        seed (int, optional): seed. Defaults to 0.
+        **kwargs: corr, gaps, late_listing and holidays of gbm_frames
+    """
+
+    def __init__(self, tickers, n_dates=2500, start='2010-01-01', seed=0, **kwargs):
+        frames = gbm_frames(len(tickers), n_dates, start=start, seed=seed, **kwargs)
+        self.frames = {t: df.droplevel('Symbols', axis=1) for t, df in zip(tickers, frames)}
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        if ticker not in self.frames:
+            raise KeyError(f"unknown synthetic ticker {ticker}")
+        return slice_dates(self.frames[ticker], start, end)
+
+
+def mixed_frame(n_rows, seed=0):
+    """Frame with the column types FeatEncoder detects: ids, binaries (with nulls), bool, ordinal, continuous,
+    text, dates and unhashable objects
+
+    Args:
+        n_rows (int): number of rows
+        seed (int, optional): seed. Defaults to 0.
+
+    Returns:
+        pandas.DataFrame: mixed types frame
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ID Cliente': np.arange(n_rows),
+        'Sucursal_id': rng.integers(0, 50, n_rows),
+        'Género': rng.choice(np.array(['F', 'M', None], dtype=object), n_rows, p=[0.48, 0.48, 0.04]),
+        'Activo': rng.random(n_rows) < 0.7,
+        'Nivel': rng.integers(1, 5, n_rows),
+        'Saldo': np.round(rng.lognormal(8, 1.5, n_rows), 2),
+        'Tasa': rng.random(n_rows),
+        'Ciudad': rng.choice(np.array([f"ciudad {i}" for i in range(300)], dtype=object), n_rows),
+        'Alta': pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3000, n_rows), unit='D'),
+        'Etiquetas': [[i % 3] for i in range(n_rows)],
+    })
@@ -0,0 +1,46 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from alignment import align_frames, align_panel, panel_to_frame
+from panel import PricePanel
+from synthetic import FIELDS, gbm_frames
+
+
+def merge_reduce(frames):
+    return reduce(lambda left, right: pd.merge(left, right, left_index=True, right_index=True, how='outer'), frames)
+
+
+def test_align_frames_matches_reduce_merge():
+    frames = gbm_frames(8, 300, gaps=0.05, late_listing=0.3, seed=3)
+
+    pd.testing.assert_frame_equal(align_frames(frames), merge_reduce(frames), check_freq=False)
+
+
+def test_align_panel_matches_reduce_merge():
+    frames = gbm_frames(5, 200, gaps=0.05, seed=4)
+    dates, tickers, fields, values = align_panel(frames)
+    frame = panel_to_frame(dates, tickers, fields, values)
+
+    expected = merge_reduce(frames)[frame.columns]
+    pd.testing.assert_frame_equal(frame, expected, check_freq=False)
+
+
+def test_align_panel_averages_repeated_dates():
+    df = gbm_frames(1, 10, gaps=0, seed=5)[0]
+    repeated = pd.concat([df, df.iloc[[3]] * 3]).sort_index()
+    dates, _, _, values = align_panel([repeated])
+
+    assert len(dates) == 10
+    np.testing.assert_allclose(values[3, 0], df.iloc[3].values * 2)
+
+
+def test_empty_range():
+    empty = [df.iloc[:0] for df in gbm_frames(3, 50, seed=6)]
+    panel = PricePanel.from_frames(empty)
+    frame = panel.frame()
+
+    assert frame.shape == (0, 3 * len(FIELDS))
+    assert list(frame.columns.names) == ['Attributes', 'Symbols']
+    assert align_frames(empty).shape == (0, 3 * len(FIELDS))
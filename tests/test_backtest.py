@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import walk_forward
+from optimizer import max_ratio
+from portfolio_funcs import returns_stats
+from synthetic import correlated_gbm
+
+
+@pytest.fixture
+def prices():
+    close = correlated_gbm(500, 5, seed=8)
+    return pd.DataFrame(close, columns=list('ABCDE'), index=pd.bdate_range('2015-01-01', periods=len(close)))
+
+
+@pytest.mark.parametrize('method', ['optimize', 'montecarlo'])
+def test_walk_forward_does_not_depend_on_n_jobs(prices, method):
+    runs = [walk_forward(prices, 10000, lookback=120, rebalance=7, method=method, n_portfolios=500, seed=1, n_jobs=n)
+            for n in (1, 2, 3)]
+    for other in runs[1:]:
+        pd.testing.assert_frame_equal(other['weights'], runs[0]['weights'], check_exact=True)
+        pd.testing.assert_frame_equal(other['shares'], runs[0]['shares'])
+        pd.testing.assert_series_equal(other['equity'], runs[0]['equity'], check_exact=True)
+        assert other['metrics'] == runs[0]['metrics']
+
+
+def test_walk_forward_weights_use_the_trailing_window(prices):
+    result = walk_forward(prices, 10000, lookback=120, rebalance=20)
+    returns = prices.pct_change()
+    for date, weights in result['weights'].iterrows():
+        stats = returns_stats(returns.loc[:date].tail(120), 120)
+        np.testing.assert_allclose(weights.values, max_ratio(stats['means'], stats['cov']))
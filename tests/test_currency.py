@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignment import convert_currency
+from investment import Portfolio
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C']
+
+
+@pytest.fixture
+def source():
+    return SyntheticSource(TICKERS + ['MXN=X', 'EUR=X'], n_dates=400, late_listing=0, seed=2)
+
+
+@pytest.fixture
+def portfolio(source):
+    port = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source, tickers_change=['A'])
+    port.get_data()
+    return port
+
+
+def test_change_currency_converts_once(portfolio):
+    raw = portfolio.adj_close.copy()
+    first = portfolio.change_currency().copy()
+    second = portfolio.change_currency().copy()
+    refreshed = portfolio.change_currency(refresh=True).copy()
+
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, refreshed)
+    fx = portfolio.fx['MXN=X'].reindex(first.index, method='ffill')
+    np.testing.assert_allclose(first['A'], raw['A'].reindex(first.index) * fx)
+    np.testing.assert_allclose(first[['B', 'C']], raw[['B', 'C']].reindex(first.index))
+
+
+def test_change_currency_after_update(portfolio):
+    portfolio.change_currency()
+    portfolio.get_best_portfolio(500, seed=0)
+    bar = portfolio.adj_close.tail(1) * 1.01
+    bar.index = bar.index + pd.Timedelta(days=1)
+    portfolio.update(bar)
+
+    converted = portfolio.change_currency()
+    np.testing.assert_allclose(converted.iloc[-1], bar.iloc[0])
+
+
+def legacy_change_currency(data, change):
+    new = pd.merge(change, data, how="inner", on='Date')
+    return pd.DataFrame(new[change.columns].values.reshape(-1, 1) * new[data.columns].values,
+                        columns=data.columns, index=new.index)
+
+
+def test_convert_currency_matches_the_merge_on_fx_dates(portfolio):
+    prices = portfolio.adj_close
+    fx = portfolio.source.get('MXN=X')[['Adj Close']].set_axis(['MXN=X'], axis=1).rename_axis('Date')
+    expected = legacy_change_currency(prices[['A', 'B']], fx)
+    converted = convert_currency(prices, fx, {'A': 'MXN=X', 'B': 'MXN=X'})
+    pd.testing.assert_frame_equal(converted.loc[expected.index, ['A', 'B']], expected, check_names=False)
+    pd.testing.assert_frame_equal(converted[['C']], prices[['C']])
+
+
+def test_change_currency_with_one_rate_per_ticker(source):
+    port = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source, currency_map={'A': 'MXN=X', 'C': 'EUR=X'})
+    port.get_data()
+    raw = port.adj_close.copy()
+    converted = port.change_currency()
+    for ticker, pair in [('A', 'MXN=X'), ('C', 'EUR=X')]:
+        fx = port.fx[pair].ffill().reindex(converted.index, method='ffill')
+        np.testing.assert_allclose(converted[ticker], raw[ticker].reindex(converted.index) * fx)
+    np.testing.assert_allclose(converted['B'], raw['B'].reindex(converted.index))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_sources import CachedSource, DataSource, PriceStore
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C']
+
+
+class RecordingSource(DataSource):
+    """Passes the requests to another source and records their ranges"""
+
+    def __init__(self, source):
+        self.source = source
+        self.requests = []
+
+    def get(self, ticker, start=None, end=None, interval="d"):
+        self.requests.append((ticker, start, end))
+        return self.source.get(ticker, start=start, end=end, interval=interval)
+
+
+@pytest.fixture
+def synthetic():
+    return SyntheticSource(TICKERS, n_dates=300, gaps=0, late_listing=0, seed=1)
+
+
+def test_cached_source_serves_the_stored_range(synthetic, tmp_path):
+    recorder = RecordingSource(synthetic)
+    cached = CachedSource(recorder, PriceStore(tmp_path))
+    first = cached.get('A', start='2010-03-01', end='2010-06-01')
+    again = cached.get('A', start='2010-04-01', end='2010-05-01')
+
+    assert len(recorder.requests) == 1
+    pd.testing.assert_frame_equal(again, first.loc['2010-04-01':'2010-05-01'], check_freq=False, check_names=False)
+
+
+def test_cached_source_only_refetches_the_missing_dates(synthetic, tmp_path):
+    recorder = RecordingSource(synthetic)
+    cached = CachedSource(recorder, PriceStore(tmp_path))
+    stored = cached.get('A', start='2010-03-01', end='2010-06-01')
+    recorder.requests.clear()
+
+    df = cached.get('A', start='2010-02-01', end='2010-07-01')
+
+    first, last = stored.index[0], stored.index[-1]
+    assert recorder.requests == [('A', '2010-02-01', first), ('A', last, '2010-07-01')]
+    expected = synthetic.get('A', start='2010-02-01', end='2010-07-01')
+    pd.testing.assert_frame_equal(df, expected, check_freq=False, check_names=False)
+    assert not df.index.duplicated().any()
+    # the whole range is stored now
+    recorder.requests.clear()
+    cached.get('A', start='2010-02-15', end='2010-06-15')
+    assert recorder.requests == []
+
+
+def test_cached_source_does_not_request_dates_without_bars(synthetic, tmp_path):
+    recorder = RecordingSource(synthetic)
+    cached = CachedSource(recorder, PriceStore(tmp_path))
+    # a saturday before the first bar and a sunday as end, the range has no bars at both sides
+    for _ in range(3):
+        df = cached.get('A', start='2009-12-26', end='2010-05-02')
+
+    assert recorder.requests == [('A', '2009-12-26', '2010-05-02')]
+    pd.testing.assert_frame_equal(df, synthetic.get('A', end='2010-05-02'), check_freq=False, check_names=False)
+
+
+def test_cached_source_without_end_only_requests_the_last_bar(synthetic, tmp_path):
+    recorder = RecordingSource(synthetic)
+    cached = CachedSource(recorder, PriceStore(tmp_path))
+    df = cached.get('A', start='2009-12-26')
+    recorder.requests.clear()
+    cached.get('A', start='2009-12-26')
+
+    assert recorder.requests == [('A', df.index[-1], None)]
+
+
+def test_price_store_files_without_range_cover_their_bars(synthetic, tmp_path):
+    store = PriceStore(tmp_path)
+    df = synthetic.get('A', start='2010-03-01', end='2010-06-01')
+    np.savez(store.path('A', 'd'), dates=df.index.values.astype('datetime64[ns]').astype(np.int64),
+             values=df.values, fields=np.array(df.columns, dtype=str))
+
+    loaded, start, end = store.load_covered('A')
+    assert (start, end) == (df.index[0], df.index[-1])
+    pd.testing.assert_frame_equal(loaded, df, check_freq=False, check_names=False)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from encoder import FeatEncoder
+from synthetic import mixed_frame
+
+
+def legacy_prefixes(df, cardinal_threshold=5):
+    """type of every column as the encoder decided it with nunique over a copy of the whole frame"""
+    prefixes = {}
+    for col in df.columns:
+        try:
+            df[col].unique()
+        except TypeError:
+            prefixes[col] = 'other'
+            continue
+        name = col.strip().replace(' ', '_').lower()
+        kind = df[col].dtype.kind
+        if name[:3] == 'id_' or name[-3:] == '_id' or name == 'id':
+            prefixes[col] = 'id'
+        elif df[col].nunique() == 2:
+            prefixes[col] = 'bin'
+        elif kind in 'OSU':
+            prefixes[col] = 'str'
+        elif kind in 'mM':
+            prefixes[col] = 'date'
+        elif kind in 'iuf':
+            prefixes[col] = 'cont' if df[col].nunique() > cardinal_threshold else 'ord'
+        else:
+            prefixes[col] = 'other'
+    return prefixes
+
+
+def legacy_transform(df, encoder):
+    work_df = df.copy().rename(columns=encoder.names)
+    for col in encoder.feats_bin:
+        if work_df[col].dtype == bool:
+            work_df[col] = work_df[col].astype(int)
+        elif work_df[col].dtype == 'object':
+            category = [x for x in work_df[col].unique() if x == x]
+            work_df[col] = work_df[col].replace({k: category.index(k) for k in category})
+    work_df[encoder.feats_str] = work_df[encoder.feats_str].astype(str)
+    return work_df
+
+
+@pytest.fixture
+def frame():
+    return mixed_frame(6000, seed=1)
+
+
+def test_fit_matches_the_column_types(frame):
+    encoder = FeatEncoder().fit(frame)
+    assert {col: name.split('_')[0] for col, name in encoder.names.items()} == legacy_prefixes(frame)
+    assert encoder.names['Sucursal_id'] == 'id_sucursal'
+    assert encoder.bin_dict == {'Género': [x for x in frame['Género'].unique() if x == x]}
+
+
+def test_fit_chunks_equals_fit(frame):
+    whole = FeatEncoder().fit(frame)
+    chunked = FeatEncoder().fit_chunks(np.array_split(frame, 7))
+    partial = FeatEncoder()
+    for chunk in np.array_split(frame, 3):
+        partial.partial_fit(chunk)
+    for encoder in (chunked, partial):
+        assert encoder.names == whole.names
+        assert encoder.bin_dict == whole.bin_dict
+        assert encoder.feats_numeric == whole.feats_numeric
+
+
+def test_refit_does_not_stack_the_lists(frame):
+    encoder = FeatEncoder(feats_cont=['Nivel'])
+    first = dict(encoder.fit(frame).names), list(encoder.feats_cont)
+    assert (encoder.fit(frame).names, encoder.feats_cont) == first
+    assert encoder.names['Nivel'] == 'cont_nivel'
+
+
+def test_transform_matches_the_copying_transform(frame):
+    encoder = FeatEncoder().fit(frame)
+    pd.testing.assert_frame_equal(encoder.transform(frame), legacy_transform(frame, encoder))
+
+
+def test_transform_chunks_equals_transform(frame):
+    encoder = FeatEncoder().fit(frame)
+    expected = encoder.transform(frame)
+    pd.testing.assert_frame_equal(pd.concat(encoder.transform_chunks(frame, chunk_size=1000)), expected)
+    pd.testing.assert_frame_equal(pd.concat(encoder.transform_chunks(iter(np.array_split(frame, 4)))), expected)
+
+
+def test_transform_does_not_modify_the_input(frame):
+    original = frame.copy()
+    encoder = FeatEncoder().fit(frame)
+    encoder.transform(frame)
+    pd.testing.assert_frame_equal(frame, original)
+
+
+def test_transform_unseen_binary_value_is_nan(frame):
+    encoder = FeatEncoder().fit(frame)
+    new = frame.head(3).copy()
+    new['Género'] = ['M', 'X', 'F']
+    np.testing.assert_array_equal(encoder.transform(new)['bin_genero'].values, [1, np.nan, 0])
@@ -0,0 +1,68 @@
+import pytest
+
+from data_sources import FetchError, StubSource, fetch_many
+from investment import Portfolio
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C']
+FIELDS = ['High', 'Low', 'Open', 'Close', 'Volume', 'Adj Close']
+
+
+@pytest.fixture
+def synthetic():
+    return SyntheticSource(TICKERS, n_dates=300, gaps=0, late_listing=0, seed=1)
+
+
+def test_fetch_many_retries_failed_requests(synthetic):
+    source = StubSource(synthetic, fail_first=2)
+    frames, report = fetch_many(source, TICKERS, retries=2, backoff=0)
+
+    assert report.ok == TICKERS and not report.failed
+    assert report.attempts == {t: 3 for t in TICKERS}
+    assert set(frames) == set(TICKERS)
+
+
+def test_fetch_many_reports_the_failures(synthetic):
+    source = StubSource(synthetic, fail_tickers=['B'])
+    frames, report = fetch_many(source, TICKERS, retries=1, backoff=0)
+
+    assert report.ok == ['A', 'C']
+    assert isinstance(report.failed['B'], ConnectionError)
+    assert report.attempts['B'] == 2 and source.calls['B'] == 2
+    assert 'B' not in frames
+
+
+def test_fetch_many_timeout(synthetic):
+    source = StubSource(synthetic, latency=1)
+    frames, report = fetch_many(source, TICKERS, max_workers=3, retries=0, timeout=0.1)
+
+    assert frames == {}
+    assert set(report.failed) == set(TICKERS)
+    assert all(isinstance(e, TimeoutError) for e in report.failed.values())
+
+
+def test_fetch_many_keeps_the_frames_of_every_ticker(synthetic):
+    source = StubSource(synthetic, latency=0.01, jitter=0.02, seed=0)
+    frames, _ = fetch_many(source, TICKERS, max_workers=3)
+
+    for ticker in TICKERS:
+        assert frames[ticker].equals(synthetic.get(ticker))
+
+
+def test_get_data_raises_fetch_error_with_the_report(synthetic):
+    port = Portfolio(1000, TICKERS, source=StubSource(synthetic, fail_tickers=['C']))
+    with pytest.raises(FetchError) as error:
+        port.get_data(retries=0)
+    assert list(error.value.report.failed) == ['C']
+    assert port.fetch_report.ok == ['A', 'B']
+
+
+def test_get_new_data_raises_or_reports_the_failures(synthetic):
+    source = StubSource(synthetic, fail_tickers=['B'])
+    with pytest.raises(FetchError):
+        Portfolio.get_new_data(TICKERS, 'd', FIELDS, source=source, retries=0)
+
+    new, report = Portfolio.get_new_data(TICKERS, 'd', FIELDS, source=source, retries=0, return_report=True)
+    assert list(report.failed) == ['B']
+    assert list(new['Adj Close'].columns) == TICKERS
+    assert new['Adj Close']['B'].isna().all()
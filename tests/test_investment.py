@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from investment import Portfolio
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C']
+
+
+@pytest.fixture
+def source():
+    return SyntheticSource(TICKERS + ['MXN=X'], n_dates=400, late_listing=0, seed=2)
+
+
+@pytest.fixture
+def portfolio(source):
+    port = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source, tickers_change=['A'])
+    port.get_data()
+    return port
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_memory_budget_keeps_only_the_top_portfolios(portfolio, n_jobs):
+    whole = portfolio.get_best_portfolio(4000, seed=5, select=('cvar 0.05',))
+    bounded = portfolio.get_best_portfolio(4000, seed=5, select=('cvar 0.05',), memory_budget=2**30, n_jobs=n_jobs,
+                                           top_k=3)
+
+    frontiers = sum(len(portfolio.pareto_frontier(risk)) for risk in portfolio.frontiers)
+    assert len(portfolio.weights) <= 3 * len(bounded) + frontiers
+    assert len(portfolio.shares) == len(portfolio.weights) == len(portfolio.simulation['sharpe'])
+    if n_jobs == 1:
+        # one block holds every portfolio, the draws are the same as without memory_budget
+        for name in whole:
+            np.testing.assert_allclose(bounded[name]['weigths'], whole[name]['weigths'])
+            assert bounded[name]['leftover'] == pytest.approx(whole[name]['leftover'])
+
+
+def test_memory_budget_with_workers_is_reproducible(portfolio):
+    runs = [portfolio.get_best_portfolio(4000, seed=5, memory_budget=2**16, n_jobs=2, top_k=2) for _ in range(2)]
+
+    for name in runs[0]:
+        np.testing.assert_array_equal(runs[0][name]['weigths'], runs[1][name]['weigths'])
+        np.testing.assert_array_equal(runs[0][name]['n_buys'], runs[1][name]['n_buys'])
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import momentum
+from momentum import OSCILLATORS, exp_e_avg, kernel_weights, oscillators, pond_avg, rolling_max, rolling_min, weighted_average
+from synthetic import correlated_gbm
+
+
+def legacy_avg(x, constant):
+    x = x[::-1]
+    weights = np.array([constant**(len(x) - 1 - y) / (constant**(len(x)) - 1) for y in range(len(x))])
+    return np.dot(np.array(x), weights)
+
+
+def legacy_pond_avg(x):
+    x = x[::-1]
+    weights = np.array([((len(x) - y)) / (int(((len(x)) * ((len(x) + 1)))) / 2) for y in range(len(x))])
+    return np.dot(np.array(x), weights)
+
+
+@pytest.fixture
+def prices():
+    close = correlated_gbm(300, 4, seed=5)
+    return pd.DataFrame(close, columns=list('ABCD'), index=pd.bdate_range('2018-01-01', periods=len(close)))
+
+
+@pytest.mark.parametrize('kind,constant', [('exp_2', 2), ('exp_e', np.e), ('exp_x', 10), ('pond', None)])
+@pytest.mark.parametrize('window', [5, 20])
+def test_weighted_average_matches_rolling_apply(prices, kind, constant, window):
+    legacy = legacy_pond_avg if kind == 'pond' else (lambda x: legacy_avg(x, constant))
+    expected = prices.rolling(window).apply(legacy, raw=True)
+    scale = 1.0 if kind == 'pond' else 1 / (constant - 1)
+    result = weighted_average(prices, window, kind) * scale
+    pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
+
+def test_weighted_average_with_nan(prices):
+    prices = prices.copy()
+    prices.iloc[40:43, 2] = np.nan
+    expected = prices.rolling(10).apply(lambda x: legacy_avg(x, np.e), raw=True)
+    result = weighted_average(prices, 10, 'exp_e') / (np.e - 1)
+    pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
+
+def test_window_averages_keep_their_values(prices):
+    x = prices['A'].values[:30]
+    assert exp_e_avg(x) == pytest.approx(legacy_avg(x, np.e), rel=1e-12)
+    assert pond_avg(x) == pytest.approx(legacy_pond_avg(x), rel=1e-12)
+
+
+def test_kernel_weights_long_window():
+    w = kernel_weights('exp_x', 5000, 10)
+    assert np.isfinite(w).all()
+    assert w.sum() == pytest.approx(1)
+
+
+@pytest.mark.parametrize('window', [14, 26])
+def test_oscillators_match_rolling_apply(prices, window):
+    prices = prices.copy()
+    prices.iloc[100:103, 1] = np.nan
+    result = oscillators(prices, windows=(window,))
+    for name in OSCILLATORS:
+        expected = prices.rolling(window).apply(getattr(momentum, name), raw=True)
+        expected.columns = [f"{name}_{col}_{window}" for col in prices.columns]
+        pd.testing.assert_frame_equal(result[expected.columns], expected, rtol=1e-8)
+
+
+@pytest.mark.parametrize('window', [1, 3, 7, 50])
+def test_rolling_extrema(prices, window):
+    values = prices.values.copy()
+    values[60:62, 0] = np.nan
+    frame = pd.DataFrame(values)
+    np.testing.assert_allclose(rolling_max(values, window), frame.rolling(window).max().values)
+    np.testing.assert_allclose(rolling_min(values, window), frame.rolling(window).min().values)
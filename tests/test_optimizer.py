@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from optimizer import OptimizationError, efficient_frontier, max_ratio, min_volatility, optimize_portfolios
+from portfolio_funcs import returns_stats, score_portfolios
+from synthetic import correlated_gbm
+
+
+def window(n_assets, seed=0):
+    prices = pd.DataFrame(correlated_gbm(400, n_assets, seed=seed))
+    return returns_stats(prices.pct_change().dropna().tail(180), 180)
+
+
+def ratio(w, means, cov, risk_free=0):
+    return (1 + w @ means - risk_free) / np.sqrt(np.einsum('...i,ij,...j->...', w, cov, w))
+
+
+def best_transfer(w, objective, step=1e-4):
+    """largest improvement of objective moving step of weight from one asset to another, over every pair"""
+    base = objective(w)
+    best = -np.inf
+    for i in np.flatnonzero(w >= step):
+        moved = np.repeat(w[None], len(w), axis=0)
+        moved[:, i] -= step
+        moved[np.arange(len(w)), np.arange(len(w))] += step
+        best = max(best, np.max(objective(moved) - base))
+    return best
+
+
+@pytest.mark.parametrize('n_assets', [100, 200])
+def test_max_ratio_is_the_optimum(n_assets):
+    stats = window(n_assets)
+    for cov in (stats['cov'], stats['cov down']):
+        w = max_ratio(stats['means'], cov, risk_free=0.01)
+        best = ratio(w, stats['means'], cov, 0.01)
+
+        assert w.min() >= 0 and w.sum() == pytest.approx(1)
+        assert best > ratio(min_volatility(cov), stats['means'], cov, 0.01)
+        random = np.random.default_rng(1).dirichlet(np.full(n_assets, 0.05), 20000)
+        assert best >= ratio(random, stats['means'], cov, 0.01).max()
+        assert best_transfer(w, lambda x: ratio(x, stats['means'], cov, 0.01)) <= 1e-9 * best
+
+
+def test_min_volatility_is_the_optimum():
+    cov = window(150, seed=2)['cov']
+    w = min_volatility(cov)
+    variance = lambda x: -np.einsum('...i,ij,...j->...', x, cov, x)
+
+    assert w.min() >= 0 and w.sum() == pytest.approx(1)
+    assert best_transfer(w, variance) <= 1e-12 * -variance(w)
+
+
+def test_efficient_frontier_hits_the_targets():
+    stats = window(100, seed=3)
+    weights, returns = efficient_frontier(stats['means'], stats['cov'], n_points=10)
+    volatility = np.sqrt(np.einsum('ij,jk,ik->i', weights, stats['cov'], weights))
+
+    np.testing.assert_allclose(weights.sum(1), 1)
+    assert weights.min() >= 0
+    min_vol = min_volatility(stats['cov'])
+    np.testing.assert_allclose(returns, np.linspace(min_vol @ stats['means'], stats['means'].max(), 10) + 1)
+    assert np.all(np.diff(volatility) >= -1e-12)
+    random = np.random.default_rng(4).dirichlet(np.full(100, 0.05), 20000)
+    sim = score_portfolios(random, stats, sortino=False)
+    for r, v in zip(returns, volatility):
+        assert v <= sim['volatility'][sim['returns'] >= r].min(initial=np.inf) + 1e-12
+
+
+def test_optimize_portfolios_labels():
+    prices = pd.DataFrame(correlated_gbm(400, 120, seed=5))
+    weights, simulation, frontier = optimize_portfolios(prices.pct_change().dropna().tail(180))
+
+    assert frontier is None
+    assert simulation['sharpe'][0] == simulation['sharpe'].max()
+    assert simulation['sortino'][1] == simulation['sortino'].max()
+    assert simulation['volatility'][2] == simulation['volatility'].min()
+    assert not np.allclose(weights[0], weights[2])
+
+
+def test_max_ratio_without_positive_excess_raises():
+    with pytest.raises(OptimizationError):
+        max_ratio(np.array([-0.5, -0.3]), np.eye(2), risk_free=1)
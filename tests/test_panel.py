@@ -0,0 +1,59 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment import Portfolio
+from panel import PricePanel
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C']
+
+
+@pytest.fixture
+def portfolio():
+    source = SyntheticSource(TICKERS + ['MXN=X'], n_dates=300, late_listing=0.3, seed=3)
+    port = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source, tickers_change=['A'])
+    port.get_data()
+    return port
+
+
+def test_set_panel_keeps_views_of_the_panel(portfolio):
+    panel = portfolio.panel
+    assert np.shares_memory(portfolio.data.values, panel.values)
+    expected = panel.field('Adj Close', TICKERS).ffill().dropna()
+    pd.testing.assert_frame_equal(portfolio.adj_close, expected)
+    assert portfolio.adj_close.index[0] > panel.dates[0]
+    assert not np.shares_memory(portfolio.adj_close.values, panel.values)
+
+
+def test_set_panel_with_a_subset_of_tickers(portfolio):
+    port = Portfolio(5000, ['C', 'A'], source=portfolio.source)
+    port.set_panel(portfolio.panel)
+    pd.testing.assert_frame_equal(port.adj_close, portfolio.panel.field('Adj Close', ['C', 'A']).ffill().dropna())
+
+
+def test_update_does_not_write_the_panel(portfolio):
+    panel_values = portfolio.panel.values.copy()
+    portfolio.get_best_portfolio(300, seed=0)
+    bar = portfolio.adj_close.tail(1) * 1.02
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        portfolio.update(bar)
+        bar.index = bar.index + pd.Timedelta(days=1)
+        portfolio.update(bar)
+    np.testing.assert_array_equal(portfolio.panel.values, panel_values)
+    assert portfolio.adj_close.index[-1] == bar.index[-1]
+
+
+def test_change_currency_after_update_keeps_the_raw_prices(portfolio):
+    portfolio.get_best_portfolio(300, seed=0)
+    bar = portfolio.adj_close.tail(1) * 1.02
+    bar.index = bar.index + pd.Timedelta(days=1)
+    portfolio.update(bar)
+    raw = portfolio.adj_close.copy()
+    converted = portfolio.change_currency()
+    fx = portfolio.fx['MXN=X'].reindex(converted.index, method='ffill')
+    np.testing.assert_allclose(converted['A'], raw['A'].reindex(converted.index) * fx)
+    pd.testing.assert_frame_equal(portfolio.change_currency(), converted)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment import Portfolio
+from momentum import omega_ratio
+from portfolio_funcs import get_weights, metric_key, path_metric_args, simulate_portfolios
+from synthetic import SyntheticSource, correlated_gbm
+
+
+@pytest.fixture
+def market():
+    prices = pd.DataFrame(correlated_gbm(300, 5, seed=3))
+    returns = prices.pct_change().dropna().tail(180)
+    weights = get_weights(5, 200, rng=np.random.default_rng(0))
+    return weights, returns
+
+
+def direct_metrics(path, threshold, returns_periods, q=0.10, alphas=(0.01, 0.05)):
+    excess = path - threshold
+    downside = np.abs(np.minimum(excess, 0)).mean()
+    ordered = np.sort(path)
+    k = int(np.ceil(q * len(path)))
+    metrics = {'omega': 1 + excess.mean() / downside, 'returns down': downside * returns_periods + 1,
+               'tail': ordered[-k:].sum() / abs(ordered[:k].sum())}
+    for alpha in alphas:
+        k = int(np.ceil(alpha * len(path)))
+        metrics[f'var {alpha}'] = -ordered[k - 1]
+        metrics[f'cvar {alpha}'] = -ordered[:k].mean()
+    return metrics
+
+
+@pytest.mark.parametrize('risk_mode,memory_budget', [('path', None), ('path', 2**14), ('cov', None)])
+def test_path_metrics_match_direct_computation(market, risk_mode, memory_budget):
+    weights, returns = market
+    simulation = simulate_portfolios(weights, returns, risk_free=0.02, returns_periods=180, omega=True, tail=True,
+                                     var_alphas=(0.01, 0.05), risk_mode=risk_mode, memory_budget=memory_budget)
+    paths = weights @ returns.values.T
+    for key in ['omega', 'returns down', 'tail', 'var 0.01', 'cvar 0.01', 'var 0.05', 'cvar 0.05']:
+        expected = [direct_metrics(path, 0.02 / 180, 180)[key] for path in paths]
+        np.testing.assert_allclose(simulation[key], expected, rtol=1e-10, err_msg=key)
+
+
+def test_omega_without_risk_free_matches_omega_ratio(market):
+    weights, returns = market
+    simulation = simulate_portfolios(weights, returns, omega=True)
+    expected = [omega_ratio(returns @ w) for w in weights]
+    np.testing.assert_allclose(simulation['omega'], expected, rtol=1e-10)
+
+
+@pytest.mark.parametrize('key,expected', [('CVaR 0.050', 'cvar 0.05'), (' VAR  .01 ', 'var 0.01'), ('Omega', 'omega'),
+                                          ('returns   down', 'returns down'), ('Volatility Down', 'volatility down')])
+def test_metric_key(key, expected):
+    assert metric_key(key) == expected
+
+
+@pytest.mark.parametrize('key', ['cvar', 'var x', 'calmar', 'sharpe ratio'])
+def test_metric_key_rejects_unknown_metrics(key):
+    with pytest.raises(ValueError):
+        metric_key(key)
+
+
+def test_path_metric_args():
+    assert path_metric_args(('Omega', 'cvar 0.05', 'VaR 0.01', 'var 0.050')) == {
+        'omega': True, 'tail': False, 'var_alphas': (0.01, 0.05)}
+    assert path_metric_args(('returns down', 'tail')) == {'omega': True, 'tail': True, 'var_alphas': ()}
+
+
+def test_select_picks_the_best_portfolio_of_each_metric():
+    source = SyntheticSource(['A', 'B', 'C'], n_dates=300, late_listing=0, seed=1)
+    portfolio = Portfolio(5000, ['A', 'B', 'C'], '2010-01-01', None, 'd', source=source)
+    portfolio.get_data()
+    best = portfolio.get_best_portfolio(2000, seed=0, select=('Omega', 'CVaR 0.050', 'tail'))
+    assert portfolio.select == ('omega', 'cvar 0.05', 'tail')
+    for key, pick in [('omega', np.nanargmax), ('cvar 0.05', np.nanargmin), ('tail', np.nanargmax)]:
+        np.testing.assert_array_equal(best[key]['weigths'], portfolio.weights[pick(portfolio.simulation[key])])
+    with pytest.raises(ValueError):
+        portfolio.get_best_portfolio(100, seed=0, select=('calmar',))
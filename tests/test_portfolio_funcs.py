@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_funcs import allocate_lots, simulate_parallel, simulate_portfolios, top_portfolios
+from synthetic import correlated_gbm
+
+
+@pytest.fixture
+def market():
+    prices = correlated_gbm(400, 6, seed=7)
+    returns = pd.DataFrame(prices).pct_change().dropna()
+    return prices[-1:], returns.tail(180)
+
+
+def test_simulate_parallel_is_reproducible(market):
+    assets, returns = market
+    runs = [simulate_parallel(6, 3000, 10000, assets, returns, n_jobs=2, seed=11) for _ in range(2)]
+
+    np.testing.assert_array_equal(runs[0][0], runs[1][0])
+    for key in runs[0][1]:
+        np.testing.assert_array_equal(runs[0][1][key], runs[1][1][key])
+    other = simulate_parallel(6, 3000, 10000, assets, returns, n_jobs=2, seed=12)
+    assert not np.array_equal(other[0], runs[0][0])
+
+
+def test_simulate_parallel_top_k_merges_the_workers(market):
+    assets, returns = market
+    weights, simulation, shares, leftover = simulate_parallel(6, 3000, 10000, assets, returns, n_jobs=3, seed=11,
+                                                              return_shares=True)
+    selector = simulate_parallel(6, 3000, 10000, assets, returns, n_jobs=3, seed=11, top_k=5)
+    top, _ = selector.results()
+
+    assert selector.count == len(weights)
+    for name, key, maximize in [('sharpe', 'sharpe', True), ('sortino', 'sortino', True), ('min_vol', 'volatility', False)]:
+        best = top_portfolios(simulation, key, 5, maximize)
+        np.testing.assert_array_equal(top[name]['index'], best)
+        np.testing.assert_allclose(top[name]['weights'], weights[best])
+        np.testing.assert_array_equal(top[name]['shares'], shares[best])
+        np.testing.assert_allclose(top[name]['leftover'], leftover[best])
+
+
+def test_simulate_parallel_top_k_is_reproducible(market):
+    assets, returns = market
+    runs = [simulate_parallel(6, 5000, 10000, assets, returns, n_jobs=2, seed=3, top_k=3, memory_budget=2**18)
+            for _ in range(2)]
+    first, second = runs[0].kept(), runs[1].kept()
+
+    assert len(first['index']) <= 9
+    for key in first:
+        np.testing.assert_array_equal(first[key], second[key])
+
+
+def test_chunked_simulation_matches_the_whole_matrix(market):
+    _, returns = market
+    weights = np.random.default_rng(0).dirichlet(np.ones(6), 2000)
+    whole = simulate_portfolios(weights, returns, omega=True, var_alphas=(0.05,))
+    for options in ({'chunk_size': 77}, {'memory_budget': 2**16}):
+        chunked = simulate_portfolios(weights, returns, omega=True, var_alphas=(0.05,), **options)
+        assert set(chunked) == set(whole)
+        for key in whole:
+            np.testing.assert_allclose(chunked[key], whole[key], rtol=1e-10)
+
+
+def test_covariance_risk_matches_path_risk(market):
+    _, returns = market
+    weights = np.random.default_rng(1).dirichlet(np.ones(6), 1000)
+    path = simulate_portfolios(weights, returns, risk_free=0.02, risk_mode='path')
+    cov = simulate_portfolios(weights, returns, risk_free=0.02, risk_mode='cov')
+
+    assert set(cov) == set(path)
+    for key in path:
+        np.testing.assert_allclose(cov[key], path[key], rtol=1e-9)
+
+
+def test_allocate_lots_never_exceeds_the_budget():
+    rng = np.random.default_rng(2)
+    prices = rng.uniform(5, 3000, (1, 12))
+    weights = rng.dirichlet(np.full(12, 0.3), 5000)
+    for budget in (100, 2500, 1e5):
+        shares, w, leftover = allocate_lots(budget, weights, prices, unique=False)
+        cost = shares @ prices[0]
+
+        assert np.all(cost <= budget + 1e-6)
+        np.testing.assert_allclose(leftover, budget - cost)
+        assert np.all(leftover < prices.min())
+        assert np.all(shares >= np.floor(weights * budget / prices + 1e-9))
+        bought = shares.sum(1) > 0
+        np.testing.assert_allclose(w[bought].sum(1), 1)
+
+
+def test_allocate_lots_unique_drops_repeated_and_empty_allocations():
+    prices = np.array([[10.0, 20.0]])
+    weights = np.array([[0.5, 0.5], [0.5, 0.5], [0.6, 0.4]])
+    shares, w, leftover = allocate_lots(100, weights, prices)
+
+    assert len(shares) == len(w) == len(leftover) == len({tuple(s) for s in shares})
+    assert len(allocate_lots(5, weights, prices)[0]) == 0
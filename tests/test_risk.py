@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+from investment import Portfolio
+from risk import VaREngine, parametric_var, var_cvar_batch
+from synthetic import SyntheticSource, correlated_gbm
+
+TICKERS = ['A', 'B', 'C']
+
+
+@pytest.fixture
+def returns():
+    prices = pd.DataFrame(correlated_gbm(600, 4, seed=12), columns=list('WXYZ'),
+                          index=pd.bdate_range('2015-01-01', periods=600))
+    return prices.pct_change().dropna()
+
+
+@pytest.fixture
+def portfolio():
+    source = SyntheticSource(TICKERS + ['MXN=X'], n_dates=400, late_listing=0, seed=2)
+    port = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source, tickers_change=['A'])
+    port.get_data()
+    return port
+
+
+def test_parametric_var_matches_the_normal_quantiles(returns):
+    weights = np.random.default_rng(0).dirichlet(np.ones(4), 50)
+    means, cov = returns.values.mean(0), np.cov(returns.values, rowvar=False)
+    result = parametric_var(weights, means, cov, alphas=(0.01, 0.05), horizons=(1, 10), value=1000, chunk_size=7)
+    for i, w in enumerate(weights):
+        for j, h in enumerate((1, 10)):
+            mu, sigma = w @ means * h, np.sqrt(w @ cov @ w * h)
+            for alpha in (0.01, 0.05):
+                loss = -norm(mu, sigma).ppf(alpha)
+                shortfall = -(mu - sigma * norm.pdf(norm.ppf(alpha)) / alpha)
+                assert result[f'var {alpha}'][i, j] == pytest.approx(1000 * loss, rel=1e-9)
+                assert result[f'cvar {alpha}'][i, j] == pytest.approx(1000 * shortfall, rel=1e-9)
+
+
+def test_monte_carlo_matches_its_scenarios(returns):
+    weights = np.random.default_rng(1).dirichlet(np.ones(4), 30)
+    engine = VaREngine(returns, window=250, n_scenarios=5000, chunk_size=700, seed=3)
+    result = engine.monte_carlo(weights, alphas=(0.05,), horizons=(1, 5))
+    growth = engine.scenarios((1, 5))
+    for j in range(2):
+        expected = var_cvar_batch((weights @ growth[:, j, :].T - 1).T, (0.05,))
+        np.testing.assert_allclose(result['var 0.05'][:, j], expected['var 0.05'])
+        np.testing.assert_allclose(result['cvar 0.05'][:, j], expected['cvar 0.05'])
+
+    other = VaREngine(returns, window=250, n_scenarios=5000, chunk_size=5000, seed=3).monte_carlo(weights, horizons=(1, 5))
+    np.testing.assert_allclose(other['cvar 0.05'], result['cvar 0.05'])
+
+
+def test_monte_carlo_converges_to_parametric(returns):
+    weights = np.random.default_rng(2).dirichlet(np.ones(4), 5)
+    engine = VaREngine(returns, window=250, n_scenarios=200000, seed=0)
+    stats = engine.stats()
+    parametric = parametric_var(weights, stats['means'], stats['cov'])
+    monte_carlo = engine.monte_carlo(weights)
+    np.testing.assert_allclose(monte_carlo['var 0.05'], parametric['var 0.05'], rtol=0.03)
+    np.testing.assert_allclose(monte_carlo['cvar 0.05'], parametric['cvar 0.05'], rtol=0.03)
+
+
+def test_window_statistics_by_date(returns):
+    engine = VaREngine(returns, window=100)
+    end = returns.index[300]
+    stats = engine.stats(end)
+    window = returns.values[201:301]
+    np.testing.assert_allclose(stats['means'], window.mean(0))
+    np.testing.assert_allclose(stats['cov'], np.cov(window, rowvar=False))
+    assert engine.stats(301) is stats
+
+
+def test_value_at_risk_follows_update(portfolio):
+    portfolio.get_best_portfolio(500, seed=0)
+    before = portfolio.value_at_risk(method='parametric')
+
+    crash = portfolio.adj_close.tail(1) * 0.5
+    portfolio.update(crash)
+    after = portfolio.value_at_risk(method='parametric')
+
+    assert (after['var 0.05'] > before['var 0.05']).all()
+    assert (after['cvar 0.05'] > before['cvar 0.05']).all()
+
+
+def test_value_at_risk_follows_change_currency(portfolio):
+    portfolio.get_best_portfolio(500, seed=0)
+    before = portfolio.value_at_risk(method='montecarlo', n_scenarios=2000, seed=0)
+    portfolio.change_currency()
+    after = portfolio.value_at_risk(method='montecarlo', n_scenarios=2000, seed=0)
+
+    assert not np.allclose(after['cvar 0.05'], before['cvar 0.05'])
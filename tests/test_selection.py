@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment import Portfolio
+from portfolio_funcs import SimulationSelector, pareto_front, top_portfolios
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C', 'D']
+
+
+def brute_pareto(returns, risk):
+    valid = ~(np.isnan(returns) | np.isnan(risk))
+    keep = [i for i in np.flatnonzero(valid)
+            if not np.any(valid & (returns > returns[i]) & (risk <= risk[i]))]
+    return sorted(keep, key=lambda i: (risk[i], -returns[i]))
+
+
+@pytest.fixture
+def simulation():
+    rng = np.random.default_rng(0)
+    n = 3000
+    sim = {'returns': rng.normal(1.05, 0.1, n), 'volatility': rng.gamma(2, 0.05, n)}
+    sim['returns'][::97] = np.nan
+    sim['returns'][5:8] = sim['returns'][4]
+    sim['volatility'][5:8] = sim['volatility'][4]
+    sim['sharpe'] = (sim['returns'] - 1) / sim['volatility']
+    return sim, rng.random((n, 4))
+
+
+def test_top_portfolios_matches_a_full_sort(simulation):
+    sim, _ = simulation
+    for key, maximize in [('sharpe', True), ('volatility', False)]:
+        score = np.where(np.isnan(sim[key]), np.inf, -sim[key] if maximize else sim[key])
+        np.testing.assert_array_equal(top_portfolios(sim, key, 25, maximize), np.argsort(score, kind='stable')[:25])
+    assert len(top_portfolios(sim, 'sharpe', 10**6)) == len(sim['sharpe'])
+
+
+def test_pareto_front_matches_brute_force(simulation):
+    sim, _ = simulation
+    front = pareto_front(sim['returns'], sim['volatility'])
+    expected = brute_pareto(sim['returns'], sim['volatility'])
+    np.testing.assert_array_equal(sim['volatility'][front], sim['volatility'][expected])
+    np.testing.assert_array_equal(sim['returns'][front], sim['returns'][expected])
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 500, 3000])
+def test_selector_chunks_equal_the_whole_simulation(simulation, chunk):
+    sim, weights = simulation
+    metrics = {'sharpe': ('sharpe', True), 'min_vol': ('volatility', False)}
+    selector = SimulationSelector(5, metrics, frontiers=('volatility',))
+    for start in range(0, len(weights), chunk):
+        selector.update({k: v[start:start + chunk] for k, v in sim.items()}, weights[start:start + chunk])
+    top, frontier = selector.results()
+
+    for name, (key, maximize) in metrics.items():
+        index = top_portfolios(sim, key, 5, maximize)
+        np.testing.assert_array_equal(top[name]['index'], index)
+        np.testing.assert_array_equal(top[name]['weights'], weights[index])
+    front = pareto_front(sim['returns'], sim['volatility'])
+    np.testing.assert_array_equal(frontier['volatility']['returns'], sim['returns'][front])
+    np.testing.assert_array_equal(frontier['volatility']['volatility'], sim['volatility'][front])
+
+
+def test_merged_selectors_equal_one_selector(simulation):
+    sim, weights = simulation
+    whole = SimulationSelector(5, frontiers=('volatility',)).update(sim, weights)
+    parts = [SimulationSelector(5, frontiers=('volatility',)).update({k: v[a:b] for k, v in sim.items()}, weights[a:b])
+             for a, b in [(0, 1000), (1000, 1700), (1700, 3000)]]
+    merged = SimulationSelector(5, frontiers=('volatility',))
+    for part in parts:
+        merged.merge(part)
+    for name in ('sharpe', 'min_vol'):
+        np.testing.assert_array_equal(merged.top[name]['index'], whole.top[name]['index'])
+    np.testing.assert_array_equal(merged.frontier['volatility']['index'], whole.frontier['volatility']['index'])
+    np.testing.assert_array_equal(merged.kept()['index'], whole.kept()['index'])
+
+
+@pytest.fixture
+def portfolio():
+    source = SyntheticSource(TICKERS, n_dates=400, late_listing=0, seed=2)
+    port = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source)
+    port.get_data()
+    return port
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_pareto_frontier_with_memory_budget(portfolio, n_jobs):
+    portfolio.get_best_portfolio(6000, seed=5, n_jobs=n_jobs)
+    expected = {risk: portfolio.pareto_frontier(risk) for risk in ('volatility', 'volatility down')}
+    portfolio.get_best_portfolio(6000, seed=5, n_jobs=n_jobs, memory_budget=2**30, top_k=2)
+    assert len(portfolio.weights) < 6000
+    for risk, frame in expected.items():
+        result = portfolio.pareto_frontier(risk)
+        np.testing.assert_allclose(result[['returns', risk] + TICKERS].values, frame[['returns', risk] + TICKERS].values)
+    with pytest.raises(ValueError):
+        portfolio.pareto_frontier('sharpe')
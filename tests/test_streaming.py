@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from momentum import oscillators, weighted_average
+from streaming import BollingerState, MACDState, RSIState, StochasticState, WeightedAvgState, load_state
+from synthetic import correlated_gbm
+from trade_utils import bollinger_frame
+
+
+@pytest.fixture
+def prices():
+    close = correlated_gbm(400, 3, vol=0.5, seed=9)
+    return pd.DataFrame(close, columns=['A', 'B', 'C'], index=pd.bdate_range('2016-01-01', periods=len(close)))
+
+
+@pytest.mark.parametrize('kind', ['exp_2', 'exp_e', 'exp_x', 'pond'])
+def test_weighted_average_state_matches_batch(prices, kind):
+    state = WeightedAvgState(15, kind, n=3)
+    np.testing.assert_allclose(state.update_many(prices.values), weighted_average(prices.values, 15, kind), rtol=1e-9)
+
+
+def test_bollinger_state_matches_batch(prices):
+    prices = prices.copy()
+    prices.iloc[200:204, 0] = np.nan
+    batch = bollinger_frame(prices, period=20, width=2)
+    stream = BollingerState(20, 2, n=3).update_many(prices.values)
+    for key in ['close', 'mean', 'std', 'upper', 'lower']:
+        expected = batch[[f'{key}_{c}_20' if key in ('mean', 'std') else f'{key}_{c}' for c in prices.columns]]
+        np.testing.assert_allclose(stream[key], expected.values, rtol=1e-9)
+    np.testing.assert_array_equal(stream['cont'], batch[[f'cont_{c}' for c in prices.columns]].values)
+
+
+def test_oscillator_states_match_batch(prices):
+    window = 14
+    batch = oscillators(prices, ('RSI', 'MACD', 'K_line', 'D_line', 'williams'), windows=(window,))
+    columns = lambda name: [f'{name}_{c}_{window}' for c in prices.columns]
+
+    np.testing.assert_allclose(RSIState(window, n=3).update_many(prices.values), batch[columns('RSI')].values, rtol=1e-9)
+    np.testing.assert_allclose(MACDState(window, n=3).update_many(prices.values), batch[columns('MACD')].values,
+                               rtol=1e-9, atol=1e-9)
+    stochastic = StochasticState(window, n=3).update_many(prices.values)
+    for name in ['K_line', 'D_line', 'williams']:
+        np.testing.assert_allclose(stochastic[name], batch[columns(name)].values, rtol=1e-9)
+
+
+@pytest.mark.parametrize('make', [lambda: WeightedAvgState(10, 'pond', n=3), lambda: BollingerState(20, n=3),
+                                  lambda: RSIState(14, n=3), lambda: MACDState(26, n=3), lambda: StochasticState(14, n=3)])
+def test_restored_state_continues_the_stream(prices, make):
+    values = prices.values
+    whole = make().update_many(values)
+    state = make()
+    state.update_many(values[:150])
+    restored = load_state(json.loads(json.dumps(state.to_dict())))
+    rest = restored.update_many(values[150:])
+    if isinstance(whole, dict):
+        for key in whole:
+            np.testing.assert_allclose(rest[key], whole[key][150:], rtol=1e-12)
+    else:
+        np.testing.assert_allclose(rest, whole[150:], rtol=1e-12)
@@ -0,0 +1,63 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from synthetic import correlated_gbm
+from trade_utils import bollinger_bands, bollinger_frame, build_features, create_rollings
+
+
+def legacy_bollinger(prices, tickers, period=20):
+    frames = []
+    for tick in tickers:
+        df = bollinger_bands(work_df=prices, column=tick, period=period)
+        contador = df.apply(lambda x: 1 if x[f'close_{tick}'] >= x[f'upper_{tick}'] else
+                            (-1 if x[f'close_{tick}'] <= x[f'lower_{tick}'] else 0), axis=1)
+        df[f'cont_{tick}'] = (((contador.pct_change() * contador.shift(1)).fillna(0))
+                              .replace(0, np.nan).fillna(method='ffill') == 1).astype(int)
+        frames.append(df)
+    return reduce(lambda left, right: pd.merge(left, right, left_index=True, right_index=True), frames)
+
+
+@pytest.fixture
+def prices():
+    close = correlated_gbm(600, 5, vol=0.6, seed=11)
+    return pd.DataFrame(close, columns=list('ABCDE'), index=pd.bdate_range('2015-01-01', periods=len(close)))
+
+
+def test_bollinger_frame_matches_legacy(prices):
+    tickers = list(prices.columns)
+    expected = legacy_bollinger(prices, tickers)
+    result = bollinger_frame(prices, tickers, period=20, width=2)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+    assert result[[f'cont_{t}' for t in tickers]].values.any()
+
+
+def test_bollinger_frame_with_gaps(prices):
+    prices = prices.copy()
+    prices.iloc[50:55, 1] = np.nan
+    tickers = list(prices.columns)
+    expected = legacy_bollinger(prices, tickers)
+    result = bollinger_frame(prices, tickers)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+
+
+def test_build_features_long_series_matches_rolling():
+    n = 300_000
+    rng = np.random.default_rng(3)
+    work_df = pd.DataFrame({'a': 1e4 * np.exp(np.cumsum(rng.normal(2e-5, 0.01, n))),
+                            'b': rng.normal(0, 1, n) + 1e3})
+    work_df.iloc[1000:1010, 0] = np.nan
+    windows = [3, 20]
+    result = build_features(work_df, ['a', 'b'], ['sum', 'mean', 'count', 'std'], windows, as_frame=True)
+    expected = create_rollings(work_df, ['a', 'b'], ['sum', 'mean', 'count'], windows, min_periods=None)
+    np.testing.assert_allclose(result[expected.columns].values, expected.values, rtol=1e-9)
+    # rolling().std de pandas acumula su propio error en series largas, la referencia exacta es por ventana
+    expected = create_rollings(work_df, ['a', 'b'], 'std', windows)
+    np.testing.assert_allclose(result[expected.columns].values, expected.values, rtol=1e-3)
+    for w in windows:
+        for col in ['a', 'b']:
+            std = np.std(sliding_window_view(work_df[col].values, w), axis=1, ddof=1)
+            np.testing.assert_allclose(result[f'rolling_{col}_std_{w}'].values[w - 1:], std, rtol=1e-8)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment import Portfolio
+from portfolio_funcs import RollingStats, returns_stats, score_portfolios
+from synthetic import SyntheticSource
+
+TICKERS = ['A', 'B', 'C']
+
+
+@pytest.fixture
+def prices():
+    source = SyntheticSource(TICKERS, n_dates=400, late_listing=0, seed=4)
+    full = Portfolio(5000, TICKERS, '2010-01-01', None, 'd', source=source)
+    full.get_data()
+    return source, full.adj_close
+
+
+def test_rolling_stats_follow_the_window(prices):
+    returns = prices[1].pct_change().dropna().values
+    stats = RollingStats(returns[:180], 180)
+    for r in returns[180:300]:
+        stats.add(r)
+    stats.replace_last(returns[299] * 0.5)
+    window = np.vstack([returns[120:299], returns[299] * 0.5])
+    expected = returns_stats(window, 180)
+    for key in expected:
+        np.testing.assert_allclose(stats.stats()[key], expected[key], rtol=1e-9, atol=1e-15)
+
+
+def test_update_equals_scoring_again(prices):
+    source, adj_close = prices
+    end = adj_close.index[-6]
+    portfolio = Portfolio(5000, TICKERS, '2010-01-01', end.strftime('%Y-%m-%d'), 'd', source=source)
+    portfolio.get_data()
+    portfolio.get_best_portfolio(500, risk_mode='cov', seed=3)
+    new_data = adj_close[adj_close.index > portfolio.adj_close.index[-1]]
+    assert len(new_data) == 5
+
+    portfolio.update(new_data)
+    pd.testing.assert_frame_equal(portfolio.adj_close, adj_close, check_freq=False)
+    stats = returns_stats(adj_close.pct_change().dropna().tail(180), 180)
+    expected = score_portfolios(portfolio.weights, stats)
+    for key in expected:
+        np.testing.assert_allclose(portfolio.simulation[key], expected[key], rtol=1e-9)
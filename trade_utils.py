@@ -1,4 +1,5 @@
 import pandas as pd
+import numpy as np
 from itertools import product
 def create_shifts(work_df, columns, shifts):
     """
@@ -59,13 +60,180 @@ def create_rollings(work_df, columns, agg_funcs, windows, min_periods=None):
     rolling_df.columns = [f'rolling_{x}_{y}_{z}' for z,x,y in product(windows,columns,agg_funcs)]
     return rolling_df
 
-def bollinger_bands(work_df, column, period=20):
+def _window_sums(cum, window):
+    "sumas de las ventanas a partir de la suma acumulada (con un renglon de ceros al inicio)"
+    out = cum[1:].copy()
+    out[window:] -= cum[1:-window]
+    return out
+
+BLOCK_WINDOWS = 16
+
+def _block_window_sums(x, window, block=None):
+    """
+    sumas y sumas de cuadrados de cada ventana con sumas acumuladas que se reinician cada bloque de renglones
+    (BLOCK_WINDOWS ventanas por defecto), centradas en la media de cada bloque.
+    El error de redondeo depende del tamano del bloque y no del largo de la serie.
+    Return:
+    (total, total_sq, center) de los valores menos center, el centro del bloque de cada renglon
+    """
+    n, k = x.shape
+    block = max(window, 1) * BLOCK_WINDOWS if block is None else max(block, window)
+    n_blocks = -(-n // block)
+    pad = n_blocks * block - n
+    xb = np.concatenate([x, np.full((pad, k), np.nan)]).reshape(n_blocks, block, k)
+    valid = ~np.isnan(xb)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centers = np.nansum(xb, axis=1) / valid.sum(axis=1)
+    # los bloques sin datos toman el centro anterior para no sumar diferencias grandes entre centros
+    centers = pd.DataFrame(centers).ffill().bfill().fillna(0).values
+    xc = np.where(valid, xb - centers[:, None], 0)
+    cum = np.cumsum(xc, axis=1).reshape(-1, k)[:n]
+    cum_sq = np.cumsum(xc ** 2, axis=1).reshape(-1, k)[:n]
+    cum_n = np.cumsum(valid, axis=1).reshape(-1, k)[:n]
+    center = np.repeat(centers, block, axis=0)[:n]
+
+    total, total_sq = cum.copy(), cum_sq.copy()
+    rows = np.arange(window, n)
+    start = rows - window
+    same = start // block == rows // block
+    total[rows[same]] -= cum[start[same]]
+    total_sq[rows[same]] -= cum_sq[start[same]]
+    # la ventana empieza en el bloque anterior: la parte del bloque anterior se recentra en el bloque actual
+    rows, start = rows[~same], start[~same]
+    end = (rows // block) * block - 1
+    part = cum[end] - cum[start]
+    part_sq = cum_sq[end] - cum_sq[start]
+    m = cum_n[end] - cum_n[start]
+    d = center[rows] - center[start]
+    total[rows] += part - m * d
+    total_sq[rows] += part_sq - 2 * d * part + m * d ** 2
+    return total, total_sq, center
+
+def build_features(work_df, columns, agg_funcs=(), windows=(), shifts=(), min_periods=None, dtype=np.float64, as_frame=False):
+    """
+    Matriz de features con los rollings y shifts de create_rollings y create_shifts en un solo arreglo contiguo.
+    sum, mean, std y var salen de sumas acumuladas (y de cuadrados) reiniciadas por bloques de renglones,
+    count de la cuenta acumulada, min y max del algoritmo O(N) de momentum; otras agregaciones usan pandas.
+    work_df: un DataFrame
+    columns: str or list, columnas
+    agg_funcs: str or list, funciones de agregacion de los rollings
+    windows: iter, ventanas de los rollings
+    shifts: iter, shifts a aplicar
+    min_periods: int, periodos minimos para agregar el rolling
+    dtype: np.float64 o np.float32
+    as_frame: bool, regresar un DataFrame sobre el mismo arreglo
+    Return:
+    (arreglo fechas x features, nombres rolling_{col}_{agg}_{w} y {col}_shift_{n}) o DataFrame
+    """
+    from momentum import rolling_max, rolling_min
+    columns = [columns] if not isinstance(columns, list) else columns
+    agg_funcs = [agg_funcs] if isinstance(agg_funcs, str) or callable(agg_funcs) else list(agg_funcs)
+    windows, shifts = list(windows), list(shifts)
+    x = work_df[columns].to_numpy(dtype=np.float64)
+    n, k = x.shape
+
+    names = [f'rolling_{c}_{a}_{w}' for w, c, a in product(windows, columns, agg_funcs)]
+    names += [f"{c}_shift_{sh}" for sh, c in product(shifts, columns)]
+    out = np.empty((n, len(names)), dtype=dtype)
+
+    nan = np.isnan(x)
+    cum_n = np.vstack([np.zeros((1, k)), np.cumsum(~nan, axis=0)])
+
+    pos = 0
+    for w in windows:
+        mp = w if min_periods is None else min_periods
+        count = _window_sums(cum_n, w)
+        total, total_sq, center = _block_window_sums(x, w)
+        valid = count >= max(mp, 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+            var = np.maximum(total_sq - total * mean, 0) / (count - 1)
+            var[count < 2] = np.nan
+        for agg in agg_funcs:
+            if agg == 'sum':
+                value = total + center * count
+            elif agg == 'mean':
+                value = mean + center
+            elif agg == 'var':
+                value = var
+            elif agg == 'std':
+                value = np.sqrt(var)
+            elif agg == 'count':
+                value = count
+            elif agg in ('max', 'min') and mp == w:
+                value = rolling_max(x, w) if agg == 'max' else rolling_min(x, w)
+            else:
+                value = pd.DataFrame(x).rolling(w, min_periods).agg(agg).values
+            if agg != 'count':
+                value = np.where(valid, value, np.nan)
+            out[:, pos:pos + k * len(agg_funcs):len(agg_funcs)] = value
+            pos += 1
+        pos += k * len(agg_funcs) - len(agg_funcs)
+
+    for sh in shifts:
+        value = np.full((n, k), np.nan)
+        if sh >= 0:
+            value[sh:] = x[:n - sh]
+        else:
+            value[:sh] = x[-sh:]
+        out[:, pos:pos + k] = value
+        pos += k
+
+    if as_frame:
+        return pd.DataFrame(out, index=work_df.index, columns=names, copy=False)
+    return out, names
+
+def bollinger_bands(work_df, column, period=20, width=2):
     data = pd.DataFrame()
     data[f"close_{column}"] = work_df[column].copy()
     data.fillna(method='ffill', inplace=True)
     data[f'mean_{column}_{period}'] = data[f"close_{column}"].rolling(window=period).mean()
     data[f'std_{column}_{period}'] = data[f"close_{column}"].rolling(window=period).std() 
 
-    data[f'upper_{column}'] = data[f'mean_{column}_{period}'] + (data[f'std_{column}_{period}'] * 2)
-    data[f'lower_{column}'] = data[f'mean_{column}_{period}'] - (data[f'std_{column}_{period}'] * 2)
-    return data 
\ No newline at end of file
+    data[f'upper_{column}'] = data[f'mean_{column}_{period}'] + (data[f'std_{column}_{period}'] * width)
+    data[f'lower_{column}'] = data[f'mean_{column}_{period}'] - (data[f'std_{column}_{period}'] * width)
+    return data
+
+def bollinger_counter(close, upper, lower):
+    """
+    close, upper, lower: arrays (fechas x columnas)
+    1 cuando el precio cruzo por ultima vez hacia la banda superior (vender), 0 en otro caso.
+    Mismo resultado que (contador.pct_change()*contador.shift(1)) con forward fill, para todas las columnas a la vez
+    """
+    contador = np.where(close >= upper, 1, np.where(close <= lower, -1, 0))
+    prev = np.zeros_like(contador)
+    prev[1:] = contador[:-1]
+    change = np.where(prev != 0, contador - prev, 0)
+    rows = np.where(change != 0, np.arange(len(change))[:, None], 0)
+    rows = np.maximum.accumulate(rows, axis=0)
+    last = np.take_along_axis(change, rows, axis=0)
+    return (last == 1).astype(int)
+
+def bollinger_frame(work_df, columns=None, period=20, width=2):
+    """
+    work_df: un DataFrame de precios (Adj close)
+    columns: list, columnas a las que se calculan las bandas, None para todas
+    period: int, ventana de la media y la desviacion
+    width: float, numero de desviaciones de las bandas
+    Return:
+    DataFrame con close, mean, std, upper, lower y cont de cada columna (mismas columnas que bollinger_bands mas el contador),
+    calculado sobre todas las columnas a la vez
+    """
+    columns = list(work_df.columns) if columns is None else list(columns)
+    close = work_df[columns].ffill()
+    rolling = close.rolling(window=period)
+    mean = rolling.mean().values
+    std = rolling.std().values
+    upper = mean + std * width
+    lower = mean - std * width
+    cont = bollinger_counter(close.values, upper, lower)
+
+    data = {}
+    for i, col in enumerate(columns):
+        data[f"close_{col}"] = close.values[:, i]
+        data[f"mean_{col}_{period}"] = mean[:, i]
+        data[f"std_{col}_{period}"] = std[:, i]
+        data[f"upper_{col}"] = upper[:, i]
+        data[f"lower_{col}"] = lower[:, i]
+        data[f"cont_{col}"] = cont[:, i]
+    return pd.DataFrame(data, index=work_df.index) 
\ No newline at end of file